@@ -0,0 +1,120 @@
+#-----------------------------------------------------------------------------
+# Title      : PyRogue AMC Carrier DRAM
+#-----------------------------------------------------------------------------
+# Description:
+# PyRogue DRAM used by BSA, raw diagnostics
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy   as np
+import pyrogue as pr
+
+from LclsTimingCore.BlockTransfer import requestBlock, waitBlock
+
+class AmcCarrierDRAM(pr.Device):
+    def __init__(   self,
+            name        = "AmcCarrierDRAM",
+            description = "DRAM used by BSA, raw diagnostics",
+            dramSize    = 0x100000000, # 4GB of address space
+            chunkSize   = 0x1000000,   # 16MB per yielded chunk
+            **kwargs):
+        super().__init__(name=name, description=description, **kwargs)
+
+        # The DRAM is 0x20000000 64-bit words, which is far too many to map
+        # as variables. It is only accessed through the block readers below.
+        self._dramSize  = dramSize
+        self._chunkSize = chunkSize
+
+    def _checkRegion(self, address, size, chunkSize):
+        if chunkSize is None:
+            chunkSize = self._chunkSize
+
+        if (address % 8) or (size % 8) or (chunkSize % 8) or (chunkSize <= 0):
+            raise ValueError('DRAM address, size and chunkSize must be multiples of 8 bytes')
+
+        if (address < 0) or (size < 0) or (address+size > self._dramSize):
+            raise ValueError(f'DRAM region 0x{address:x}+0x{size:x} is outside of 0x{self._dramSize:x} bytes')
+
+        return chunkSize
+
+    def _transfer(self, views):
+        # Keep one chunk in flight while the previous one is waited on. The
+        # memory lock is held throughout, as in readBlock(), so other
+        # transactions on the device cannot interleave with an open chunk.
+        # This is not a generator, so the lock is always released on return.
+        with self._memLock:
+            pending = None
+            self._clearError()
+            try:
+                for start, view in views:
+                    ids = requestBlock(self, start, view)
+                    if pending is not None:
+                        waitBlock(self, *pending)
+                    pending = (start, ids)
+
+                if pending is not None:
+                    waitBlock(self, *pending)
+                    pending = None
+            finally:
+                if pending is not None:
+                    self._waitTransaction(0)
+                    self._clearError()
+
+    def iterRegion(self, address, size, chunkSize=None):
+        """Generator yielding (address, words) for a DRAM region.
+
+        The words are a uint64 view into one reused buffer, so memory stays
+        bounded by chunkSize. A yielded array is only valid until the next
+        iteration; copy it if it must be kept. The device memory lock is
+        only held while a chunk is read, never across a yield.
+        """
+        chunkSize = self._checkRegion(address, size, chunkSize)
+        buf = np.empty(min(chunkSize, size) // 8, dtype=np.uint64)
+
+        for start in range(address, address+size, chunkSize):
+            view = buf[:min(chunkSize, address+size-start) // 8]
+            self._transfer([(start, view)])
+            yield start, view
+
+    def readRegion(self, address, size, out=None, chunkSize=None):
+        """Read a DRAM region into a uint64 array.
+
+        The out array may be preallocated or memory mapped (np.memmap) and is
+        filled in place chunk by chunk, without intermediate copies, so it
+        must be C contiguous. The chunks are pipelined under the device
+        memory lock.
+        """
+        chunkSize = self._checkRegion(address, size, chunkSize)
+
+        if out is None:
+            out = np.empty(size // 8, dtype=np.uint64)
+        elif not out.flags.c_contiguous:
+            raise ValueError('Output buffer must be C contiguous to be filled in place')
+        elif out.nbytes < size:
+            raise ValueError(f'Output buffer of 0x{out.nbytes:x} bytes is smaller than 0x{size:x}')
+
+        flat = out.reshape(-1).view(np.uint8)
+
+        def views():
+            for start in range(address, address+size, chunkSize):
+                pos = start-address
+                yield start, flat[pos:pos+min(chunkSize, size-pos)]
+
+        self._transfer(views())
+
+        return out
+
+    def dumpRegion(self, address, size, path, chunkSize=None):
+        """Read a DRAM region straight into a memory mapped .npy file"""
+        self._checkRegion(address, size, chunkSize)
+        out = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint64, shape=(size // 8,))
+        self.readRegion(address, size, out=out, chunkSize=chunkSize)
+        out.flush()
+        return out
@@ -0,0 +1,205 @@
+#-----------------------------------------------------------------------------
+# Title      : Beam diagnostic buffer capture
+#-----------------------------------------------------------------------------
+# Description:
+# Arm/trigger/readout of the TPGControl beam diagnostic buffers. Arming
+# clears the latched buffers through BeamDiagCntl and polls BeamDiagStat
+# at a high rate only while armed. When a buffer latches, the diagnostic
+# buffers in AmcCarrierDRAM are read with pipelined block transfers,
+# unrolled into pulse ID order and aligned on their common pulse IDs.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import threading
+from functools import reduce
+
+import numpy   as np
+import pyrogue as pr
+
+from LclsTimingCore.BlockTransfer import readBlock
+
+BEAM_DIAG_BUFFERS  = 4
+BEAM_DIAG_MANFAULT = 0x80000000
+BEAM_DIAG_CLEAR    = (1 << BEAM_DIAG_BUFFERS) - 1
+
+# Default diagnostic buffer record: pulse ID word followed by the data
+BeamDiagRecordType = np.dtype([
+    ('pulseId', '<u8'),
+    ('data',    '<u4', (14,)),
+])
+
+def alignBuffers(buffers):
+    """Unroll ring buffers of records into pulse ID order and align them.
+
+    Records with a zero pulse ID were never written. Returns the pulse IDs
+    common to all buffers and the records of each buffer at those pulse IDs.
+    """
+    ordered = []
+    for recs in buffers:
+        recs = recs[recs['pulseId'] != 0]
+        if len(recs):
+            recs = np.roll(recs, -int(np.argmin(recs['pulseId'])))
+        ordered.append(recs)
+
+    if not ordered:
+        return np.zeros(0, dtype=np.uint64), []
+
+    common = reduce(np.intersect1d, [r['pulseId'] for r in ordered])
+    return common, [r[np.searchsorted(r['pulseId'], common)] for r in ordered]
+
+class BeamDiagCapture(pr.Device):
+    """Captures the beam diagnostic buffers of a TPGControl on a latch.
+
+    buffers lists the (address, size) DRAM regions of the diagnostic ring
+    buffers in dram (an AmcCarrierDRAM), each holding recordType records
+    with a pulseId field. Without dram only the BeamDiagStat words are
+    captured. The last capture is kept in capture, a dictionary with the
+    latch time, status words, detection to readout latency, common pulse
+    IDs and aligned records, and passed to callback.
+    """
+    def __init__(   self,
+            tpg,
+            name        = "BeamDiagCapture",
+            description = "Beam diagnostic buffer capture",
+            dram        = None,
+            buffers     = (),
+            recordType  = BeamDiagRecordType,
+            pollPeriod  = 0.001,
+            callback    = None,
+            **kwargs):
+        super().__init__(name=name, description=description, **kwargs)
+
+        if buffers and dram is None:
+            raise ValueError('Beam diagnostic buffers given without a DRAM device')
+        if np.dtype(recordType).itemsize % 8:
+            raise ValueError('Beam diagnostic record size must be a multiple of 8 bytes')
+
+        self._tpg        = tpg
+        self._dram       = dram
+        self._buffers    = list(buffers)
+        self._recordType = np.dtype(recordType)
+        self._pollPeriod = pollPeriod
+        self._callback   = callback
+        self._statOffset = tpg.variables['BeamDiagStat[0]'].offset
+        self._thread     = None
+        self._halt       = threading.Event()
+
+        self.capture = None
+
+        ##############################
+        # Variables
+        ##############################
+
+        self.add(pr.LocalVariable(
+            name         = "Armed",
+            description  = "Waiting for a beam diagnostic latch",
+            mode         = 'RO',
+            value        = False,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "Captures",
+            description  = "Number of latches captured",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "LatchStatus",
+            description  = "BeamDiagStat words of the last latch",
+            mode         = 'RO',
+            value        = [0] * BEAM_DIAG_BUFFERS,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "ReadoutTime",
+            description  = "Latch detection to aligned data time of the last capture",
+            units        = "ms",
+            mode         = 'RO',
+            value        = 0.0,
+            disp         = '{:0.3f}',
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "AlignedPulses",
+            description  = "Common pulse IDs in the last capture",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+    def status(self):
+        """Current BeamDiagStat words"""
+        return readBlock(self._tpg, self._statOffset, size=4*BEAM_DIAG_BUFFERS)
+
+    def clear(self):
+        """Clear the latched buffers"""
+        self._tpg.BeamDiagCntl.set(BEAM_DIAG_CLEAR)
+        self._tpg.BeamDiagCntl.set(0)
+
+    def trigger(self):
+        """Force a latch with the manual fault"""
+        self._tpg.BeamDiagCntl.set(BEAM_DIAG_MANFAULT)
+        self._tpg.BeamDiagCntl.set(0)
+
+    def readout(self, status=None):
+        """Read and align the diagnostic buffers, returns the capture dictionary"""
+        t0 = time.perf_counter()
+
+        size = self._recordType.itemsize
+        recs = [self._dram.readRegion(address, nbytes // size * size).view(self._recordType) for address, nbytes in self._buffers]
+        pulseIds, aligned = alignBuffers(recs)
+
+        self.capture = {
+            'time'    : time.time(),
+            'status'  : self.status() if status is None else status,
+            'latency' : time.perf_counter() - t0,
+            'pulseId' : pulseIds,
+            'buffers' : aligned,
+        }
+
+        self.LatchStatus.set([int(w) for w in self.capture['status']])
+        self.ReadoutTime.set(self.capture['latency'] * 1e3)
+        self.AlignedPulses.set(len(pulseIds))
+        self.Captures.set(self.Captures.value() + 1)
+
+        if self._callback is not None:
+            self._callback(self.capture)
+        return self.capture
+
+    def _run(self, base):
+        while not self._halt.wait(self._pollPeriod):
+            stat = self.status()
+            if np.any(stat != base):
+                self.Armed.set(False)
+                self.readout(stat)
+                break
+
+    def arm(self):
+        """Clear the buffers and poll BeamDiagStat until one latches"""
+        self.disarm()
+        self.clear()
+        self._halt.clear()
+        self.Armed.set(True)
+        self._thread = threading.Thread(target=self._run, args=(self.status(),), daemon=True)
+        self._thread.start()
+
+    def disarm(self):
+        thread = self._thread
+        if thread is not None:
+            self._halt.set()
+            if thread is not threading.current_thread():
+                thread.join()
+            self._thread = None
+        self.Armed.set(False)
+
+    def _stop(self):
+        self.disarm()
+        super()._stop()
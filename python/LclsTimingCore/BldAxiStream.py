@@ -0,0 +1,133 @@
+#-----------------------------------------------------------------------------
+# Title      : PyRogue Beamline data streaming module
+#-----------------------------------------------------------------------------
+# Description:
+# PyRogue Beamline data streaming module for AMC Carrier
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import pyrogue as pr
+
+class BldAxiStream(pr.Device):
+    def __init__(   self,
+            name        = "BldAxiStream",
+            description = "Beamline data streaming module for AMC Carrier",
+            **kwargs):
+        super().__init__(name=name, description=description, **kwargs)
+
+        ##############################
+        # Variables
+        ##############################
+
+        self.add(pr.RemoteVariable(
+            name         = "PacketSize",
+            description  = "BLD max packet size in words",
+            offset       =  0x00,
+            bitSize      =  12,
+            bitOffset    =  0x00,
+            mode         = "RW",
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "Enable",
+            description  = "Enable BLD packet streaming",
+            offset       =  0x03,
+            bitSize      =  1,
+            bitOffset    =  0x07,
+            mode         = "RW",
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "ChannelMask",
+            description  = "BLD diagnostic channel selection",
+            offset       =  0x04,
+            bitSize      =  31,
+            bitOffset    =  0x00,
+            mode         = "RW",
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "ChannelSevr",
+            description  = "BLD diagnostic channel severity limit",
+            offset       =  0x08,
+            bitSize      =  62,
+            bitOffset    =  0x00,
+            mode         = "RW",
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "WordCount",
+            description  = "current BLD packet word count",
+            offset       =  0x10,
+            bitSize      =  12,
+            bitOffset    =  0x00,
+            mode         = "RO",
+            pollInterval = 1,
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "TxState",
+            description  = "BLD Tx State",
+            offset       =  0x12,
+            bitSize      =  4,
+            bitOffset    =  0x00,
+            mode         = "RO",
+            pollInterval = 1,
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "PulseIdL",
+            description  = "BLD PulseID latch",
+            offset       =  0x14,
+            bitSize      =  20,
+            bitOffset    =  0x00,
+            mode         = "RO",
+            pollInterval = 1,
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "TimeStampL",
+            description  = "BLD TimeStamp latch",
+            offset       =  0x18,
+            bitSize      =  32,
+            bitOffset    =  0x00,
+            mode         = "RO",
+            pollInterval = 1,
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "Delta",
+            description  = "BLD Pulse Delta",
+            offset       =  0x1C,
+            bitSize      =  32,
+            bitOffset    =  0x00,
+            mode         = "RO",
+            pollInterval = 1,
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "PacketCount",
+            description  = "BLD Packet Count",
+            offset       =  0x20,
+            bitSize      =  20,
+            bitOffset    =  0x00,
+            mode         = "RO",
+            pollInterval = 1,
+        ))
+
+        self.add(pr.RemoteVariable(
+            name         = "Paused",
+            description  = "BLD Paused",
+            offset       =  0x23,
+            bitSize      =  1,
+            bitOffset    =  0x07,
+            mode         = "RO",
+            pollInterval = 1,
+        ))
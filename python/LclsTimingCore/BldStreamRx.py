@@ -0,0 +1,207 @@
+#-----------------------------------------------------------------------------
+# Title      : PyRogue Beamline data stream receiver
+#-----------------------------------------------------------------------------
+# Description:
+# Stream receiver decoding BLD packets from BldAxiStream into per-channel
+# NumPy columns keyed by pulse ID.
+#
+# BLD packet layout (little endian):
+#   First event : timeStamp[63:0], pulseId[63:0], channelMask[31:0],
+#                 severity[63:0], one 32-bit word per channel in channelMask
+#   Next events : delta[31:0] (pulseId delta [31:20], timeStamp delta [19:0]),
+#                 severity[63:0], one 32-bit word per channel in channelMask
+# Severity holds 2 bits per channel, channel N at bits [2N+1:2N].
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import threading
+
+import numpy as np
+import rogue.interfaces.stream as ris
+
+BLD_NUM_CHANNELS = 31
+
+BldHeaderType = np.dtype([
+    ('timeStamp',   '<u8'),
+    ('pulseId',     '<u8'),
+    ('channelMask', '<u4'),
+    ('severity',    '<u8'),
+])
+
+# Per channel mask decode caches, the mask rarely changes within a run
+_bldChannels   = {}
+_bldEventTypes = {}
+
+def bldChannels(channelMask):
+    """Return the channel numbers present in a BLD channel mask"""
+    channelMask = int(channelMask)
+    if channelMask not in _bldChannels:
+        _bldChannels[channelMask] = np.flatnonzero((channelMask >> np.arange(BLD_NUM_CHANNELS)) & 0x1)
+    return _bldChannels[channelMask]
+
+def _bldEventType(nch):
+    if nch not in _bldEventTypes:
+        _bldEventTypes[nch] = np.dtype([('delta', '<u4'), ('severity', '<u8'), ('data', '<u4', (nch,))])
+    return _bldEventTypes[nch]
+
+def decodeBldPacket(buf):
+    """Decode one BLD packet.
+
+    The packet is mapped with structured dtype views, so there is no
+    per-event Python work. Returns a dict with the packet channels and
+    per-event pulseId, timeStamp, severity arrays plus a (nEvents, nChannels)
+    data array.
+    """
+    buf = np.frombuffer(buf, dtype=np.uint8)
+
+    if buf.size < BldHeaderType.itemsize:
+        raise ValueError(f'BLD packet of {buf.size} bytes is shorter than its header')
+
+    hdr      = np.frombuffer(buf, dtype=BldHeaderType, count=1)[0]
+    channels = bldChannels(hdr['channelMask'])
+    nch      = channels.size
+
+    first = BldHeaderType.itemsize + 4*nch
+    evLen = 12 + 4*nch
+    if (buf.size < first) or ((buf.size - first) % evLen):
+        raise ValueError(f'BLD packet of {buf.size} bytes does not hold whole events of {nch} channels')
+
+    nEvents = 1 + (buf.size - first) // evLen
+    evType  = _bldEventType(nch)
+
+    head   = np.frombuffer(buf, dtype='<u4', count=nch, offset=BldHeaderType.itemsize)
+    events = np.frombuffer(buf, dtype=evType, count=nEvents-1, offset=first)
+
+    pulseId   = np.empty(nEvents, dtype=np.uint64)
+    timeStamp = np.empty(nEvents, dtype=np.uint64)
+    severity  = np.empty(nEvents, dtype=np.uint64)
+
+    pulseId[0]   = hdr['pulseId']
+    timeStamp[0] = hdr['timeStamp']
+    severity[0]  = hdr['severity']
+
+    np.cumsum(events['delta'] >> 20,      dtype=np.uint64, out=pulseId[1:])
+    np.cumsum(events['delta'] & 0xFFFFF, dtype=np.uint64, out=timeStamp[1:])
+    pulseId[1:]   += pulseId[0]
+    timeStamp[1:] += timeStamp[0]
+    severity[1:]   = events['severity']
+
+    if nEvents > 1:
+        data = np.empty((nEvents, nch), dtype=np.uint32)
+        data[0]  = head
+        data[1:] = events['data']
+    else:
+        data = head.reshape(1, nch)
+
+    return {
+        'channelMask' : int(hdr['channelMask']),
+        'channels'    : channels,
+        'pulseId'     : pulseId,
+        'timeStamp'   : timeStamp,
+        'severity'    : severity,
+        'data'        : data,
+    }
+
+class BldStreamRx(ris.Slave):
+    def __init__(self, depth=0x100000, maxPacket=0x10000):
+        ris.Slave.__init__(self)
+
+        self._lock    = threading.Lock()
+        self._depth   = depth
+        self._scratch = np.empty(maxPacket, dtype=np.uint8)
+
+        # Ring buffer columns, one row per event
+        self._pulseId   = np.zeros(depth, dtype=np.uint64)
+        self._timeStamp = np.zeros(depth, dtype=np.uint64)
+        self._severity  = np.zeros(depth, dtype=np.uint64)
+        self._mask      = np.zeros(depth, dtype=np.uint32)
+        self._data      = np.zeros((depth, BLD_NUM_CHANNELS), dtype=np.uint32)
+
+        self._wrIndex = 0
+        self._count   = 0
+
+        self.packetCount = 0
+        self.eventCount  = 0
+        self.errorCount  = 0
+
+    def _acceptFrame(self, frame):
+        with frame.lock():
+            size = frame.getPayload()
+            if size > self._scratch.size:
+                self._scratch = np.empty(size, dtype=np.uint8)
+            buf = self._scratch[:size]
+            frame.read(buf, 0)
+
+        self.process(buf)
+
+    def process(self, buf):
+        """Decode a BLD packet and append its events to the ring buffer"""
+        try:
+            pkt = decodeBldPacket(buf)
+        except ValueError:
+            self.errorCount += 1
+            return
+
+        n    = pkt['pulseId'].size
+        ch   = pkt['channels']
+        full = (ch.size == BLD_NUM_CHANNELS)
+
+        with self._lock:
+            # Only the newest depth events of an oversized packet are kept
+            src = max(0, n-self._depth)
+            dst = (self._wrIndex + src) % self._depth
+
+            # Copy in at most two contiguous segments around the ring wrap
+            while src < n:
+                cnt = min(n-src, self._depth-dst)
+                self._pulseId[dst:dst+cnt]   = pkt['pulseId'][src:src+cnt]
+                self._timeStamp[dst:dst+cnt] = pkt['timeStamp'][src:src+cnt]
+                self._severity[dst:dst+cnt]  = pkt['severity'][src:src+cnt]
+                self._mask[dst:dst+cnt]      = pkt['channelMask']
+                if full:
+                    self._data[dst:dst+cnt] = pkt['data'][src:src+cnt]
+                else:
+                    self._data[dst:dst+cnt, ch] = pkt['data'][src:src+cnt]
+                src += cnt
+                dst  = (dst+cnt) % self._depth
+
+            self._wrIndex = (self._wrIndex + n) % self._depth
+            self._count   = min(self._count + n, self._depth)
+
+            self.packetCount += 1
+            self.eventCount  += n
+
+    def _order(self):
+        return (self._wrIndex - self._count + np.arange(self._count)) % self._depth
+
+    def snapshot(self):
+        """Return copies of all buffered columns, oldest event first"""
+        with self._lock:
+            idx = self._order()
+            return {
+                'pulseId'     : self._pulseId[idx],
+                'timeStamp'   : self._timeStamp[idx],
+                'severity'    : self._severity[idx],
+                'channelMask' : self._mask[idx],
+                'data'        : self._data[idx],
+            }
+
+    def channel(self, ch):
+        """Return (pulseId, value, severity) for the buffered events of one channel"""
+        with self._lock:
+            idx = self._order()
+            idx = idx[(self._mask[idx] >> ch) & 0x1 == 1]
+            sevr = (self._severity[idx] >> np.uint64(2*ch)) & np.uint64(0x3)
+            return self._pulseId[idx], self._data[idx, ch], sevr
+
+    def clear(self):
+        with self._lock:
+            self._wrIndex = 0
+            self._count   = 0
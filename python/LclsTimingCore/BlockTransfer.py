@@ -0,0 +1,78 @@
+#-----------------------------------------------------------------------------
+# Title      : PyRogue Block register transfers
+#-----------------------------------------------------------------------------
+# Description:
+# Bulk memory transactions between a device address window and NumPy buffers
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy   as np
+import pyrogue as pr
+import rogue.interfaces.memory as rim
+
+def requestBlock(dev, offset, data, txnType=rim.Read):
+    """Issue the transactions covering data at a device relative offset.
+
+    The buffer is split into transactions of at most the maximum access size
+    of the memory path and the data is transferred directly in/out of the
+    NumPy buffer. Returns the list of transaction IDs, which must be passed
+    to waitBlock() before the buffer contents are used.
+    """
+    if not data.flags.c_contiguous:
+        raise ValueError('Block transfer buffer must be C contiguous')
+
+    view      = data.reshape(-1).view(np.uint8)
+    minAccess = dev._reqMinAccess()
+    maxAccess = dev._reqMaxAccess()
+
+    if (offset % minAccess) or (view.nbytes % minAccess):
+        raise ValueError(f'Block transfer at offset 0x{offset:x} with size 0x{view.nbytes:x} is not aligned to {minAccess} bytes')
+
+    # Keep each transaction aligned to the minimum access size
+    maxAccess -= maxAccess % minAccess
+
+    ids = []
+    for i in range(0, view.nbytes, maxAccess):
+        size = min(maxAccess, view.nbytes-i)
+        ids.append(dev._reqTransaction(dev.offset+offset+i, view, size, i, txnType))
+    return ids
+
+def waitBlock(dev, offset, ids):
+    """Wait for the transactions returned by requestBlock() and check for errors"""
+    for tid in ids:
+        dev._waitTransaction(tid)
+
+    err = dev._getError()
+    if err != "":
+        dev._clearError()
+        raise pr.MemoryError(name=dev.path, address=dev.address+offset, msg=err)
+
+def readBlock(dev, offset, data=None, size=None, dtype=np.uint32):
+    """Read a device address window into a NumPy buffer.
+
+    Either a preallocated (or memory mapped) buffer is passed in data, or
+    a new array of dtype covering size bytes is allocated. Returns the buffer.
+    """
+    if data is None:
+        data = np.empty(size // np.dtype(dtype).itemsize, dtype=dtype)
+
+    with dev._memLock:
+        dev._clearError()
+        waitBlock(dev, offset, requestBlock(dev, offset, data, rim.Read))
+
+    return data
+
+def writeBlock(dev, offset, data, posted=False):
+    """Write a NumPy buffer to a device address window"""
+    data = np.ascontiguousarray(data)
+
+    with dev._memLock:
+        dev._clearError()
+        waitBlock(dev, offset, requestBlock(dev, offset, data, rim.Post if posted else rim.Write))
@@ -0,0 +1,300 @@
+#-----------------------------------------------------------------------------
+# Title      : Vectorized BSA accumulation model
+#-----------------------------------------------------------------------------
+# Description:
+# Models the BsaControl state machine of every BSA definition (EDEF) over a
+# decoded timing message stream: event selection (fixed, AC with time
+# slot mask, destination), the nToAvg/avgToWr countdowns and the init,
+# active, average done and done bits. All 64 EDEFs are stepped at once as
+# columns of a message x EDEF matrix, with cumulative sample counts instead
+# of a per message loop, and the state carries over between chunks so a
+# stream can be modelled ahead of real time.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+from LclsTimingCore.BlockTransfer import readBlock
+
+BSA_NUM_EDEFS = 64
+
+# Destination modes, as BsaControl decodes destSel(17:16)
+BSA_DEST_INCLUSIVE = 0
+BSA_DEST_EXCLUSIVE = 1
+BSA_DEST_DONT_CARE = 2
+
+# An nToAvg of 0 counts the 15 bit sample counter through zero
+BSA_NTOAVG_ZERO = 1 << 15
+
+# TPGMiniCore: BSA control (init bit 0 of byte i for EDEF i, BsaActive[i]),
+# BSA complete and countdown status
+_miniInit     = 0x1FC
+_miniComplete = 0x50
+_miniStatus   = 0x400
+
+# Messages modelled per matrix step
+_block = 1 << 16
+
+BsaDefType = np.dtype([
+    ('rateMode',  'u1'),
+    ('fixedRate', 'u1'),
+    ('acRate',    'u1'),
+    ('acTSMask',  'u1'),
+    ('seqSel',    'u1'),
+    ('seqBit',    'u1'),
+    ('destMode',  'u1'),
+    ('destMask',  '<u2'),
+    ('nToAvg',    '<u2'),
+    ('avgToWr',   '<u2'),
+    ('maxSevr',   'u1'),
+    ('init',      'u1'),
+])
+
+BsaBitsType = np.dtype([
+    ('pulseId',    '<u8'),
+    ('bsaInit',    '<u8'),
+    ('bsaActive',  '<u8'),
+    ('bsaAvgDone', '<u8'),
+    ('bsaDone',    '<u8'),
+])
+
+def bsaDefs(dev):
+    """BsaDefType records of the 64 EDEFs of a TPGMiniCore or TPGControl.
+
+    TPGControl packs rateSel in BsaEventSel(12:0) and destSel in (31:13),
+    nToAvg, maxSevr and avgToWr in BsaStatSel(12:0, 15:14, 31:16); it has
+    no init bits. EDEFs beyond NARRAYSBSA of a TPGMiniCore stay zero, as
+    do the init bits beyond the 4 BsaActive bytes.
+    """
+    defs = np.zeros(BSA_NUM_EDEFS, dtype=BsaDefType)
+
+    if 'BsaEventSel[0]' in dev.variables:
+        words = readBlock(dev, dev.variables['BsaEventSel[0]'].offset, size=BSA_NUM_EDEFS*8).reshape(-1, 2)
+        sel, dest, stat = words[:, 0] & 0x1FFF, words[:, 0] >> 13, words[:, 1]
+        defs['rateMode']  = (sel >> 11) & 0x3
+        defs['fixedRate'] = sel & 0xF
+        defs['acRate']    = sel & 0x7
+        defs['acTSMask']  = (sel >> 3) & 0x3F
+        defs['seqSel']    = (sel >> 5) & 0x3F
+        defs['seqBit']    = sel & 0x1F
+        defs['destMode']  = (dest >> 16) & 0x3
+        defs['destMask']  = dest & 0xFFFF
+    else:
+        n     = sum(1 for name in dev.variables if name.startswith('BsaRateSelMode['))
+        words = readBlock(dev, dev.variables['BsaRateSelMode[0]'].offset, size=16*n).reshape(-1, 4)
+        sel, masks, stat = words[:, 0], words[:, 1], words[:, 2]
+        mode = (sel >> 24) & 0x3
+        d    = defs[:n]
+        d['rateMode']  = sel & 0x3
+        d['fixedRate'] = (sel >> 2) & 0xF
+        d['acRate']    = (sel >> 6) & 0x7
+        d['acTSMask']  = (sel >> 9) & 0x3F
+        d['seqSel']    = (sel >> 15) & 0x1F
+        d['seqBit']    = (sel >> 20) & 0xF
+        d['destMode']  = mode
+        d['destMask']  = np.where(mode == BSA_DEST_EXCLUSIVE, masks >> 16, masks & 0xFFFF)
+
+        init = readBlock(dev, _miniInit, size=4, dtype=np.uint8)
+        k    = min(n, len(init))
+        d['init'][:k] = init[:k] & 1
+
+    k = len(stat)
+    defs['nToAvg'][:k]  = stat & 0x1FFF
+    defs['maxSevr'][:k] = (stat >> 14) & 0x3
+    defs['avgToWr'][:k] = stat >> 16
+    return defs
+
+class BsaModel(object):
+    """BSA bits of all EDEFs over a timing message stream.
+
+    defs are BsaDefType records, one per EDEF. init() restarts EDEFs at a
+    pulse ID: that message carries the bsaInit bit and the EDEF samples
+    from the next one, as BsaControl does. process() takes messages with
+    pulseId, fixedRates and acRates fields (a TPGMessageType array, say)
+    and returns their BsaBitsType records; acTimeSlot (1-6) applies the AC
+    time slot masks and beamRequest (beam 0, destination 7:4) the
+    destination selection, without it no beam is requested. Sequencer
+    rate selections never fire. doneAt holds the completion pulse ID of
+    every EDEF, -1 until it completes.
+    """
+    def __init__(self, defs):
+        self.defs = defs
+
+        self._n       = np.where(defs['nToAvg'] == 0, BSA_NTOAVG_ZERO, defs['nToAvg']).astype(np.int64)
+        self._persist = defs['avgToWr'] == 0
+        self._run     = np.zeros(BSA_NUM_EDEFS, dtype=bool)
+        self._toAvg   = self._n.copy()
+        self._toWr    = defs['avgToWr'].astype(np.int64)
+        self._pending = []
+
+        self.initAt = np.full(BSA_NUM_EDEFS, -1, dtype=np.int64)
+        self.doneAt = np.full(BSA_NUM_EDEFS, -1, dtype=np.int64)
+
+    @classmethod
+    def fromDevice(cls, dev, starts=None):
+        """Model of the EDEFs of a TPGMiniCore or TPGControl.
+
+        starts maps EDEFs to the pulse ID of their init. TPGMiniCore EDEFs
+        with their init bit set and not in starts continue from the
+        countdown status, unless their BSA complete bit is set.
+        """
+        model = cls(bsaDefs(dev))
+        for e, pulseId in (starts or {}).items():
+            model.init(e, pulseId)
+
+        if 'BsaRateSelMode[0]' in dev.variables:
+            complete = int(readBlock(dev, _miniComplete, size=8, dtype=np.uint64)[0])
+            status   = readBlock(dev, _miniStatus, size=4*BSA_NUM_EDEFS)
+            for e in np.flatnonzero(model.defs['init']):
+                if e not in (starts or {}) and not (complete >> int(e)) & 1:
+                    model._run[e]   = True
+                    model._toAvg[e] = int(status[e] & 0xFFFF) or BSA_NTOAVG_ZERO
+                    model._toWr[e]  = int(status[e] >> 16)
+        return model
+
+    def init(self, edef, pulseId):
+        """Restart edef at pulseId"""
+        self._pending.append((int(pulseId), int(edef)))
+        self._pending.sort()
+
+    def remaining(self):
+        """Samples left until done per EDEF, -1 when idle or persistent"""
+        left = self._toAvg + (self._toWr - 1) * self._n
+        return np.where(self._run & ~self._persist, left, -1)
+
+    def _select(self, msgs, defs):
+        """EDEF x message event selection of defs"""
+        sel = np.zeros((len(defs), len(msgs)), dtype=bool)
+
+        fixed = defs['rateMode'] == 0
+        sel[fixed] = (msgs['fixedRates'] >> defs['fixedRate'][fixed, None].astype(np.uint16)) & 1
+
+        ac = defs['rateMode'] == 1
+        if ac.any():
+            fire = ((msgs['acRates'] >> defs['acRate'][ac, None]) & 1).astype(bool)
+            if 'acTimeSlot' in msgs.dtype.names:
+                ts    = msgs['acTimeSlot'].astype(np.int64)
+                fire &= (ts >= 1) & ((defs['acTSMask'][ac, None] >> np.maximum(ts - 1, 0)) & 1 == 1)
+            sel[ac] = fire
+
+        if 'beamRequest' in msgs.dtype.names:
+            req = msgs['beamRequest'].astype(np.int64)
+            hit = (req & 1 == 1) & ((defs['destMask'][:, None].astype(np.int64) >> ((req >> 4) & 0xF)) & 1 == 1)
+        else:
+            hit = np.zeros((1, len(msgs)), dtype=bool)
+        mode = defs['destMode'][:, None]
+        sel &= np.where(mode == BSA_DEST_INCLUSIVE, hit,
+               np.where(mode == BSA_DEST_EXCLUSIVE, ~hit, mode == BSA_DEST_DONT_CARE))
+        return sel
+
+    def _step(self, msgs, out):
+        idx = np.flatnonzero(self._run)
+        if len(idx) == 0 or len(msgs) == 0:
+            return
+
+        # EDEFs with the same event selection share their selection rows
+        keys      = self.defs[idx][['rateMode', 'fixedRate', 'acRate', 'acTSMask', 'destMode', 'destMask']]
+        keys, inv = np.unique(keys, return_inverse=True)
+        inv       = inv.ravel()
+        sel       = self._select(msgs, keys)
+        N         = len(msgs)
+
+        # Averages complete on samples toAvg, toAvg + n, ... up to last,
+        # the done message is sample last. With n = 1 every sample
+        # completes an average and needs no search.
+        n     = self._n[idx]
+        toAvg = self._toAvg[idx]
+        last  = np.where(self._persist[idx], np.iinfo(np.int64).max, toAvg + (self._toWr[idx] - 1) * n)
+        K     = np.count_nonzero(sel, axis=1)[inv]
+        top   = np.minimum(K, last)
+        navg  = np.where((top >= toAvg) & (n > 1), (top - toAvg) // n + 1, 0)
+        fin   = np.flatnonzero(K >= last)
+
+        row = np.repeat(np.arange(len(idx)), navg)
+        tgt = toAvg[row] + (np.arange(len(row)) - np.repeat(np.cumsum(navg) - navg, navg)) * n[row]
+        row = np.concatenate([row, fin])
+        tgt = np.concatenate([tgt, last[fin]])
+
+        # The messages of those samples are found by one search of the
+        # sample count rows, made a single ascending array by a row offset
+        pos = row
+        if len(row):
+            need = np.unique(inv[row])
+            lut  = np.zeros(len(keys), dtype=np.int64)
+            k    = np.cumsum(sel[need], axis=1, dtype=np.int32)
+            k   += (np.arange(len(need), dtype=np.int32) * (N + 1))[:, None]
+            lut[need] = np.arange(len(need))
+            off  = lut[inv[row]]
+            pos  = np.searchsorted(k.ravel(), (tgt + off * (N + 1)).astype(np.int32)) - off * N
+        m        = len(row) - len(fin)
+        pos, cut = pos[:m], pos[m:]
+        row      = row[:m]
+
+        # EDEFs running through the segment are OR'ed in per selection row,
+        # a completing one only up to its done message
+        bit  = np.uint64(1) << idx.astype(np.uint64)
+        live = np.ones(len(idx), dtype=bool)
+        live[fin] = False
+
+        zero = np.uint64(0)
+        for u in range(len(keys)):
+            on  = live & (inv == u)
+            act = np.bitwise_or.reduce(bit[on], initial=zero)
+            avg = np.bitwise_or.reduce(bit[on & (n == 1)], initial=zero)
+            if act:
+                out['bsaActive'] |= np.where(sel[u], act, zero)
+            if avg:
+                out['bsaAvgDone'] |= np.where(sel[u], avg, zero)
+
+        for r, c in zip(fin, cut):
+            m = np.where(sel[inv[r], :c+1], bit[r], zero)
+            out['bsaActive'][:c+1] |= m
+            if n[r] == 1:
+                out['bsaAvgDone'][:c+1] |= m
+
+        np.bitwise_or.at(out['bsaAvgDone'], pos, bit[row])
+        np.bitwise_or.at(out['bsaDone'], cut, bit[fin])
+
+        # Carry the countdowns over, completed EDEFs reload and stop
+        j = K - toAvg
+        self._toAvg[idx] = np.where(j < 0, toAvg - K, n - np.maximum(j, 0) % n)
+        self._toWr[idx] -= np.where((j < 0) | self._persist[idx], 0, 1 + np.maximum(j, 0) // n)
+
+        e = idx[fin]
+        self.doneAt[e] = msgs['pulseId'][cut]
+        self._run[e]   = False
+        self._toAvg[e] = self._n[e]
+        self._toWr[e]  = self.defs['avgToWr'][e]
+
+    def process(self, msgs):
+        """BsaBitsType records of msgs, which follow the previous ones"""
+        out = np.zeros(len(msgs), dtype=BsaBitsType)
+        out['pulseId'] = msgs['pulseId']
+        pid = msgs['pulseId']
+
+        for a in range(0, len(msgs), _block):
+            b = min(a + _block, len(msgs))
+
+            # Split at the inits: the init message is modelled with the
+            # old state, the new one applies from the next message
+            while self._pending and self._pending[0][0] <= pid[b-1]:
+                p, e = self._pending.pop(0)
+                c    = int(np.searchsorted(pid[a:b], p, side='right')) + a
+                self._step(msgs[a:c], out[a:c])
+                if c > a and pid[c-1] == p:
+                    out['bsaInit'][c-1] |= np.uint64(1) << np.uint64(e)
+                self._run[e]   = True
+                self._toAvg[e] = self._n[e]
+                self._toWr[e]  = self.defs['avgToWr'][e]
+                self.initAt[e] = p
+                self.doneAt[e] = -1
+                a = c
+            self._step(msgs[a:b], out[a:b])
+        return out
@@ -0,0 +1,142 @@
+#-----------------------------------------------------------------------------
+# Title      : Trigger delay scan engine
+#-----------------------------------------------------------------------------
+# Description:
+# Steps the coarse and fine delays of one or more triggers (EvrV2TriggerReg
+# Delay/DelayTap or EvrV2Core TriggerDelay/TriggerFineDelay) through a scan.
+# The register words of every step are computed up front; each step then
+# writes only the words that change, adjacent words merged, all triggers
+# in one pipelined burst. Steps are released on pulse ID boundaries read
+# back from a TPG and the write latency of each step is recorded.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+import rogue.interfaces.memory as rim
+
+from LclsTimingCore.BlockTransfer    import readBlock
+from LclsTimingCore.RegisterSnapshot import RegisterSnapshot
+from LclsTimingCore.TimingSimMemory  import PULSE_ID_REGS
+
+SCAN_DELAY_BITS = 28
+SCAN_FINE_BITS  = 6
+
+ScanStepType = np.dtype([
+    ('step',    '<u4'),
+    ('pulseId', '<u8'),
+    ('time',    '<f8'),
+    ('latency', '<f8'),
+])
+
+def _registers(target):
+    """(device, coarse delay offset, fine delay offset or None) of a scan target"""
+    if isinstance(target, tuple):
+        dev, i = target
+        return dev, dev.variables[f'TriggerDelay[{i}]'].offset, dev.variables[f'TriggerFineDelay[{i}]'].offset
+
+    fine = target.variables.get('DelayTap')
+    return target, target.Delay.offset, None if fine is None else fine.offset
+
+class DelayScan(object):
+    """Trigger delay scan over precomputed register words.
+
+    targets are EvrV2TriggerReg devices or (EvrV2Core, trigger index)
+    tuples. delays (186 MHz clocks) and fineDelays (taps) have one row per
+    step and either one column per target or a single column for all;
+    fineDelays None leaves the fine delays alone. With tpg (a TPGControl
+    or TPGMiniCore) each step waits until the pulse ID has advanced by
+    pulseStep since the previous step.
+    """
+    def __init__(self, targets, delays, fineDelays=None, tpg=None, pulseStep=1):
+        self._tpg       = tpg
+        self._pulseStep = pulseStep
+        if tpg is not None:
+            self._pidOffset = next(off for name, off in PULSE_ID_REGS.items() if name in tpg.variables)
+
+        regs  = [_registers(t) for t in targets]
+        steps = len(delays)
+
+        delays = np.broadcast_to(np.asarray(delays, dtype=np.int64).reshape(steps, -1), (steps, len(regs)))
+        if fineDelays is not None:
+            fineDelays = np.broadcast_to(np.asarray(fineDelays, dtype=np.int64).reshape(steps, -1), (steps, len(regs)))
+
+        # One column per written word: (device, byte offset, value per step, mask)
+        cols = []
+        for j, (dev, coarse, fine) in enumerate(regs):
+            cols.append((dev, coarse, delays[:, j], (1 << SCAN_DELAY_BITS) - 1))
+            if fineDelays is not None and fine is not None:
+                cols.append((dev, fine, fineDelays[:, j], (1 << SCAN_FINE_BITS) - 1))
+
+        self.nodes  = list(dict.fromkeys(c[0] for c in cols))
+        order       = sorted(range(len(cols)), key=lambda k: (self.nodes.index(cols[k][0]), cols[k][1]))
+        self._dev   = np.array([self.nodes.index(cols[k][0]) for k in order], dtype=np.int64)
+        self._addr  = np.array([cols[k][1] for k in order], dtype=np.int64)
+        self._mask  = np.array([cols[k][3] for k in order], dtype=np.uint32)
+        self._value = np.stack([cols[k][2] for k in order], axis=1).astype(np.uint32) & self._mask
+        self._words = None
+
+    def _windows(self, sel):
+        # Runs of adjacent words of one device
+        key  = self._dev[sel] * (1 << 32) + self._addr[sel]
+        cuts = np.flatnonzero(np.diff(key) != 4) + 1
+        return [[int(self._dev[sel[r[0]]]), int(self._addr[sel[r[0]]]), len(r), int(sel[r[0]])]
+                for r in np.split(np.arange(len(sel)), cuts)]
+
+    def prepare(self):
+        """Read the current words and precompute the words and writes of every step"""
+        init = np.zeros(len(self._addr), dtype=np.uint32)
+        RegisterSnapshot.transfer(self.nodes, self._windows(np.arange(len(init))), init, rim.Read)
+
+        # Row 0 is the state before the scan, row i+1 is step i
+        self._words = np.vstack([init, (init & ~self._mask) | self._value])
+        self._steps = []
+        for i in range(1, len(self._words)):
+            sel = np.flatnonzero(self._words[i] != self._words[i-1])
+            self._steps.append(self._windows(sel) if len(sel) else [])
+        self._restore = self._windows(np.arange(len(init)))
+        return self
+
+    def pulseId(self):
+        return int(readBlock(self._tpg, self._pidOffset, size=8, dtype=np.uint64)[0])
+
+    def run(self, callback=None, restore=True):
+        """Run the scan, returns one ScanStepType record per step.
+
+        callback(step, pulseId) is called after each step's write completes.
+        latency is the time from the pulse ID boundary (or the step start
+        without a TPG) to the completion of the step's write.
+        """
+        if self._words is None:
+            self.prepare()
+
+        ret = np.zeros(len(self._steps), dtype=ScanStepType)
+        pid = self.pulseId() if self._tpg is not None else 0
+
+        try:
+            for i, windows in enumerate(self._steps):
+                if self._tpg is not None:
+                    nxt = pid + self._pulseStep
+                    while pid < nxt:
+                        pid = self.pulseId()
+                t0 = time.perf_counter()
+
+                if windows:
+                    RegisterSnapshot.transfer(self.nodes, windows, self._words[i+1], rim.Write)
+
+                ret[i] = (i, pid, time.time(), time.perf_counter() - t0)
+                if callback is not None:
+                    callback(i, pid)
+        finally:
+            if restore:
+                RegisterSnapshot.transfer(self.nodes, self._restore, self._words[0], rim.Write)
+
+        return ret
@@ -0,0 +1,132 @@
+#-----------------------------------------------------------------------------
+# Title      : EvrV2Core struct-of-arrays channel and trigger view
+#-----------------------------------------------------------------------------
+# Description:
+# Reads the 12 EvrV2Core channels (0x20-0x1AC, including GlobalEventCnt)
+# and 12 triggers (0x200-0x2C0) with one block read each and decodes every
+# field of all channels/triggers at once into NumPy columns. Edited
+# columns are encoded back into the configuration words and written in
+# one pipelined burst, leaving the event counters untouched.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+import rogue.interfaces.memory as rim
+
+from LclsTimingCore.BlockTransfer import requestBlock, waitBlock
+
+EVR_NUM_CHANNELS   = 12
+EVR_NUM_TRIGGERS   = 12
+EVR_CHANNEL_OFFSET = 0x20
+EVR_CHANNEL_STRIDE = 32
+EVR_TRIGGER_OFFSET = 0x200
+EVR_TRIGGER_STRIDE = 16
+EVR_GLOBAL_COUNT   = 0x1A8
+
+# Field: (word in the channel/trigger, bit offset, bit size), as in EvrV2Core
+EVR_CHANNEL_FIELDS = {
+    'Enable'    : (0, 0,  1),
+    'BsaEnable' : (0, 1,  1),
+    'DmaEnable' : (0, 2,  1),
+    'RateSel'   : (1, 0,  13),
+    'DestSel'   : (1, 13, 18),
+    'EventCnt'  : (2, 0,  32),
+    'BsaDelay'  : (3, 0,  20),
+    'BsaSetup'  : (3, 20, 12),
+    'BsaWidth'  : (4, 0,  20),
+}
+
+EVR_TRIGGER_FIELDS = {
+    'Channel'   : (0, 0,  4),
+    'Polarity'  : (0, 16, 1),
+    'Enable'    : (0, 31, 1),
+    'Delay'     : (2, 0,  28),
+    'FineDelay' : (3, 0,  6),
+}
+
+# Configuration words written back, as runs of (first word, words)
+_channelRuns = [(0, 2), (3, 2)]
+_triggerRuns = [(0, 1), (2, 2)]
+
+def _dtype(fields):
+    return np.dtype([(f, '<u4' if size > 16 else '<u2' if size > 8 else 'u1') for f, (_, _, size) in fields.items()])
+
+EvrChannelType = _dtype(EVR_CHANNEL_FIELDS)
+EvrTriggerType = _dtype(EVR_TRIGGER_FIELDS)
+
+def _decode(words, fields, dtype):
+    ret = np.zeros(len(words), dtype=dtype)
+    for f, (w, bit, size) in fields.items():
+        ret[f] = (words[:, w] >> np.uint32(bit)) & np.uint32((1 << size) - 1)
+    return ret
+
+def _encode(words, recs, fields):
+    for f, (w, bit, size) in fields.items():
+        mask = np.uint32(((1 << size) - 1) << bit)
+        words[:, w] = (words[:, w] & ~mask) | ((recs[f].astype(np.uint32) << np.uint32(bit)) & mask)
+
+class EvrV2CoreView(object):
+    """Struct-of-arrays view of the channels and triggers of an EvrV2Core.
+
+    read() fills channels (EvrChannelType) and triggers (EvrTriggerType),
+    one record per channel/trigger, and globalEventCnt. Edit the columns
+    (e.g. view.triggers['Delay'][:] = ...) and write() them back.
+    """
+    def __init__(self, dev):
+        self.dev = dev
+
+        self._chWords = np.zeros((EVR_NUM_CHANNELS, EVR_CHANNEL_STRIDE // 4), dtype=np.uint32)
+        self._trWords = np.zeros((EVR_NUM_TRIGGERS, EVR_TRIGGER_STRIDE // 4), dtype=np.uint32)
+        self._chBuf   = np.zeros((EVR_GLOBAL_COUNT + 4 - EVR_CHANNEL_OFFSET) // 4, dtype=np.uint32)
+
+        self.channels       = _decode(self._chWords, EVR_CHANNEL_FIELDS, EvrChannelType)
+        self.triggers       = _decode(self._trWords, EVR_TRIGGER_FIELDS, EvrTriggerType)
+        self.globalEventCnt = 0
+
+    def read(self):
+        """Read both windows, two block transfers in flight together"""
+        dev = self.dev
+        with dev._memLock:
+            dev._clearError()
+            ids  = requestBlock(dev, EVR_CHANNEL_OFFSET, self._chBuf, rim.Read)
+            ids += requestBlock(dev, EVR_TRIGGER_OFFSET, self._trWords, rim.Read)
+            waitBlock(dev, EVR_CHANNEL_OFFSET, ids)
+
+        self._chWords[:]    = self._chBuf[:self._chWords.size].reshape(self._chWords.shape)
+        self.channels       = _decode(self._chWords, EVR_CHANNEL_FIELDS, EvrChannelType)
+        self.triggers       = _decode(self._trWords, EVR_TRIGGER_FIELDS, EvrTriggerType)
+        self.globalEventCnt = int(self._chBuf[(EVR_GLOBAL_COUNT - EVR_CHANNEL_OFFSET) // 4])
+        return self
+
+    def write(self, channels=True, triggers=True, refresh=True):
+        """Write the channel and/or trigger configuration words in one burst.
+
+        Fields are encoded into the words of the last read(), so bits not
+        covered by a field keep their read value. EventCnt is not written.
+        """
+        dev  = self.dev
+        reqs = []
+        if channels:
+            _encode(self._chWords, self.channels, {f: v for f, v in EVR_CHANNEL_FIELDS.items() if f != 'EventCnt'})
+            reqs += [(EVR_CHANNEL_OFFSET + i*EVR_CHANNEL_STRIDE + w*4, self._chWords[i, w:w+n])
+                     for i in range(EVR_NUM_CHANNELS) for w, n in _channelRuns]
+        if triggers:
+            _encode(self._trWords, self.triggers, EVR_TRIGGER_FIELDS)
+            reqs += [(EVR_TRIGGER_OFFSET + i*EVR_TRIGGER_STRIDE + w*4, self._trWords[i, w:w+n])
+                     for i in range(EVR_NUM_TRIGGERS) for w, n in _triggerRuns]
+
+        with dev._memLock:
+            dev._clearError()
+            ids = [tid for offset, words in reqs for tid in requestBlock(dev, offset, words, rim.Write)]
+            waitBlock(dev, EVR_CHANNEL_OFFSET, ids)
+
+        if refresh:
+            dev.readBlocks(recurse=False)
+            dev.checkBlocks(recurse=False)
@@ -0,0 +1,58 @@
+#-----------------------------------------------------------------------------
+# Title      : PyRogue File backed memory emulator
+#-----------------------------------------------------------------------------
+# Description:
+# Memory slave backed by a memory mapped file, used to emulate large
+# address spaces (e.g. AMC Carrier DRAM) without hardware
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import threading
+
+import numpy as np
+import rogue.interfaces.memory as rim
+
+class FileMemEmulate(rim.Slave):
+    def __init__(self, path, size, minWidth=4, maxSize=0x100000):
+        rim.Slave.__init__(self, minWidth, maxSize)
+        self._minWidth = minWidth
+        self._maxSize  = maxSize
+        self._lock     = threading.Lock()
+
+        mode = 'r+' if os.path.exists(path) and os.path.getsize(path) >= size else 'w+'
+        self._data = np.memmap(path, dtype=np.uint8, mode=mode, shape=(size,))
+
+    @property
+    def data(self):
+        return self._data
+
+    def _doMinAccess(self):
+        return self._minWidth
+
+    def _doMaxAccess(self):
+        return self._maxSize
+
+    def _doTransaction(self, transaction):
+        address = transaction.address()
+        size    = transaction.size()
+        type    = transaction.type()
+
+        if address+size > self._data.size:
+            transaction.error(f'Address 0x{address:x}+0x{size:x} outside of emulated memory')
+            return
+
+        with self._lock:
+            if type == rim.Write or type == rim.Post:
+                transaction.getData(self._data[address:address+size], 0)
+            else:
+                transaction.setData(self._data[address:address+size], 0)
+
+        transaction.done()
@@ -0,0 +1,245 @@
+#-----------------------------------------------------------------------------
+# Title      : Interval synchronous counter sampler
+#-----------------------------------------------------------------------------
+# Description:
+# Samples the interval counters of TPGMiniCore (PllCnt, ClkCnt, SyncErrCnt,
+# CountInterval, BaseRateCount) or TPGStatus (CountPLL, Count186M,
+# CountSyncE, CountIntv, CountBRT) once per CountInterval with a single
+# block read, so no sample is duplicated or torn between counters. Sampling
+# is driven by TPGControl.IrqIntvStatus or by a timer phase locked to the
+# middle of the interval. Only BaseRateCount is latched per interval; the
+# PLL, clock and sync error counters run freely, so their rates come from
+# the wrapped differences of consecutive samples over host time. While
+# sampling, the polling of the counter variables is turned off.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import threading
+
+import numpy   as np
+import pyrogue as pr
+
+from LclsTimingCore.BlockTransfer   import readBlock
+from LclsTimingCore.TimingSimMemory import TIMING_CLK_RATE
+
+IntervalSampleType = np.dtype([
+    ('time',          '<f8'),
+    ('PllCnt',        '<u4'),
+    ('ClkCnt',        '<u4'),
+    ('SyncErrCnt',    '<u4'),
+    ('CountInterval', '<u4'),
+    ('BaseRateCount', '<u4'),
+    ('BaseRate',      '<f8'),
+    ('ClkFreq',       '<f8'),
+    ('ClkPpm',        '<f8'),
+    ('SyncErrRate',   '<f8'),
+])
+
+# Counter window offset and clock count divider, by the name of its first counter
+_windows = {
+    'PllCnt'   : (0x500, 1),
+    'CountPLL' : (0x100, 16),
+}
+
+class IntervalSampler(pr.Device):
+    """Samples the interval counters of a TPGMiniCore or TPGStatus device.
+
+    With irqDev (a TPGControl) the sampler polls IrqIntvStatus every
+    irqPoll seconds, samples when it is set and clears it. Otherwise it
+    reads CountInterval once, restarts the interval with CountIntervalReset
+    when the device has it and samples in the middle of every interval.
+    The last depth samples are kept, see history().
+
+    BaseRate is exact in counter terms. ClkFreq, ClkPpm and SyncErrRate
+    divide free running counter differences by the host monotonic time
+    between the two block reads, taken at the middle of each read. Their
+    relative error is about the read latency over the sampling interval
+    (100 us over a 1 s interval is 100 ppm): use ClkPpm to spot gross
+    clock errors, not to measure the reference.
+    """
+    def __init__(   self,
+            target,
+            name        = "IntervalSampler",
+            description = "Interval synchronous counter sampler",
+            irqDev      = None,
+            irqPoll     = 0.05,
+            clkRate     = TIMING_CLK_RATE,
+            depth       = 3600,
+            callback    = None,
+            **kwargs):
+        super().__init__(name=name, description=description, **kwargs)
+
+        first = next(n for n in _windows if n in target.variables)
+        self._offset, self._clkDiv = _windows[first]
+        self._counters = [v for v in target.variables.values()
+                          if isinstance(v, pr.RemoteVariable) and self._offset <= v.offset < self._offset + 20]
+
+        self._target   = target
+        self._irqDev   = irqDev
+        self._irqPoll  = irqPoll
+        self._clkRate  = clkRate
+        self._callback = callback
+        self._history  = np.zeros(depth, dtype=IntervalSampleType)
+        self._count    = 0
+        self._prev     = None
+        self._polls    = None
+        self._thread   = None
+        self._halt     = threading.Event()
+
+        ##############################
+        # Variables
+        ##############################
+
+        self.add(pr.LocalVariable(
+            name         = "Samples",
+            description  = "Number of intervals sampled",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "BaseRate",
+            description  = "Base rate over the last interval",
+            units        = "Hz",
+            mode         = 'RO',
+            value        = 0.0,
+            disp         = '{:0.3f}',
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "ClkFreq",
+            description  = "186 MHz clock frequency over the last interval",
+            units        = "Hz",
+            mode         = 'RO',
+            value        = 0.0,
+            disp         = '{:0.1f}',
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "ClkPpm",
+            description  = "186 MHz clock offset from nominal",
+            units        = "ppm",
+            mode         = 'RO',
+            value        = 0.0,
+            disp         = '{:0.3f}',
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "SyncErrRate",
+            description  = "Sync error rate over the last interval",
+            units        = "Hz",
+            mode         = 'RO',
+            value        = 0.0,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "PllChanges",
+            description  = "PLL status changes since the previous sample",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+    def sample(self):
+        """Read and decode one interval, returns the IntervalSampleType record"""
+        t0    = time.monotonic()
+        words = readBlock(self._target, self._offset, size=20)
+        now   = (t0 + time.monotonic()) / 2
+        pll, clk, sync, intv, brt = (int(w) for w in words)
+
+        rec = np.zeros((), dtype=IntervalSampleType)
+        rec['time']          = time.time()
+        rec['PllCnt']        = pll
+        rec['ClkCnt']        = clk
+        rec['SyncErrCnt']    = sync
+        rec['CountInterval'] = intv
+        rec['BaseRateCount'] = brt
+
+        if intv:
+            rec['BaseRate'] = brt * self._clkRate / intv
+
+        # Free running counters, over the time since the previous sample
+        rec['ClkFreq'] = rec['ClkPpm'] = rec['SyncErrRate'] = np.nan
+        changes = 0
+        if self._prev is not None and now > self._prev[0]:
+            elapsed = now - self._prev[0]
+            dpll, dclk, dsync = ((c - p) & 0xFFFFFFFF for c, p in zip((pll, clk, sync), self._prev[1:]))
+            rec['ClkFreq']     = dclk * self._clkDiv / elapsed
+            rec['ClkPpm']      = (dclk * self._clkDiv / (elapsed * self._clkRate) - 1.0) * 1e6
+            rec['SyncErrRate'] = dsync / elapsed
+            changes = dpll
+        self._prev = (now, pll, clk, sync)
+
+        self._history[self._count % len(self._history)] = rec
+        self._count += 1
+
+        self.BaseRate.set(float(rec['BaseRate']))
+        self.ClkFreq.set(float(rec['ClkFreq']))
+        self.ClkPpm.set(float(rec['ClkPpm']))
+        self.SyncErrRate.set(float(rec['SyncErrRate']))
+        self.PllChanges.set(changes)
+        self.Samples.set(self._count)
+
+        if self._callback is not None:
+            self._callback(rec)
+        return rec
+
+    def history(self):
+        """Kept samples, oldest first"""
+        n = min(self._count, len(self._history))
+        return np.roll(self._history, -(self._count % len(self._history)))[-n:] if n else self._history[:0]
+
+    def _runIrq(self):
+        while not self._halt.wait(self._irqPoll):
+            if self._irqDev.IrqIntvStatus.get():
+                self.sample()
+                self._irqDev.IrqIntvStatus.set(0)
+
+    def _runTimer(self):
+        intv = int(readBlock(self._target, self._offset + 12, size=4)[0])
+        if intv == 0:
+            return
+        period = intv / self._clkRate
+
+        # Restart the interval so the samples land mid interval
+        if 'CountIntervalReset' in self._target.variables:
+            self._target.CountIntervalReset.set(1)
+            nxt = time.monotonic() + 1.5 * period
+        else:
+            nxt = time.monotonic() + period
+
+        while not self._halt.wait(max(0.0, nxt - time.monotonic())):
+            self.sample()
+            nxt += period
+            late = time.monotonic() - nxt
+            if late > 0:
+                nxt += period * np.ceil(late / period)
+
+    def startSampling(self):
+        if self._thread is None:
+            # Polled reads would duplicate the sampled block reads
+            self._polls = [(v, v.pollInterval) for v in self._counters]
+            for v in self._counters:
+                v.pollInterval = 0
+            self._halt.clear()
+            self._thread = threading.Thread(target=self._runTimer if self._irqDev is None else self._runIrq, daemon=True)
+            self._thread.start()
+
+    def stopSampling(self):
+        if self._thread is not None:
+            self._halt.set()
+            self._thread.join()
+            self._thread = None
+            for v, poll in self._polls:
+                v.pollInterval = poll
+
+    def _stop(self):
+        self.stopSampling()
+        super()._stop()
@@ -0,0 +1,191 @@
+#-----------------------------------------------------------------------------
+# Title      : TimingFrameRx message delay calibration
+#-----------------------------------------------------------------------------
+# Description:
+# Computes and applies the MsgDelay of many TimingFrameRx receivers so their
+# timing messages are released with one common latency after the TPG. The
+# latency of every receiver is measured from captured messages: the arrival
+# of each message in 186 MHz clocks of a counter common to the crate, less
+# its TPG time stamp in the same clocks. The fits of all receivers are one
+# vectorized pass, and the MsgDelay and status registers of all receivers
+# are read and written in pipelined bursts.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+import rogue.interfaces.memory as rim
+
+from LclsTimingCore.RegisterSnapshot import RegisterSnapshot
+from LclsTimingCore.TimingSimMemory  import TIMING_CLK_RATE
+
+MSG_DELAY_BITS = 20
+
+# TimingFrameRx words RxClkCount, RxRstCount, RxDecErrCount, RxDspErrCount,
+# CSR and MsgDelay, read as one window
+_statusOffset = 0x10
+_statusWords  = 6
+
+MsgDelayCalType = np.dtype([
+    ('receiver', '<u4'),
+    ('valid',    'u1'),
+    ('locked',   'u1'),
+    ('messages', '<u4'),
+    ('clkRate',  '<f8'),
+    ('latency',  '<f8'),
+    ('jitter',   '<f8'),
+    ('oldDelay', '<u4'),
+    ('msgDelay', '<u4'),
+    ('residual', '<f8'),
+])
+
+def _clocks(timeStamp, ref):
+    """TPG time stamps (seconds << 32 | ns) as 186 MHz clocks after ref"""
+    ts = np.asarray(timeStamp, dtype=np.uint64)
+    ns = ((ts >> np.uint64(32)).astype(np.int64) - (ref >> 32)) * 1000000000 + (ts & np.uint64(0xFFFFFFFF)).astype(np.int64) - (ref & 0xFFFFFFFF)
+    return ns * (TIMING_CLK_RATE / 1e9)
+
+def fitLatency(arrival, timeStamp, ref):
+    """(latency, jitter, messages) per receiver, in 186 MHz clocks.
+
+    arrival and timeStamp hold one array per receiver: the arrival counter
+    (186 MHz clocks, common to all receivers) and TPG time stamp of every
+    captured message. The recovered clocks are locked to the TPG, so the
+    latency is the mean of arrival less time stamp and the jitter its
+    standard deviation. Latencies are relative to the message at ref, an
+    (arrival, timeStamp) pair, whose offsets keep the float math exact.
+    """
+    count = np.array([len(a) for a in arrival], dtype=np.int64)
+    arr   = np.concatenate([np.asarray(a, dtype=np.uint64) for a in arrival] + [np.zeros(0, dtype=np.uint64)])
+    ts    = np.concatenate([np.asarray(t, dtype=np.uint64) for t in timeStamp] + [np.zeros(0, dtype=np.uint64)])
+    rcv   = np.repeat(np.arange(len(count)), count)
+
+    d = (arr - np.uint64(ref[0])).astype(np.int64) - _clocks(ts, int(ref[1]))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(rcv, d, len(count)) / count
+        var  = np.bincount(rcv, (d - mean[rcv])**2, len(count)) / count
+    return mean, np.sqrt(var), count
+
+class MsgDelayCalibration(object):
+    """MsgDelay calibration of TimingFrameRx receivers.
+
+    capture(receivers) returns the captured messages of every receiver as
+    (arrival, timeStamp) lists, see fitLatency(), with arrival taken where
+    the messages are released, after MsgDelay. The intrinsic latency of a
+    receiver is its measured latency less its current MsgDelay; the new
+    MsgDelay brings every receiver to the target latency, margin clocks
+    above the slowest receiver.
+
+    A receiver is locked when its link stayed up without resets and its
+    RxClkCount advanced within clkTolerance of the 186 MHz clock during
+    the capture, and valid when also locked with at least minMessages
+    messages and a MsgDelay in range. Invalid receivers keep their delay.
+    """
+    def __init__(self, receivers, margin=0, minMessages=16, clkTolerance=1e-2):
+        self.receivers    = list(receivers)
+        self.margin       = margin
+        self.minMessages  = minMessages
+        self.clkTolerance = clkTolerance
+        self.target       = None
+        self._ref         = None
+
+        self.nodes = list(dict.fromkeys(self.receivers))
+        self._dev  = [self.nodes.index(rx) for rx in self.receivers]
+
+    def _transfer(self, offset, words, data, txnType):
+        # One window per receiver, all issued before waiting
+        windows = [[d, offset, words, i * words] for i, d in enumerate(self._dev)]
+        RegisterSnapshot.transfer(self.nodes, windows, data, txnType)
+
+    def status(self):
+        """(time, status words) of every receiver, RxClkCount to MsgDelay"""
+        data = np.zeros(len(self.receivers) * _statusWords, dtype=np.uint32)
+        t0   = time.monotonic()
+        self._transfer(_statusOffset, _statusWords, data, rim.Read)
+        return (t0 + time.monotonic()) / 2, data.reshape(-1, _statusWords)
+
+    def delays(self):
+        """Current MsgDelay of every receiver"""
+        return self.status()[1][:, 5] & ((1 << MSG_DELAY_BITS) - 1)
+
+    def setDelays(self, delays, refresh=True):
+        """Write the MsgDelay of every receiver in one burst, keeping the bits above it"""
+        mask  = (1 << MSG_DELAY_BITS) - 1
+        words = self.status()[1][:, 5]
+        data  = (words & ~np.uint32(mask)) | (np.asarray(delays, dtype=np.uint32) & mask)
+        self._transfer(_statusOffset + 4 * 5, 1, np.ascontiguousarray(data), rim.Write)
+
+        if refresh:
+            for rx in self.nodes:
+                rx.MsgDelay.get()
+
+    def _locked(self, before, after):
+        (t0, s0), (t1, s1) = before, after
+        rate = ((s1[:, 0] - s0[:, 0]) & 0xFFFFFFFF) * 16.0 / max(t1 - t0, 1e-9)
+        ok   = ((s0[:, 4] >> 1) & (s1[:, 4] >> 1) & 1).astype(bool) & (s0[:, 1] == s1[:, 1])
+        if self.clkTolerance is not None:
+            ok &= np.abs(rate / TIMING_CLK_RATE - 1) <= self.clkTolerance
+        return ok, rate
+
+    def measure(self, capture):
+        """MsgDelayCalType records of one capture, with the delays to apply.
+
+        The latencies are relative to the first message captured, which
+        stays the reference of later verify captures.
+        """
+        before          = self.status()
+        arrival, stamps = capture(self.receivers)
+        after           = self.status()
+
+        first     = next((i for i, a in enumerate(arrival) if len(a)), None)
+        self._ref = (0, 0) if first is None else (arrival[first][0], stamps[first][0])
+
+        ret = np.zeros(len(self.receivers), dtype=MsgDelayCalType)
+        ret['receiver'] = np.arange(len(self.receivers))
+        ret['oldDelay'] = after[1][:, 5] & ((1 << MSG_DELAY_BITS) - 1)
+
+        locked, ret['clkRate'] = self._locked(before, after)
+        ret['latency'], ret['jitter'], ret['messages'] = fitLatency(arrival, stamps, self._ref)
+        ret['locked'] = locked
+
+        # Intrinsic latency without the current delay, and the delay that
+        # brings it to the target
+        intrinsic = ret['latency'] - ret['oldDelay']
+        usable    = locked & (ret['messages'] >= self.minMessages)
+        target    = np.ceil(intrinsic[usable].max()) + self.margin if usable.any() else 0.0
+
+        want = np.round(target - np.where(usable, intrinsic, 0.0))
+        ok   = usable & (want >= 0) & (want < (1 << MSG_DELAY_BITS))
+
+        ret['valid']    = ok
+        ret['msgDelay'] = np.where(ok, want, ret['oldDelay'])
+        ret['residual'] = np.where(usable, intrinsic + ret['msgDelay'] - target, np.nan)
+        self.target     = float(target)
+        return ret
+
+    def run(self, capture, apply=True, verify=True):
+        """Measure, apply the new delays and report the residuals.
+
+        With verify the messages are captured again after applying and
+        residual is the measured latency less the target, otherwise it is
+        the rounding left by the integer delay.
+        """
+        ret = self.measure(capture)
+        if not apply:
+            return ret
+
+        self.setDelays(ret['msgDelay'])
+
+        if verify:
+            arrival, stamps = capture(self.receivers)
+            latency, _, _   = fitLatency(arrival, stamps, self._ref)
+            ret['residual'] = np.where(ret['valid'], latency - self.target, ret['residual'])
+        return ret
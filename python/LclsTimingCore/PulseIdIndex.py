@@ -0,0 +1,166 @@
+#-----------------------------------------------------------------------------
+# Title      : Pulse ID indexed random access over timing archives
+#-----------------------------------------------------------------------------
+# Description:
+# Answers "what was field F at pulse ID P" for arrays of pulse IDs over a
+# TimingArchive. Captured pulse IDs run in long consecutive stretches, so
+# the pulseId column is reduced once to runs (first pulse ID, first row,
+# length). A lookup is then one searchsorted over the run starts and an
+# offset, gaps fall outside every run, and the fields are gathered from
+# the memory mapped column chunks.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+from LclsTimingCore.TimingArchive import TimingArchive
+
+# Run starts stepped over per bucket before falling back to a search,
+# and queries resolved per block
+_steps = 2
+_block = 1 << 14
+
+PulseIdRunType = np.dtype([
+    ('pulseId', '<u8'),
+    ('row',     '<i8'),
+    ('count',   '<i8'),
+])
+
+def _sentinel(dtype):
+    """Fill value of missing pulses: NaN for floats, all ones for integers"""
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind in 'iu':
+        return np.iinfo(dtype).max
+    return 0
+
+class PulseIdIndex(object):
+    """Pulse ID lookups over a TimingArchive (or the path of one).
+
+    rows() maps query pulse IDs to archive rows, -1 where the pulse was
+    not captured. lookup() returns the requested columns at the query
+    pulse IDs, filled with fill (default NaN for float and the all ones
+    value for integer columns) where missing, and the found mask. A pulse
+    ID captured more than once resolves to the capture in the run with
+    the lowest first pulse ID. buckets is the size of the bucket table
+    per run.
+    """
+    def __init__(self, archive, buckets=4):
+        self.archive  = archive if isinstance(archive, TimingArchive) else TimingArchive(archive)
+        self._columns = {}
+
+        # Runs of consecutive pulse IDs, continued across chunk boundaries
+        pids, rows = [], []
+        prev       = None
+        for row, cols in self.archive.iterChunks(['pulseId']):
+            p = cols['pulseId']
+            if len(p) == 0:
+                continue
+            brk = np.flatnonzero(np.diff(p.astype(np.int64)) != 1) + 1
+            if prev is None or int(p[0]) != prev + 1:
+                brk = np.concatenate([[0], brk])
+            pids.append(p[brk])
+            rows.append(brk + row)
+            prev = int(p[-1])
+
+        runs = np.zeros(sum(len(r) for r in rows), dtype=PulseIdRunType)
+        if len(runs):
+            runs['pulseId'] = np.concatenate(pids)
+            runs['row']     = np.concatenate(rows)
+            runs['count']   = np.diff(np.append(runs['row'], len(self.archive)))
+
+        # Out of order captures are searched in pulse ID order, runs
+        # overlapping earlier ones (pulses captured twice) are trimmed
+        runs = runs[np.argsort(runs['pulseId'], kind='stable')]
+        end  = (runs['pulseId'] + runs['count'].astype(np.uint64)).astype(np.int64)
+        cov  = np.maximum.accumulate(np.concatenate([[0], end[:-1]])) if len(runs) else end
+        skip = np.maximum(cov - runs['pulseId'].astype(np.int64), 0)
+        runs['pulseId'] += skip.astype(np.uint64)
+        runs['row']     += skip
+        runs['count']   -= skip
+        self.runs   = runs[runs['count'] > 0]
+        self._start = self.runs['pulseId'].astype(np.int64)
+        self._row   = self.runs['row']
+        self._count = self.runs['count']
+
+        # A binary search of random queries is branch miss bound, so pulse
+        # IDs are first bucketed through a table of the run at every bucket
+        # start, about buckets per run, that leaves a step or two to take
+        if len(self.runs):
+            lo   = int(self._start[0])
+            span = int((self._start + self._count).max()) - lo
+            size = 1 << max(0, int(np.ceil(np.log2(max(1, buckets * len(self.runs))))))
+            self._lo    = lo
+            self._shift = max(0, int(np.ceil(np.log2(max(1, span / size)))))
+            edges       = lo + (np.arange(size + 2, dtype=np.int64) << self._shift)
+            self._table = np.searchsorted(self._start, edges, side='right') - 1
+            self._size  = size
+            self._next  = np.append(self._start[1:], np.iinfo(np.int64).max)
+
+    def _rows(self, q, out):
+        # Run of every query from its bucket, stepping over the run starts
+        # inside the bucket; queries in crowded buckets are searched
+        d = q - self._lo
+        b = np.clip(d >> self._shift, 0, self._size + 1)
+        i = self._table[b]
+        for _ in range(_steps):
+            i += self._next[i] <= q
+        slow = np.flatnonzero(self._next[i] <= q)
+        if len(slow):
+            i[slow] = np.searchsorted(self._start, q[slow], side='right') - 1
+
+        off = q - self._start[i]
+        hit = (d >= 0) & (off < self._count[i])
+        np.copyto(out, np.where(hit, self._row[i] + off, -1))
+
+    def rows(self, pulseIds):
+        """Archive rows of pulseIds, -1 for pulses not captured"""
+        q   = np.asarray(pulseIds).astype(np.int64, copy=False)
+        ret = np.full(len(q), -1, dtype=np.int64)
+        if len(self.runs):
+            # Blocks of queries keep the temporaries in cache
+            for a in range(0, len(q), _block):
+                self._rows(q[a:a+_block], ret[a:a+_block])
+        return ret
+
+    def _column(self, name):
+        # Memory maps (decoded chunks, when compressed) of every chunk of a
+        # column, opened once
+        if name not in self._columns:
+            self._columns[name] = [self.archive.column(name, c) for c in range(len(self.archive.index))]
+        return self._columns[name]
+
+    def lookup(self, pulseIds, columns, fill=None):
+        """(records of columns at pulseIds, found mask)"""
+        arc   = self.archive
+        rows  = self.rows(pulseIds)
+        found = rows >= 0
+        ret   = np.zeros(len(rows), dtype=[(name, arc.dtype[name]) for name in columns])
+        for name in columns:
+            ret[name] = _sentinel(arc.dtype[name].base) if fill is None else fill
+
+        # Per block of queries, the found ones are grouped by chunk with a
+        # stable (radix) sort of their chunk numbers and gathered per chunk
+        cols  = [(ret[name], self._column(name)) for name in columns]
+        first = arc.index['row'].astype(np.int64)
+        edges = np.arange(len(first) + 1)
+        for a in range(0, len(rows), _block):
+            sel = np.flatnonzero(found[a:a+_block])
+            row = rows[a:a+_block][sel]
+            c   = (np.searchsorted(first, row, side='right') - 1).astype(np.int16 if len(first) < (1 << 15) else np.int64)
+            o   = np.argsort(c, kind='stable')
+            end = np.searchsorted(c[o], edges)
+            for k in np.flatnonzero(np.diff(end)):
+                g   = o[end[k]:end[k+1]]
+                dst = a + sel[g]
+                src = row[g] - first[k]
+                for out, chunks in cols:
+                    out[dst] = chunks[k][src]
+        return ret, found
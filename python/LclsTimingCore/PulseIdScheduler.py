@@ -0,0 +1,230 @@
+#-----------------------------------------------------------------------------
+# Title      : Pulse ID scheduled register writes
+#-----------------------------------------------------------------------------
+# Description:
+# Queues register writes for target pulse IDs. A linear host clock model
+# (pulse ID versus time.perf_counter) is fitted to timed reads of the TPG
+# pulse ID readback and refreshed while writes are pending. Each write
+# fires at its predicted host time, less the learned write latency,
+# sleeping until shortly before and spinning on the high resolution clock
+# for the rest. The pulse ID error of every write is reported.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import heapq
+import itertools
+import collections
+import threading
+
+import numpy   as np
+import pyrogue as pr
+
+from LclsTimingCore.BlockTransfer   import readBlock
+from LclsTimingCore.TimingSimMemory import PULSE_ID_REGS, TIMING_BASE_RATE
+
+ScheduledWriteType = np.dtype([
+    ('target',   '<u8'),
+    ('achieved', '<u8'),
+    ('readback', '<u8'),
+    ('error',    '<i8'),
+    ('latency',  '<f8'),
+])
+
+class PulseIdScheduler(pr.Device):
+    """Fires register writes at target pulse IDs of a TPGMiniCore or TPGControl.
+
+    schedule() queues a (variable, value) write or a callable for a pulse
+    ID. The clock model is fitted to timed reads of the pulse ID and
+    refitted at most every refresh seconds while writes are pending. The
+    write latency is learned from the achieved errors. Each fired write
+    adds a ScheduledWriteType record to results: target, achieved (pulse
+    ID at the middle of the write, from the readback), readback (read
+    right after), error (achieved - target) and write latency.
+    """
+    def __init__(   self,
+            tpg,
+            name        = "PulseIdScheduler",
+            description = "Pulse ID scheduled register writes",
+            samples     = 32,
+            refresh     = 1.0,
+            spin        = 0.002,
+            **kwargs):
+        super().__init__(name=name, description=description, **kwargs)
+
+        self._tpg       = tpg
+        self._pidOffset = next(off for n, off in PULSE_ID_REGS.items() if n in tpg.variables)
+        self._samples   = samples
+        self._refresh   = refresh
+        self._spin      = spin
+        self._queue     = []
+        self._seq       = itertools.count()
+        self._cond      = threading.Condition()
+        self._thread    = None
+        self._halt      = False
+        self._fitTime   = -np.inf
+        self._calTime   = 0.0
+        self._history   = collections.deque(maxlen=8*samples)
+        self._t0        = 0.0
+        self._pid0      = 0
+        self._rate      = TIMING_BASE_RATE
+        self._lead      = 0.0
+
+        self.results = []
+
+        ##############################
+        # Variables
+        ##############################
+
+        self.add(pr.LocalVariable(
+            name         = "Pending",
+            description  = "Writes waiting for their pulse ID",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "Fired",
+            description  = "Writes fired",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "LastError",
+            description  = "Pulse ID error of the last write",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "PulseRate",
+            description  = "Pulse rate of the clock model",
+            units        = "Hz",
+            mode         = 'RO',
+            value        = 0.0,
+            disp         = '{:0.3f}',
+        ))
+
+    def pulseId(self):
+        return int(readBlock(self._tpg, self._pidOffset, size=8, dtype=np.uint64)[0])
+
+    def calibrate(self):
+        """Add samples timed pulse ID reads to the clock model and refit it.
+
+        The fit spans the retained samples of the last calibrations, so the
+        rate gets more precise as the baseline grows.
+        """
+        start = time.perf_counter()
+        for i in range(self._samples):
+            a   = time.perf_counter()
+            pid = self.pulseId()
+            self._history.append(((a + time.perf_counter()) / 2, pid))
+
+        # Relative to the oldest sample to keep the fit well conditioned
+        t, pid = np.array(self._history).T
+        self._t0, self._pid0 = t[0], int(pid[0])
+        if np.ptp(pid) > 0:
+            self._rate, off = np.polyfit(t - t[0], pid - pid[0], 1)
+            self._pid0 += off
+        self._fitTime = time.perf_counter()
+        self._calTime = self._fitTime - start
+        self.PulseRate.set(float(self._rate))
+
+    def predict(self, t):
+        """Model pulse ID at perf_counter time t"""
+        return self._pid0 + (t - self._t0) * self._rate
+
+    def when(self, pulseId):
+        """Model perf_counter time of a pulse ID"""
+        return self._t0 + (pulseId - self._pid0) / self._rate
+
+    def schedule(self, pulseId, write, value=None):
+        """Queue write (a variable, set to value, or a callable) for pulseId"""
+        with self._cond:
+            heapq.heappush(self._queue, (int(pulseId), next(self._seq), write, value))
+            self.Pending.set(len(self._queue))
+            self._cond.notify()
+
+    def _fire(self, target, write, value):
+        a = time.perf_counter()
+        if callable(write):
+            write()
+        else:
+            write.set(value)
+        b = time.perf_counter()
+        readback = self.pulseId()
+        c = time.perf_counter()
+
+        # Readback moved back from the middle of its read to the middle of the write
+        achieved = int(round(readback - ((b + c) / 2 - (a + b) / 2) * self._rate))
+        error    = achieved - target
+        self.results.append((target, achieved, readback, error, b - a))
+
+        # Learn the lead so the middle of the write lands on target, a step
+        # is bounded by the write time so a scheduling hiccup does not skew it
+        step       = np.clip(error / self._rate, a - b, b - a)
+        self._lead = max(0.0, self._lead + 0.5 * step)
+
+        self.LastError.set(error)
+        self.Fired.set(self.Fired.value() + 1)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._halt and not self._queue:
+                    self._cond.wait()
+                if self._halt:
+                    return
+
+                # Refit sooner while the sample baseline is still short, but
+                # never when the refit would delay the next write
+                target   = self._queue[0][0]
+                fire     = self.when(target) - self._lead
+                baseline = self._history[-1][0] - self._history[0][0]
+                now      = time.perf_counter()
+                if (now - self._fitTime > min(self._refresh, max(0.01, baseline))) and (fire - now > self._calTime + self._spin):
+                    self.calibrate()
+                    fire = self.when(target) - self._lead
+                wait   = fire - time.perf_counter() - self._spin
+                if wait > 0:
+                    # A new earlier write or stop wakes the wait up
+                    self._cond.wait(min(wait, self._refresh))
+                    continue
+
+                target, _, write, value = heapq.heappop(self._queue)
+                self.Pending.set(len(self._queue))
+
+            while time.perf_counter() < fire:
+                pass
+            self._fire(target, write, value)
+
+    def startScheduler(self):
+        if self._thread is None:
+            self._halt = False
+            self.calibrate()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stopScheduler(self):
+        if self._thread is not None:
+            with self._cond:
+                self._halt = True
+                self._cond.notify()
+            self._thread.join()
+            self._thread = None
+
+    def report(self):
+        """Fired writes as a ScheduledWriteType array"""
+        return np.array(self.results, dtype=ScheduledWriteType)
+
+    def _stop(self):
+        self.stopScheduler()
+        super()._stop()
@@ -0,0 +1,166 @@
+#-----------------------------------------------------------------------------
+# Title      : Fixed and AC rate marker divisor planner
+#-----------------------------------------------------------------------------
+# Description:
+# Derives the FixedRateDiv and ACRateDiv divisors of TPGControl and
+# TPGMiniCore from desired marker rates. The fixed rate markers divide the
+# base rate (clock / BaseControl, with the clock from ClockPeriod when the
+# device has it), the AC rate markers divide the power line rate. Plans
+# report the achieved rates and their error, and are written as one burst
+# of divisor block writes followed by a single RateReload. search() scores
+# every candidate base divisor at once.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+import rogue.interfaces.memory as rim
+
+from LclsTimingCore.BlockTransfer   import requestBlock, waitBlock
+from LclsTimingCore.TimingSimMemory import TIMING_CLK_RATE
+
+FIXED_RATE_WIDTH = 20
+AC_RATE_WIDTH    = 8
+AC_LINE_RATE     = 60.0
+
+# Divisor field: (markers, register dtype, divisor width)
+_fields = {
+    'ACRateDiv'    : (6,  np.uint8,  AC_RATE_WIDTH),
+    'FixedRateDiv' : (10, np.uint32, FIXED_RATE_WIDTH),
+}
+
+def decodeClockPeriod(word):
+    """ClockPeriod register (step[4:0], remainder[12:5], divisor[20:13]) in ns"""
+    step, rem, div = word & 0x1F, (word >> 5) & 0xFF, (word >> 13) & 0xFF
+    return step + (rem / div if div else 0.0)
+
+def _rates(rates, markers, name):
+    if len(rates) > markers:
+        raise ValueError(f'{len(rates)} {name} rates given, only {markers} markers')
+    ret = np.full(markers, np.nan)
+    ret[:len(rates)] = [np.nan if r is None else r for r in rates]
+    return ret
+
+def _divisors(base, rates, width):
+    """Best divisors of base for rates, 0 where no rate is requested.
+
+    base and rates broadcast against each other. Both the floor and the
+    ceiling of base/rate are scored, as the rate error is not symmetric.
+    """
+    want = np.isfinite(rates) & (rates > 0)
+    q    = np.where(want, base / np.where(want, rates, 1.0), 1.0)
+    lo   = np.clip(np.floor(q), 1, (1 << width) - 1)
+    hi   = np.clip(lo + 1, 1, (1 << width) - 1)
+    div  = np.where(np.abs(q / lo - 1) <= np.abs(q / hi - 1), lo, hi)
+    return np.where(want, div, 0).astype(np.int64)
+
+class RatePlanner(object):
+    """Divisor plan for the fixed and AC rate markers of a TPG.
+
+    fixed (up to 10) and ac (up to 6) are the desired marker rates in Hz;
+    None, or a missing trailing entry, leaves that marker unchanged. The
+    divisor, achieved rate and relative error of each marker are in
+    fixedDiv/fixedRate/fixedError and acDiv/acRate/acError.
+    """
+    def __init__(self, fixed=(), ac=(), clkRate=TIMING_CLK_RATE, baseDivisor=200, acLineRate=AC_LINE_RATE):
+        self.clkRate     = clkRate
+        self.baseDivisor = int(baseDivisor)
+        self.baseRate    = clkRate / self.baseDivisor
+        self.acLineRate  = acLineRate
+
+        self.fixed      = _rates(fixed, _fields['FixedRateDiv'][0], 'fixed')
+        self.fixedDiv   = _divisors(self.baseRate, self.fixed, FIXED_RATE_WIDTH)
+        self.fixedRate  = np.where(self.fixedDiv > 0, self.baseRate / np.maximum(self.fixedDiv, 1), np.nan)
+        self.fixedError = self.fixedRate / self.fixed - 1.0
+
+        self.ac      = _rates(ac, _fields['ACRateDiv'][0], 'ac')
+        self.acDiv   = _divisors(acLineRate, self.ac, AC_RATE_WIDTH)
+        self.acRate  = np.where(self.acDiv > 0, acLineRate / np.maximum(self.acDiv, 1), np.nan)
+        self.acError = self.acRate / self.ac - 1.0
+
+    @classmethod
+    def fromDevice(cls, dev, fixed=(), ac=(), acLineRate=AC_LINE_RATE):
+        """Plan against the clock and base divisor read from a TPGControl or TPGMiniCore"""
+        clkRate = TIMING_CLK_RATE
+        if 'ClockPeriod' in dev.variables:
+            ns = decodeClockPeriod(int(dev.ClockPeriod.get()))
+            if ns > 0:
+                clkRate = 1e9 / ns
+        return cls(fixed, ac, clkRate, dev.BaseControl.get(), acLineRate)
+
+    @classmethod
+    def search(cls, fixed=(), ac=(), clkRate=TIMING_CLK_RATE, baseDivisors=None, minBaseRate=0.0, top=5, acLineRate=AC_LINE_RATE):
+        """Best plans over candidate base divisors (default all 16 bit values).
+
+        Candidates are ranked by worst fixed rate error, then RMS error,
+        then highest base rate. Base rates below minBaseRate are skipped.
+        """
+        cand  = np.arange(1, 1 << 16) if baseDivisors is None else np.asarray(baseDivisors, dtype=np.int64)
+        cand  = cand[clkRate / cand >= minBaseRate]
+        rates = _rates(fixed, _fields['FixedRateDiv'][0], 'fixed')
+        want  = np.isfinite(rates) & (rates > 0)
+
+        base = (clkRate / cand)[:, None]
+        div  = _divisors(base, rates[want], FIXED_RATE_WIDTH)
+        err  = np.abs(base / div / rates[want] - 1.0)
+
+        worst = err.max(axis=1) if want.any() else np.zeros(len(cand))
+        rms   = np.sqrt((err**2).mean(axis=1)) if want.any() else np.zeros(len(cand))
+        order = np.lexsort((cand, rms, worst))[:top]
+        return [cls(fixed, ac, clkRate, cand[i], acLineRate) for i in order]
+
+    def report(self):
+        """Plan as report lines"""
+        ret = [f'Base rate {self.baseRate:.6f} Hz (clock {self.clkRate:.1f} Hz / {self.baseDivisor})',
+               f"{'marker':>14} {'desired Hz':>14} {'divisor':>8} {'achieved Hz':>14} {'error ppm':>12}"]
+        for name, rates, div, got, err in (('FixedRateDiv', self.fixed, self.fixedDiv, self.fixedRate, self.fixedError),
+                                           ('ACRateDiv',    self.ac,    self.acDiv,    self.acRate,    self.acError)):
+            for i in np.flatnonzero(div):
+                ret.append(f'{name+f"[{i}]":>14} {rates[i]:14.6f} {div[i]:8d} {got[i]:14.6f} {err[i]*1e6:12.3f}')
+        return ret
+
+    def apply(self, dev, refresh=True):
+        """Write the divisors to dev in one burst, then a single RateReload.
+
+        BaseControl is written first when it differs from the plan. The
+        divisor windows are read, the planned markers replaced and all
+        windows written back before RateReload latches them together.
+        """
+        if self.baseDivisor != dev.BaseControl.get():
+            dev.BaseControl.set(self.baseDivisor)
+
+        windows = []
+        for name, div in (('ACRateDiv', self.acDiv), ('FixedRateDiv', self.fixedDiv)):
+            if not div.any():
+                continue
+            if f'{name}[0]' not in dev.variables:
+                raise ValueError(f'{dev.path} has no {name} markers')
+
+            markers, dtype, _ = _fields[name]
+            offset = dev.variables[f'{name}[0]'].offset
+            start  = offset & ~0x3
+            size   = (offset - start + markers * np.dtype(dtype).itemsize + 3) & ~0x3
+            windows.append((start, offset - start, dtype, div, np.empty(size, dtype=np.uint8)))
+
+        with dev._memLock:
+            dev._clearError()
+            waitBlock(dev, 0, [tid for start, _, _, _, buf in windows for tid in requestBlock(dev, start, buf, rim.Read)])
+
+            for _, skip, dtype, div, buf in windows:
+                regs = buf[skip:skip + len(div) * np.dtype(dtype).itemsize].view(dtype)
+                regs[div > 0] = div[div > 0]
+
+            waitBlock(dev, 0, [tid for start, _, _, _, buf in windows for tid in requestBlock(dev, start, buf, rim.Write)])
+
+        if windows:
+            dev.RateReload.set(1)
+
+        if refresh:
+            dev.readBlocks(recurse=False)
+            dev.checkBlocks(recurse=False)
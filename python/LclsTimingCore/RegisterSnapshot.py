@@ -0,0 +1,259 @@
+#-----------------------------------------------------------------------------
+# Title      : Binary register window snapshots
+#-----------------------------------------------------------------------------
+# Description:
+# Saves and restores the registers of a device tree with block transfers
+# instead of per variable YAML. The remote variables of every device are
+# merged into contiguous 32-bit word windows which are read in one pass.
+#
+# File format (little endian):
+#   magic      : 8 bytes, SNAPSHOT_MAGIC
+#   headerLen  : uint32
+#   header     : JSON, headerLen bytes (layout and variable metadata)
+#   padding    : to a multiple of 8 bytes
+#   data       : uint32 words of all windows, in header order
+#
+# Restore only writes words holding RW variables, with every non RW bit
+# (RO, WO or unmapped) written as zero. WO only words are never read.
+# Registers with read side effects are not captured by default, and RW
+# registers that the hardware advances or clears, or whose write is a
+# strobe acting on timing or BSA state, are not restored.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import json
+import bisect
+import contextlib
+
+import numpy   as np
+import pyrogue as pr
+import rogue.interfaces.memory as rim
+
+from LclsTimingCore.BlockTransfer import requestBlock, waitBlock
+
+SNAPSHOT_MAGIC   = b'LTCSNAP\x00'
+SNAPSHOT_VERSION = 1
+
+# Variable names never read by default: reading pops a FIFO or the value
+# is BSA completion state
+SNAPSHOT_EXCLUDE = ('SeqFifoData', 'BsaCompleteL', 'BsaCompleteU', 'BsaCompleteRd')
+
+# RW variable names never written back, indexed variables by their base
+# name: restoring would rewind the pulse ID or time stamp, clear BSA
+# completion or interval status bits, (re)start BSA definitions or fire
+# load, reset and sync strobes
+SNAPSHOT_NO_RESTORE = (
+    'PulseIdL', 'PulseIdU', 'TStampL', 'TStampU',
+    'PulseIdSet', 'TStampSet',
+    'BsaCompleteL', 'BsaCompleteU', 'BsaActive', 'Lcls1BsaStart',
+    'IrqIntvStatus', 'Sync', 'CountReset', 'StartSync',
+)
+
+def bitFields(v):
+    """[bitOffsets, bitSizes] lists of a remote variable"""
+    bitOffset = v.bitOffset if isinstance(v.bitOffset, (list, tuple)) else [v.bitOffset]
+    bitSize   = v.bitSize   if isinstance(v.bitSize,   (list, tuple)) else [v.bitSize]
+    return [list(bitOffset), list(bitSize)]
+
+def wordMasks(offset, bitOffset, bitSize):
+    """Yield the (32-bit word index, mask) pairs covered by a variable"""
+    for bo, bs in zip(bitOffset, bitSize):
+        bit = offset*8 + bo
+        while bs > 0:
+            word = bit // 32
+            n    = min(bs, 32 - bit % 32)
+            yield word, ((1 << n) - 1) << (bit % 32)
+            bit += n
+            bs  -= n
+
+def _walk(dev, prefix=''):
+    yield prefix, dev
+    for d in dev.devices.values():
+        yield from _walk(d, f'{prefix}{d.name}.')
+
+def snapshotLayout(dev, maxGap=0, exclude=SNAPSHOT_EXCLUDE):
+    """Compute the snapshot layout of a device tree.
+
+    Variables are listed once as [path, device, offset, bitOffsets, bitSizes,
+    mode], windows as [device, offset, words, data index]. Windows separated
+    by at most maxGap unmapped bytes are merged into one transfer.
+    Variables whose path or name is in exclude (e.g. FIFO registers with
+    read side effects) are left out.
+    """
+    devices   = []
+    windows   = []
+    variables = []
+    index     = 0
+
+    for prefix, d in _walk(dev):
+        words = {}
+        for v in d.variables.values():
+            if not isinstance(v, pr.RemoteVariable) or v.mode == 'WO' or prefix+v.name in exclude or v.name in exclude:
+                continue
+            bitOffset, bitSize = bitFields(v)
+            variables.append([prefix+v.name, len(devices), v.offset, bitOffset, bitSize, v.mode])
+            for w, _ in wordMasks(v.offset, bitOffset, bitSize):
+                words[w] = True
+
+        if words:
+            addr = np.unique(np.fromiter(words, dtype=np.int64))
+            gap  = maxGap // 4 + 1
+            cuts = np.flatnonzero(np.diff(addr) > gap) + 1
+            for run in np.split(addr, cuts):
+                size = int(run[-1] - run[0]) + 1
+                windows.append([len(devices), int(run[0])*4, size, index])
+                index += size
+
+        devices.append(prefix[:-1])
+
+    return {
+        'version'   : SNAPSHOT_VERSION,
+        'devices'   : devices,
+        'windows'   : windows,
+        'variables' : variables,
+        'words'     : index,
+    }
+
+class RegisterSnapshot(object):
+    """Register contents of a device tree captured with block reads.
+
+    Use RegisterSnapshot.read(dev) to capture, save()/load() for files and
+    restore(dev) to write the RW registers back.
+    """
+    def __init__(self, layout, data):
+        self.layout = layout
+        self.data   = data
+
+        # Layout entry of every variable path
+        self.varIndex  = {v[0]: v for v in layout['variables']}
+        self._devWins  = {}
+        for w in layout['windows']:
+            self._devWins.setdefault(w[0], []).append(w)
+        self._devStart = {d: [w[1]//4 for w in wins] for d, wins in self._devWins.items()}
+
+    def dataIndex(self, d, word):
+        """Index in data of word address word of layout device d"""
+        _, off, size, i = self._devWins[d][bisect.bisect_right(self._devStart[d], word) - 1]
+        return i + word - off//4
+
+    @staticmethod
+    def nodes(dev, layout):
+        """Device nodes under dev of the layout devices, in layout order"""
+        nodes = dict((p[:-1], d) for p, d in _walk(dev))
+        try:
+            return [nodes[p] for p in layout['devices']]
+        except KeyError as e:
+            raise ValueError(f'Snapshot device {e} not found under {dev.path}')
+
+    @staticmethod
+    def transfer(nodes, windows, data, txnType):
+        """Transfer [device, offset, words, data index] windows of nodes.
+
+        Every window is issued before waiting, so the transfers are
+        pipelined, with the memory lock of every node held throughout.
+        """
+        with contextlib.ExitStack() as stack:
+            for n in dict.fromkeys(nodes):
+                stack.enter_context(n._memLock)
+                n._clearError()
+
+            pending = [(nodes[d], off, requestBlock(nodes[d], off, data[i:i+size], txnType))
+                       for d, off, size, i in windows]
+
+            for n, off, ids in pending:
+                waitBlock(n, off, ids)
+
+    @classmethod
+    def read(cls, dev, maxGap=0, exclude=SNAPSHOT_EXCLUDE):
+        layout = snapshotLayout(dev, maxGap, exclude)
+        data   = np.zeros(layout['words'], dtype=np.uint32)
+        cls.transfer(cls.nodes(dev, layout), layout['windows'], data, rim.Read)
+        return cls(layout, data)
+
+    def rwMask(self, skip=SNAPSHOT_NO_RESTORE):
+        """Mask of the RW bits in data, without variables named in skip.
+
+        Indexed variables (Name[i]) are skipped by their base name.
+        """
+        mask = np.zeros(len(self.data), dtype=np.uint32)
+        for path, d, offset, bitOffset, bitSize, mode in self.layout['variables']:
+            if mode == 'RW' and path.rsplit('.', 1)[-1].split('[')[0] not in skip:
+                for w, m in wordMasks(offset, bitOffset, bitSize):
+                    mask[self.dataIndex(d, w)] |= m
+        return mask
+
+    def restore(self, dev, refresh=True, skip=SNAPSHOT_NO_RESTORE):
+        """Write the RW registers of the snapshot back to dev.
+
+        The device tree must have the same layout as when the snapshot was
+        taken. Only words with RW bits are written, in runs of consecutive
+        words, leaving out the variables named in skip. With refresh the
+        variable shadows are read back afterwards.
+        """
+        live = snapshotLayout(dev, exclude=())
+        if [v for v in live['variables'] if v[0] in self.varIndex] != self.layout['variables']:
+            raise ValueError(f'Snapshot layout does not match {dev.path}')
+
+        mask  = self.rwMask(skip)
+        data  = self.data & mask
+        nodes = self.nodes(dev, self.layout)
+
+        # Split every window into runs of words holding RW bits
+        runs = []
+        for d, off, size, i in self.layout['windows']:
+            sel = np.flatnonzero(mask[i:i+size])
+            if len(sel) == 0:
+                continue
+            cuts = np.flatnonzero(np.diff(sel) > 1) + 1
+            for run in np.split(sel, cuts):
+                runs.append([d, off + int(run[0])*4, len(run), i + int(run[0])])
+
+        self.transfer(nodes, runs, data, rim.Write)
+
+        if refresh:
+            dev.readBlocks(recurse=True)
+            dev.checkBlocks(recurse=True)
+
+    def rawValue(self, path):
+        """Raw integer value of a variable in the snapshot"""
+        _, d, offset, bitOffset, bitSize, _ = self.varIndex[path]
+        ret   = 0
+        shift = 0
+        for w, m in wordMasks(offset, bitOffset, bitSize):
+            word  = int(self.data[self.dataIndex(d, w)])
+            low = (m & -m).bit_length() - 1
+            ret |= ((word & m) >> low) << shift
+            shift += m.bit_length() - low
+        return ret
+
+    def save(self, path):
+        header = json.dumps(self.layout, separators=(',', ':')).encode()
+        pad    = -(len(SNAPSHOT_MAGIC) + 4 + len(header)) % 8
+        with open(path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(np.uint32(len(header)).tobytes())
+            f.write(header)
+            f.write(b'\x00' * pad)
+            f.write(self.data.astype('<u4').tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError(f'{path} is not a register snapshot')
+            size   = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+            layout = json.loads(f.read(size))
+            f.read(-(len(SNAPSHOT_MAGIC) + 4 + size) % 8)
+            data   = np.fromfile(f, dtype='<u4', count=layout['words'])
+
+        if layout['version'] != SNAPSHOT_VERSION:
+            raise ValueError(f'{path} has snapshot version {layout["version"]}, expected {SNAPSHOT_VERSION}')
+
+        return cls(layout, data.astype(np.uint32))
@@ -0,0 +1,192 @@
+#-----------------------------------------------------------------------------
+# Title      : Sequence checkpoint FIFO drain
+#-----------------------------------------------------------------------------
+# Description:
+# Drains TPGControl.SeqFifoData, the sequence checkpoint FIFO, in bursts of
+# pipelined reads of the FIFO address until a burst reads no valid word.
+# Entries are stored in a timestamped ring buffer and dispatched to callbacks
+# registered per sequence engine. The drain runs on the checkpoint
+# interrupt when a wait function for it is given, else on a fast poll.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import threading
+
+import numpy   as np
+import pyrogue as pr
+import rogue.interfaces.memory as rim
+
+from LclsTimingCore.BlockTransfer import requestBlock, waitBlock
+
+# Checkpoint word: valid[31], sequence engine[22:16], instruction address[15:0]
+SEQ_FIFO_VALID      = 0x80000000
+SEQ_FIFO_SEQ_SHIFT  = 16
+SEQ_FIFO_SEQ_MASK   = 0x7F
+SEQ_FIFO_ADDR_MASK  = 0xFFFF
+
+CheckpointType = np.dtype([
+    ('time',    '<f8'),
+    ('seq',     'u1'),
+    ('address', '<u2'),
+    ('word',    '<u4'),
+])
+
+class SeqFifoDrain(pr.Device):
+    """Drains the sequence checkpoint FIFO of a TPGControl.
+
+    Starting the drain sets IrqFifoEnable and IrqEnable and stops the
+    polling of SeqFifoData until the drain is stopped. irqWait, if given,
+    is called with a timeout in seconds and returns once the checkpoint
+    interrupt fires (or the timeout expires); without it the FIFO is polled
+    every poll seconds. Each drain issues burst reads of the FIFO at once
+    and repeats while any word read was valid. The last depth entries are kept, see history().
+    """
+    def __init__(   self,
+            tpg,
+            name        = "SeqFifoDrain",
+            description = "Sequence checkpoint FIFO drain",
+            burst       = 16,
+            poll        = 0.001,
+            irqWait     = None,
+            depth       = 65536,
+            **kwargs):
+        super().__init__(name=name, description=description, **kwargs)
+
+        self._tpg       = tpg
+        self._offset    = tpg.SeqFifoData.offset
+        self._buf       = np.zeros(burst, dtype=np.uint32)
+        self._poll      = poll
+        self._irqWait   = irqWait
+        self._ring      = np.zeros(depth, dtype=CheckpointType)
+        self._count     = 0
+        self._callbacks = {}
+        self._lock      = threading.Lock()
+        self._thread    = None
+        self._halt      = threading.Event()
+        self._fifoPoll  = None
+
+        ##############################
+        # Variables
+        ##############################
+
+        self.add(pr.LocalVariable(
+            name         = "Entries",
+            description  = "Checkpoints drained",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "Bursts",
+            description  = "FIFO read bursts issued",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+        self.add(pr.LocalVariable(
+            name         = "Overwritten",
+            description  = "Checkpoints overwritten in the ring buffer",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+    def addCallback(self, seq, callback):
+        """Call callback(entries) with the CheckpointType entries of sequence engine seq"""
+        self._callbacks.setdefault(seq, []).append(callback)
+
+    def removeCallback(self, seq, callback):
+        self._callbacks.get(seq, []).remove(callback)
+
+    def _burst(self):
+        tpg = self._tpg
+        buf = self._buf
+        with tpg._memLock:
+            tpg._clearError()
+            ids = [tid for i in range(len(buf)) for tid in requestBlock(tpg, self._offset, buf[i:i+1], rim.Read)]
+            waitBlock(tpg, self._offset, ids)
+        self.Bursts.set(self.Bursts.value() + 1)
+
+        # Every read popped the FIFO, so valid words after an empty read
+        # are kept too
+        return buf[(buf & SEQ_FIFO_VALID) != 0].copy()
+
+    def drain(self):
+        """Read the FIFO until empty, store and dispatch the entries, returns them"""
+        words = []
+        while True:
+            w = self._burst()
+            words.append(w)
+            if len(w) == 0:
+                break
+
+        words = np.concatenate(words)
+        if len(words) == 0:
+            return np.zeros(0, dtype=CheckpointType)
+
+        ent = np.zeros(len(words), dtype=CheckpointType)
+        ent['time']    = time.time()
+        ent['seq']     = (words >> SEQ_FIFO_SEQ_SHIFT) & SEQ_FIFO_SEQ_MASK
+        ent['address'] = words & SEQ_FIFO_ADDR_MASK
+        ent['word']    = words
+
+        with self._lock:
+            depth = len(self._ring)
+            idx   = (self._count + np.arange(len(ent))) % depth
+            self._ring[idx] = ent
+            self._count += len(ent)
+            self.Entries.set(self._count)
+            self.Overwritten.set(max(0, self._count - depth))
+
+        for seq in np.unique(ent['seq']):
+            cbs = self._callbacks.get(int(seq))
+            if cbs:
+                sel = ent[ent['seq'] == seq]
+                for cb in cbs:
+                    cb(sel)
+        return ent
+
+    def history(self, seq=None):
+        """Kept entries, oldest first, optionally of one sequence engine"""
+        with self._lock:
+            depth = len(self._ring)
+            n     = min(self._count, depth)
+            ret   = self._ring[(self._count - n + np.arange(n)) % depth]
+        return ret if seq is None else ret[ret['seq'] == seq]
+
+    def _run(self):
+        while not self._halt.is_set():
+            if self._irqWait is not None:
+                self._irqWait(0.1)
+            elif self._halt.wait(self._poll):
+                break
+            self.drain()
+
+    def startDrain(self):
+        if self._thread is None:
+            # A polled read would pop checkpoints from the FIFO
+            self._fifoPoll = self._tpg.SeqFifoData.pollInterval
+            self._tpg.SeqFifoData.pollInterval = 0
+            self._tpg.IrqFifoEnable.set(1)
+            self._tpg.IrqEnable.set(1)
+            self._halt.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stopDrain(self):
+        if self._thread is not None:
+            self._halt.set()
+            self._thread.join()
+            self._thread = None
+            self._tpg.SeqFifoData.pollInterval = self._fifoPoll
+
+    def _stop(self):
+        self.stopDrain()
+        super()._stop()
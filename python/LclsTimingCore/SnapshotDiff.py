@@ -0,0 +1,170 @@
+#-----------------------------------------------------------------------------
+# Title      : Register snapshot diff and minimal write apply
+#-----------------------------------------------------------------------------
+# Description:
+# Compares two RegisterSnapshot captures of the same device tree and turns
+# the changed RW fields into the smallest set of 32-bit word writes. Fields
+# sharing a word are merged into one write and adjacent words are sent as
+# one block transfer. Writes are issued in phases:
+#
+#   PHASE_DISABLE : enables cleared on every changed trigger/channel
+#   PHASE_CONFIG  : changed words, enables of changed triggers held off
+#   PHASE_ENABLE  : enables set to their new value
+#   PHASE_RELOAD  : RateReload on devices whose rate divisors changed
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+import rogue.interfaces.memory as rim
+
+from LclsTimingCore.RegisterSnapshot import RegisterSnapshot, bitFields, wordMasks
+
+# Enable fields, by the name prefix of the fields they gate. An enable is
+# held off while a changed field of its device with that prefix and the
+# same array index is written; an enable without an index gates every
+# index.
+DIFF_ENABLE_FIELDS = {
+    'EnableTrig'    : '',
+    'EnableReg'     : '',
+    'TriggerEnable' : 'Trigger',
+    'ChannelEnable' : 'Channel',
+}
+DIFF_RATE_FIELDS   = ['FixedRateDiv', 'ACRateDiv']
+DIFF_RELOAD_FIELD  = 'RateReload'
+
+PHASE_DISABLE = 0
+PHASE_CONFIG  = 1
+PHASE_ENABLE  = 2
+PHASE_RELOAD  = 3
+
+def _baseName(path):
+    return path.rsplit('.', 1)[-1].split('[', 1)[0]
+
+def _arrayIndex(path):
+    name = path.rsplit('.', 1)[-1]
+    return name.split('[', 1)[1] if '[' in name else None
+
+class SnapshotDiff(object):
+    """Field level diff between two snapshots of the same device tree.
+
+    fields lists the changed RW variables as (path, old, new) raw values.
+    plan(dev) returns the ordered word writes as (phase, device path, byte
+    offset, value) and apply(dev) issues them. The old snapshot is assumed
+    to match the current hardware contents.
+    """
+    def __init__(self, old, new):
+        if old.layout['variables'] != new.layout['variables'] or old.layout['windows'] != new.layout['windows']:
+            raise ValueError('Snapshots do not have the same layout')
+
+        self.old  = old
+        self.new  = new
+        self.mask = new.rwMask()
+
+        # Device index and byte offset of every data word
+        n = len(new.data)
+        self._wordDev  = np.zeros(n, dtype=np.int64)
+        self._wordAddr = np.zeros(n, dtype=np.int64)
+        for d, off, size, i in new.layout['windows']:
+            self._wordDev[i:i+size]  = d
+            self._wordAddr[i:i+size] = off + 4*np.arange(size)
+
+        changed    = (old.data ^ new.data) & self.mask
+        changedSet = set(np.flatnonzero(changed).tolist())
+        self._changedDevs = set(self._wordDev[list(changedSet)].tolist())
+
+        self.fields = []
+        for path, d, offset, bitOffset, bitSize, mode in new.layout['variables']:
+            if mode != 'RW':
+                continue
+            if any(new.dataIndex(d, w) in changedSet for w, _ in wordMasks(offset, bitOffset, bitSize)):
+                self.fields.append((path, old.rawValue(path), new.rawValue(path)))
+
+    def _gated(self, path, d):
+        # Whether a changed field is gated by the enable at path
+        prefix = DIFF_ENABLE_FIELDS[_baseName(path)]
+        index  = _arrayIndex(path)
+        return any(self.new.varIndex[p][1] == d and _baseName(p).startswith(prefix) and
+                   (index is None or _arrayIndex(p) == index) for p, _, _ in self.fields)
+
+    def _enableMask(self):
+        mask = np.zeros(len(self.mask), dtype=np.uint32)
+        for path, d, offset, bitOffset, bitSize, mode in self.new.layout['variables']:
+            if mode == 'RW' and d in self._changedDevs and _baseName(path) in DIFF_ENABLE_FIELDS and self._gated(path, d):
+                for w, m in wordMasks(offset, bitOffset, bitSize):
+                    mask[self.new.dataIndex(d, w)] |= m
+        return mask
+
+    def _phases(self, dev):
+        # Track the word values the hardware holds after each phase
+        cur    = self.old.data & self.mask
+        target = self.new.data & self.mask
+        enable = self._enableMask()
+        writes = []
+
+        def phase(value):
+            sel = np.flatnonzero(value != cur)
+            cur[sel] = value[sel]
+            return sel, value[sel]
+
+        writes.append(phase(np.where(enable != 0, cur & ~enable, cur)))
+        writes.append(phase(np.where(enable != 0, target & ~enable, target)))
+        writes.append(phase(target))
+
+        # RateReload is WO, so it is looked up on the live device tree
+        reload   = []
+        rateDevs = {self.new.varIndex[path][1] for path, _, _ in self.fields if _baseName(path) in DIFF_RATE_FIELDS}
+
+        if rateDevs:
+            nodes = RegisterSnapshot.nodes(dev, self.new.layout)
+            for d in sorted(rateDevs):
+                v = nodes[d].variables.get(DIFF_RELOAD_FIELD)
+                if v is not None:
+                    for w, m in wordMasks(v.offset, *bitFields(v)):
+                        reload.append((d, w*4, m))
+
+        return writes, reload
+
+    def plan(self, dev):
+        """Ordered list of (phase, device path, byte offset, value) writes"""
+        devices = self.new.layout['devices']
+        writes, reload = self._phases(dev)
+
+        ret = []
+        for ph, (sel, value) in enumerate(writes):
+            for i, v in zip(sel.tolist(), value.tolist()):
+                ret.append((ph, devices[self._wordDev[i]], int(self._wordAddr[i]), v))
+        for d, off, v in reload:
+            ret.append((PHASE_RELOAD, devices[d], off, v))
+        return ret
+
+    def apply(self, dev, refresh=True):
+        """Write the plan to dev, waiting for each phase before the next"""
+        nodes = RegisterSnapshot.nodes(dev, self.new.layout)
+        writes, reload = self._phases(dev)
+
+        for sel, value in writes:
+            if len(sel) == 0:
+                continue
+
+            # Adjacent words of the same device become one block write
+            key  = self._wordDev[sel] * (1 << 32) + self._wordAddr[sel]
+            cuts = np.flatnonzero(np.diff(key) != 4) + 1
+            buf  = np.ascontiguousarray(value, dtype=np.uint32)
+            runs = [[int(self._wordDev[sel[r[0]]]), int(self._wordAddr[sel[r[0]]]), len(r), int(r[0])]
+                    for r in np.split(np.arange(len(sel)), cuts)]
+            RegisterSnapshot.transfer(nodes, runs, buf, rim.Write)
+
+        if reload:
+            buf = np.array([v for _, _, v in reload], dtype=np.uint32)
+            RegisterSnapshot.transfer(nodes, [[d, off, 1, i] for i, (d, off, _) in enumerate(reload)], buf, rim.Write)
+
+        if refresh:
+            dev.readBlocks(recurse=True)
+            dev.checkBlocks(recurse=True)
@@ -0,0 +1,222 @@
+#-----------------------------------------------------------------------------
+# Title      : Sharded TPG message simulation
+#-----------------------------------------------------------------------------
+# Description:
+# Generates the timing messages of a TPG (pulse ID, time stamp, fixed and
+# AC rate markers, BSA active/average done/done masks) for a pulse ID
+# range from the TPGMiniCore or TPGControl register configuration. Every
+# message is a closed form function of its pulse ID, including the BSA
+# event counts before the range, so the range can be split across worker
+# processes that write their segments into one shared .npy file, and the
+# stitched result is bit identical to a single process run.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import math
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from LclsTimingCore.BlockTransfer import readBlock
+from LclsTimingCore.BsaModel      import bsaDefs, BSA_DEST_INCLUSIVE, BSA_NTOAVG_ZERO
+from LclsTimingCore.RatePlanner   import FIXED_RATE_WIDTH, AC_RATE_WIDTH
+
+# The 186 MHz clock as an exact fraction and the power line rate
+TPG_CLK_NUM   = 1300000000
+TPG_CLK_DEN   = 7
+TPG_LINE_RATE = 60
+
+# AC marker divisors of a TPGMiniCore, which has no ACRateDiv: 60, 30, 10, 5, 1, 0.5 Hz
+TPG_AC_DIVISORS = [1, 2, 6, 12, 60, 120]
+
+TPGMessageType = np.dtype([
+    ('pulseId',    '<u8'),
+    ('timeStamp',  '<u8'),
+    ('fixedRates', '<u2'),
+    ('acRates',    'u1'),
+    ('bsaActive',  '<u8'),
+    ('bsaAvgDone', '<u8'),
+    ('bsaDone',    '<u8'),
+])
+
+# BSA definition: rate mode (0 fixed, 1 AC, others never fire), rate
+# marker, samples per average, averages to write and init pulse ID
+EdefType = np.dtype([
+    ('edef',    'u1'),
+    ('mode',    'u1'),
+    ('rate',    'u1'),
+    ('nToAvg',  '<u4'),
+    ('avgToWr', '<u4'),
+    ('start',   '<u8'),
+])
+
+def simConfig(dev, starts=None, timeStamp0=0):
+    """Simulation configuration from a TPGMiniCore or TPGControl.
+
+    Rate markers fire on the pulse IDs that are multiples of their divisor
+    (the power line ticks for AC markers); a zero divisor counts the full
+    divider width, as the firmware divider does.
+
+    starts maps the started BSA definitions to their init pulse IDs, the
+    others stay idle; a definition samples from the pulse after its init,
+    as BsaControl does. timeStamp0 is the time stamp (seconds) of pulse 0.
+    The simulated messages request no beam, so beam inclusive definitions
+    never fire.
+    """
+    starts = {} if starts is None else starts
+    offset = dev.variables['FixedRateDiv[0]'].offset
+    edefs  = np.zeros(len(starts), dtype=EdefType)
+
+    config = {
+        'baseDivisor' : int(dev.BaseControl.get()),
+        'fixedDiv'    : readBlock(dev, offset, size=40).astype(np.int64),
+        'acDiv'       : np.array(TPG_AC_DIVISORS, dtype=np.int64),
+        'timeStamp0'  : int(timeStamp0),
+        'edefs'       : edefs,
+    }
+
+    if 'ACRateDiv[0]' in dev.variables:
+        config['acDiv'] = readBlock(dev, dev.variables['ACRateDiv[0]'].offset, size=8, dtype=np.uint8)[:6].astype(np.int64)
+
+    defs = bsaDefs(dev)
+    mode = np.where(defs['destMode'] == BSA_DEST_INCLUSIVE, 3, defs['rateMode'])
+    rate = np.where(defs['rateMode'] == 0, defs['fixedRate'], defs['acRate'])
+    for j, (e, start) in enumerate(sorted(starts.items())):
+        edefs[j] = (e, mode[e], rate[e], defs['nToAvg'][e], defs['avgToWr'][e], start)
+    return config
+
+def _ratio(num, den):
+    g = math.gcd(num, den)
+    return num // g, den // g
+
+def _acTicks(config, p):
+    """Index of the last power line tick at or before pulse IDs p"""
+    num, den = _ratio(TPG_LINE_RATE * TPG_CLK_DEN * config['baseDivisor'], TPG_CLK_NUM)
+    return np.where(p < 0, -1, (np.maximum(p, 0) * num) // den)
+
+def _fires(config, mode, rate, p, acTick):
+    """Marker mask of a fixed (mode 0) or AC (mode 1) rate at pulse IDs p"""
+    if mode == 0:
+        div = int(config['fixedDiv'][rate]) or (1 << FIXED_RATE_WIDTH)
+        return p % div == 0
+    if mode == 1:
+        div = int(config['acDiv'][rate]) or (1 << AC_RATE_WIDTH)
+        return acTick & (_acTicks(config, p) % div == 0)
+    return np.zeros(len(p), dtype=bool)
+
+def _count(config, mode, rate, a, b):
+    """Number of marker fires in pulse IDs [a, b)"""
+    if b <= a:
+        return 0
+    if mode == 0:
+        div = int(config['fixedDiv'][rate]) or (1 << FIXED_RATE_WIDTH)
+        return (-(-b // div)) - (-(-a // div))
+    if mode == 1:
+        div = int(config['acDiv'][rate]) or (1 << AC_RATE_WIDTH)
+        n   = _acTicks(config, np.array([a-1, b-1]))
+        return int(n[1] // div - n[0] // div)
+    return 0
+
+def generateSegment(config, start, stop, out=None):
+    """Messages of pulse IDs [start, stop) as a TPGMessageType array"""
+    p   = np.arange(start, stop, dtype=np.int64)
+    out = np.zeros(len(p), dtype=TPGMessageType) if out is None else out
+
+    num, den = _ratio(1000000000 * TPG_CLK_DEN * config['baseDivisor'], TPG_CLK_NUM)
+    ns       = (p * num) // den
+    out['pulseId']   = p
+    out['timeStamp'] = ((config['timeStamp0'] + ns // 1000000000).astype(np.uint64) << np.uint64(32)) | (ns % 1000000000).astype(np.uint64)
+
+    fixed = np.zeros(len(p), dtype=np.uint16)
+    for i in range(len(config['fixedDiv'])):
+        fixed |= _fires(config, 0, i, p, None).astype(np.uint16) << np.uint16(i)
+    out['fixedRates'] = fixed
+
+    ticks  = _acTicks(config, p)
+    acTick = ticks != _acTicks(config, p - 1)
+    ac     = np.zeros(len(p), dtype=np.uint8)
+    for i in range(len(config['acDiv'])):
+        ac |= _fires(config, 1, i, p, acTick).astype(np.uint8) << np.uint8(i)
+    out['acRates'] = ac
+
+    active  = np.zeros(len(p), dtype=np.uint64)
+    avgDone = np.zeros(len(p), dtype=np.uint64)
+    done    = np.zeros(len(p), dtype=np.uint64)
+    for e in config['edefs']:
+        mode, rate, s = int(e['mode']), int(e['rate']), int(e['start'])
+        n    = int(e['nToAvg']) or BSA_NTOAVG_ZERO
+        last = n * int(e['avgToWr'])
+
+        # Event number of every fire since the start, from a closed form
+        # count before the segment so any segment gives the same numbers
+        fire = _fires(config, mode, rate, p, acTick) & (p > s)
+        k    = _count(config, mode, rate, s + 1, max(s + 1, start)) + np.cumsum(fire)
+        act  = fire & ((k <= last) if last else True)
+
+        bit = np.uint64(1) << np.uint64(e['edef'])
+        active  |= np.where(act, bit, np.uint64(0))
+        avgDone |= np.where(act & (k % n == 0), bit, np.uint64(0))
+        done    |= np.where(act & (k == last), bit, np.uint64(0))
+
+    out['bsaActive']  = active
+    out['bsaAvgDone'] = avgDone
+    out['bsaDone']    = done
+    return out
+
+def _simWorker(config, path, start, offset, count, chunk):
+    out = np.load(path, mmap_mode='r+')
+    for i in range(0, count, chunk):
+        n = min(chunk, count - i)
+        generateSegment(config, start + offset + i, start + offset + i + n, out=out[offset+i:offset+i+n])
+    out.flush()
+
+class TPGSimulation(object):
+    """Multi-process TPG message generator.
+
+    run() splits count pulse IDs from start into shards of at most chunk
+    pulses, generates them in workers processes and stitches them in a
+    .npy file at path. The file is returned memory mapped; without path a
+    temporary file (in /dev/shm where available) is loaded and removed.
+    """
+    def __init__(self, config, workers=4, chunk=1 << 20):
+        self.config  = config
+        self.workers = workers
+        self.chunk   = chunk
+
+    def generate(self, start, count):
+        """Single process reference run"""
+        return generateSegment(self.config, start, start + count)
+
+    def run(self, start, count, path=None):
+        temp = path is None
+        if temp:
+            fd, path = tempfile.mkstemp(suffix='.npy', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+            os.close(fd)
+
+        out = np.lib.format.open_memmap(path, mode='w+', dtype=TPGMessageType, shape=(count,))
+        out.flush()
+        del out
+
+        # Shards are whole chunks, handed out to the workers as they free up
+        shards = [(self.config, path, start, off, min(self.chunk, count - off), self.chunk)
+                  for off in range(0, count, self.chunk)]
+
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(self.workers) as pool:
+            pool.starmap(_simWorker, shards)
+
+        if temp:
+            try:
+                return np.load(path)
+            finally:
+                os.remove(path)
+        return np.load(path, mmap_mode='r')
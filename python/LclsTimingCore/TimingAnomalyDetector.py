@@ -0,0 +1,244 @@
+#-----------------------------------------------------------------------------
+# Title      : Timing error counter anomaly detector
+#-----------------------------------------------------------------------------
+# Description:
+# Rolling statistics over fleet wide snapshots of timing error counters
+# (TimingFrameRx CrcErrCount, RxDecErrCount, RxDspErrCount, RxRstCount or
+# TPGMiniCore SyncErrCnt). Each receiver/counter pair keeps a NumPy ring
+# buffer of count rates with running sums, so a sample costs O(1) no matter
+# how large the fleet or window is. Three conditions are flagged:
+#
+#   burst : rate above window mean + burstSigma * std (and >= burstMin counts)
+#   drift : window mean above driftRatio * long term (EWMA) rate + driftMin
+#   peer  : window mean above fleet median + peerSigma * MAD + peerMin
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+
+import numpy   as np
+import pyrogue as pr
+
+TIMING_ANOMALY_COUNTERS = ['CrcErrCount', 'RxDecErrCount', 'RxDspErrCount', 'RxRstCount']
+TPG_ANOMALY_COUNTERS    = ['SyncErrCnt']
+
+# Flag bits in counterFlags / flags
+ANOMALY_BURST = 0x1
+ANOMALY_DRIFT = 0x2
+ANOMALY_PEER  = 0x4
+
+class TimingAnomalyDetector(pr.Device):
+    """Flags error counter bursts, drifts and peer outliers across a fleet.
+
+    Feed it with update() (a (receivers, counters) array of raw counter
+    values) or directly from TimingFleetMonitor with
+    callback=detector.updateRecords. Per receiver results are available in
+    counterFlags (receivers x counters) and flags (receivers), summaries are
+    published as LinkVariables.
+    """
+    def __init__(   self,
+            name        = "TimingAnomalyDetector",
+            description = "Timing error counter anomaly detector",
+            receivers   = 1,
+            counters    = TIMING_ANOMALY_COUNTERS,
+            window      = 64,
+            minSamples  = 8,
+            burstSigma  = 6.0,
+            burstMin    = 10,
+            driftTau    = 1024,
+            driftRatio  = 2.0,
+            driftMin    = 1.0,
+            peerSigma   = 6.0,
+            peerMin     = 1.0,
+            **kwargs):
+        super().__init__(name=name, description=description, **kwargs)
+
+        self._counters   = list(counters)
+        self._nrx        = receivers
+        self._window     = window
+        self._minSamples = min(minSamples, window)
+        self._burstSigma = burstSigma
+        self._burstMin   = burstMin
+        self._driftAlpha = 1.0 / driftTau
+        self._driftRatio = driftRatio
+        self._driftMin   = driftMin
+        self._peerSigma  = peerSigma
+        self._peerMin    = peerMin
+
+        shape = (receivers, len(self._counters))
+        self._ring     = np.zeros((window,) + shape, dtype=np.float64)
+        self._sum      = np.zeros(shape, dtype=np.float64)
+        self._sumSq    = np.zeros(shape, dtype=np.float64)
+        self._baseline = np.zeros(shape, dtype=np.float64)
+        self._last     = np.zeros(shape, dtype=np.uint32)
+        self._lastTime = np.zeros(receivers, dtype=np.float64)
+        self._pos      = np.zeros(receivers, dtype=np.intp)
+        self._fill     = np.zeros(receivers, dtype=np.int64)
+        self._seen     = np.zeros(receivers, dtype=bool)
+
+        self._peerMedian  = np.full(len(self._counters), np.inf)
+        self._peerMad     = np.zeros(len(self._counters))
+        self._peerPending = 0
+
+        self.counterFlags = np.zeros(shape, dtype=np.uint8)
+        self.flags        = np.zeros(receivers, dtype=np.uint8)
+
+        ##############################
+        # Variables
+        ##############################
+
+        self.add(pr.LocalVariable(
+            name         = "Samples",
+            description  = "Number of receiver samples processed",
+            mode         = 'RO',
+            value        = 0,
+        ))
+
+        self.add(pr.LinkVariable(
+            name         = "BurstCount",
+            description  = "Receivers with a counter burst in their last sample",
+            mode         = 'RO',
+            dependencies = [self.Samples],
+            linkedGet    = lambda: self._flagCount(ANOMALY_BURST),
+        ))
+
+        self.add(pr.LinkVariable(
+            name         = "DriftCount",
+            description  = "Receivers with a counter rate drifting above its long term rate",
+            mode         = 'RO',
+            dependencies = [self.Samples],
+            linkedGet    = lambda: self._flagCount(ANOMALY_DRIFT),
+        ))
+
+        self.add(pr.LinkVariable(
+            name         = "PeerCount",
+            description  = "Receivers with a counter rate diverging from the fleet",
+            mode         = 'RO',
+            dependencies = [self.Samples],
+            linkedGet    = lambda: self._flagCount(ANOMALY_PEER),
+        ))
+
+        self.add(pr.LinkVariable(
+            name         = "FlaggedReceivers",
+            description  = "Indices of receivers with any anomaly flag set",
+            mode         = 'RO',
+            dependencies = [self.Samples],
+            linkedGet    = lambda: ' '.join(str(i) for i in np.flatnonzero(self.flags)),
+        ))
+
+        for i, counter in enumerate(self._counters):
+            self.add(pr.LinkVariable(
+                name         = f"{counter}Flagged",
+                description  = f"Receivers with any anomaly flag set on {counter}",
+                mode         = 'RO',
+                dependencies = [self.Samples],
+                linkedGet    = lambda i=i: int(np.count_nonzero(self.counterFlags[:, i])),
+            ))
+
+    def _flagCount(self, bit):
+        return int(np.count_nonzero(self.flags & bit))
+
+    def _refreshPeers(self):
+        ready = self._fill >= self._minSamples
+        if not ready.any():
+            return
+        means = self._sum[ready] / np.minimum(self._fill[ready], self._window)[:, None]
+        self._peerMedian = np.median(means, axis=0)
+        self._peerMad    = 1.4826 * np.median(np.abs(means - self._peerMedian), axis=0)
+
+    def update(self, counts, timestamp=None, index=None):
+        """Process one sample of raw counter values.
+
+        counts is (n, len(counters)); index gives the n (unique) receiver
+        indices when only part of the fleet is updated, timestamp is a
+        scalar or per receiver time in seconds.
+        """
+        counts = np.asarray(counts, dtype=np.uint32).reshape(-1, len(self._counters))
+        idx    = np.arange(self._nrx) if index is None else np.asarray(index, dtype=np.intp)
+        now    = np.broadcast_to(np.asarray(time.time() if timestamp is None else timestamp, dtype=np.float64), idx.shape)
+
+        dt = now - self._lastTime[idx]
+        ok = self._seen[idx] & (dt > 0)
+
+        k     = idx[ok]
+        last  = self._last[k]
+        new   = counts[ok]
+
+        # A counter below its previous value was cleared, not wrapped
+        delta = np.where(new >= last, new - last, new).astype(np.float64)
+        rate  = delta / dt[ok][:, None]
+
+        # Statistics of the window before this sample
+        n     = np.minimum(self._fill[k], self._window)[:, None]
+        ready = n >= self._minSamples
+        mean  = self._sum[k] / np.maximum(n, 1)
+        std   = np.sqrt(np.maximum(self._sumSq[k] / np.maximum(n, 1) - mean * mean, 0.0))
+        burst = ready & (rate > mean + self._burstSigma * std) & (delta >= self._burstMin)
+
+        # O(1) ring buffer insert
+        pos = self._pos[k]
+        old = self._ring[pos, k]
+        self._ring[pos, k] = rate
+        self._sum[k]   += rate - old
+        self._sumSq[k] += rate * rate - old * old
+        self._pos[k]    = (pos + 1) % self._window
+
+        # Resum once per window turn to stop rounding errors accumulating
+        wrap = k[self._pos[k] == 0]
+        if len(wrap):
+            self._sum[wrap]   = self._ring[:, wrap].sum(axis=0)
+            self._sumSq[wrap] = np.square(self._ring[:, wrap]).sum(axis=0)
+
+        first = (self._fill[k] == 0)[:, None]
+        self._baseline[k] = np.where(first, rate, self._baseline[k] + self._driftAlpha * (rate - self._baseline[k]))
+        self._fill[k] += 1
+
+        n       = np.minimum(self._fill[k], self._window)[:, None]
+        ready   = n >= self._minSamples
+        winMean = self._sum[k] / n
+        drift   = ready & (winMean > self._driftRatio * self._baseline[k] + self._driftMin)
+
+        # Fleet median/MAD are refreshed once per fleet's worth of samples
+        self._peerPending += len(k)
+        if self._peerPending >= self._nrx:
+            self._peerPending = 0
+            self._refreshPeers()
+        peer = ready & (winMean - self._peerMedian > self._peerSigma * self._peerMad + self._peerMin)
+
+        self.counterFlags[k] = burst * ANOMALY_BURST | drift * ANOMALY_DRIFT | peer * ANOMALY_PEER
+        self.flags[k]        = np.bitwise_or.reduce(self.counterFlags[k], axis=1)
+
+        self._last[idx]     = counts
+        self._lastTime[idx] = now
+        self._seen[idx]     = True
+
+        self.Samples.set(self.Samples.value() + len(k))
+
+    def updateRecords(self, recs):
+        """Process a batch of TimingFleetMonitor FleetStatusType records."""
+        recs = recs[recs['valid'] != 0]
+        if len(recs):
+            counts = np.stack([recs[c] for c in self._counters], axis=1)
+            self.update(counts, recs['timestamp'], recs['receiver'])
+
+    def clear(self):
+        self._ring[:]        = 0
+        self._sum[:]         = 0
+        self._sumSq[:]       = 0
+        self._baseline[:]    = 0
+        self._pos[:]         = 0
+        self._fill[:]        = 0
+        self._seen[:]        = False
+        self._peerMedian[:]  = np.inf
+        self._peerMad[:]     = 0
+        self._peerPending    = 0
+        self.counterFlags[:] = 0
+        self.flags[:]        = 0
+        self.Samples.set(0)
@@ -0,0 +1,289 @@
+#-----------------------------------------------------------------------------
+# Title      : Columnar timing message archive
+#-----------------------------------------------------------------------------
+# Description:
+# Stores decoded timing messages as chunked columns so captures are decoded
+# once. Every field of the message dtype has its own directory of .npy
+# chunk files, and readers memory map only the columns they ask for.
+# Compressed archives store TimingCodec encoded .ltc chunks instead, which
+# readers decode on access.
+#
+# Archive layout:
+#   archive.json        : version, dtype, chunk size, codec and row count
+#   index.npy           : ArchiveIndexType record per chunk (pulse ID range)
+#   <field>/<n>.npy     : rows of chunk n of one field, n zero padded to 8
+#   <field>/<n>.ltc     : the same as encodeColumn() bytes, with codec
+#
+# The JSON header and index are rewritten after every chunk, so a capture
+# that stops early is readable up to its last complete chunk.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import json
+
+import numpy as np
+
+from LclsTimingCore.TimingCodec import encodeColumn, decodeColumn
+
+ARCHIVE_VERSION = 1
+
+# Serialized message of TimingPkg.vhd toSlv(), 944 bits
+TIMING_MESSAGE_BYTES = 118
+
+TimingMessageType = np.dtype([
+    ('version',         '<u2'),
+    ('pulseId',         '<u8'),
+    ('timeStamp',       '<u8'),
+    ('fixedRates',      '<u2'),
+    ('acRates',         'u1'),
+    ('acTimeSlot',      'u1'),
+    ('acTimeSlotPhase', '<u2'),
+    ('resync',          'u1'),
+    ('beamRequest',     '<u4'),
+    ('beamEnergy',      '<u2', (4,)),
+    ('photonWavelen',   '<u2', (2,)),
+    ('syncStatus',      'u1'),
+    ('mpsValid',        'u1'),
+    ('bcsFault',        'u1'),
+    ('mpsLimit',        '<u2'),
+    ('mpsClass',        'u1', (16,)),
+    ('bsaInit',         '<u8'),
+    ('bsaActive',       '<u8'),
+    ('bsaAvgDone',      '<u8'),
+    ('bsaDone',         '<u8'),
+    ('control',         '<u2', (18,)),
+])
+
+ArchiveIndexType = np.dtype([
+    ('firstPulseId', '<u8'),
+    ('lastPulseId',  '<u8'),
+    ('row',          '<u8'),
+    ('count',        '<u8'),
+])
+
+def _field(raw, offset, dtype, count=1):
+    # Little endian field of every row at a byte offset
+    ret = raw[:, offset:offset+np.dtype(dtype).itemsize*count].copy().view(dtype)
+    return ret[:, 0] if count == 1 else ret
+
+def decodeTimingMessages(frames):
+    """TimingMessageType records of serialized messages.
+
+    frames holds one message per row as bytes, in the bit order of
+    toSlv() (16 bit words, least significant first), and may carry
+    trailing bytes such as the CRC.
+    """
+    raw = np.ascontiguousarray(np.asarray(frames, dtype=np.uint8).reshape(len(frames), -1)[:, :TIMING_MESSAGE_BYTES])
+    ret = np.zeros(len(raw), dtype=TimingMessageType)
+
+    rates  = _field(raw, 18, '<u2')
+    slot   = _field(raw, 20, '<u2')
+    status = _field(raw, 38, '<u2')
+
+    ret['version']           = _field(raw, 0, '<u2')
+    ret['pulseId']           = _field(raw, 2, '<u8')
+    ret['timeStamp']         = _field(raw, 10, '<u8')
+    ret['fixedRates']        = rates & 0x3FF
+    ret['acRates']           = rates >> 10
+    ret['acTimeSlot']        = slot & 0x7
+    ret['acTimeSlotPhase']   = (slot >> 3) & 0xFFF
+    ret['resync']            = slot >> 15
+    ret['beamRequest']       = _field(raw, 22, '<u4')
+    ret['beamEnergy']        = _field(raw, 26, '<u2', 4)
+    ret['photonWavelen']     = _field(raw, 34, '<u2', 2)
+    ret['syncStatus']        = (status >> 13) & 1
+    ret['mpsValid']          = (status >> 14) & 1
+    ret['bcsFault']          = status >> 15
+    ret['mpsLimit']          = _field(raw, 40, '<u2')
+    ret['mpsClass'][:, 0::2] = raw[:, 42:50] & 0xF
+    ret['mpsClass'][:, 1::2] = raw[:, 42:50] >> 4
+    ret['bsaInit']           = _field(raw, 50, '<u8')
+    ret['bsaActive']         = _field(raw, 58, '<u8')
+    ret['bsaAvgDone']        = _field(raw, 66, '<u8')
+    ret['bsaDone']           = _field(raw, 74, '<u8')
+    ret['control']           = _field(raw, 82, '<u2', 18)
+    return ret
+
+def _chunkPath(path, column, chunk, codec=False):
+    return os.path.join(path, column, f'{chunk:08d}.ltc' if codec else f'{chunk:08d}.npy')
+
+class TimingArchiveWriter(object):
+    """Appends decoded timing messages to a columnar archive at path.
+
+    dtype is the message dtype (TimingMessageType, or e.g. TPGMessageType
+    for simulated streams) and must have a pulseId field. Rows are
+    buffered and written chunk rows at a time; close() (or leaving a with
+    block) writes the last partial chunk. With codec the chunks are
+    compressed (see TimingCodec). An existing archive at path is appended
+    to, with its own dtype, chunk size and codec.
+    """
+    def __init__(self, path, dtype=TimingMessageType, chunk=1 << 20, codec=False):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        index = []
+        if os.path.exists(os.path.join(path, 'archive.json')):
+            arc   = TimingArchive(path)
+            dtype = arc.dtype
+            chunk = arc.header['chunk']
+            codec = arc.codec
+            index = [tuple(i) for i in arc.index]
+
+        self.dtype  = np.dtype(dtype)
+        self.chunk  = chunk
+        self.codec  = bool(codec)
+        self._index = index
+        self._buf   = np.zeros(chunk, dtype=self.dtype)
+        self._fill  = 0
+
+        for name in self.dtype.names:
+            os.makedirs(os.path.join(path, name), exist_ok=True)
+
+        # A partial last chunk is reopened and completed
+        if index and index[-1][3] < chunk:
+            self._fill = int(index[-1][3])
+            self._buf[:self._fill] = arc.chunk(len(index) - 1)
+            self._index.pop()
+
+    def append(self, msgs):
+        """Append messages of the archive dtype"""
+        i = 0
+        while i < len(msgs):
+            n = min(len(msgs) - i, self.chunk - self._fill)
+            self._buf[self._fill:self._fill+n] = msgs[i:i+n]
+            self._fill += n
+            i          += n
+            if self._fill == self.chunk:
+                self._flush()
+
+    def appendFrames(self, frames):
+        """Decode serialized messages (see decodeTimingMessages) and append them"""
+        self.append(decodeTimingMessages(frames))
+
+    def _flush(self):
+        # Write the buffered rows as the next chunk; a partial chunk stays
+        # buffered and is rewritten in place by the next flush
+        rows  = self._buf[:self._fill]
+        chunk = len(self._index)
+        for name in self.dtype.names:
+            if self.codec:
+                with open(_chunkPath(self.path, name, chunk, True), 'wb') as f:
+                    f.write(encodeColumn(rows[name]))
+            else:
+                np.save(_chunkPath(self.path, name, chunk), np.ascontiguousarray(rows[name]))
+
+        row   = int(self._index[-1][2] + self._index[-1][3]) if self._index else 0
+        entry = (rows['pulseId'].min(), rows['pulseId'].max(), row, self._fill)
+        self._writeHeader(self._index + [entry])
+
+        if self._fill == self.chunk:
+            self._index.append(entry)
+            self._fill = 0
+        return entry
+
+    def _writeHeader(self, index):
+        index  = np.array(index, dtype=ArchiveIndexType)
+        header = {
+            'version' : ARCHIVE_VERSION,
+            'dtype'   : np.lib.format.dtype_to_descr(self.dtype),
+            'chunk'   : self.chunk,
+            'codec'   : self.codec,
+            'rows'    : int(index['count'].sum()),
+        }
+
+        # Write then rename, so readers never see a partial index or header
+        np.save(os.path.join(self.path, 'index.tmp.npy'), index)
+        os.replace(os.path.join(self.path, 'index.tmp.npy'), os.path.join(self.path, 'index.npy'))
+        with open(os.path.join(self.path, 'archive.tmp'), 'w') as f:
+            json.dump(header, f)
+        os.replace(os.path.join(self.path, 'archive.tmp'), os.path.join(self.path, 'archive.json'))
+
+    def close(self):
+        """Write the buffered rows, a later append starts a new chunk"""
+        if self._fill:
+            self._index.append(self._flush())
+            self._fill = 0
+        elif not os.path.exists(os.path.join(self.path, 'archive.json')):
+            # An archive without rows is still readable
+            self._writeHeader(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class TimingArchive(object):
+    """Reader of an archive written by TimingArchiveWriter.
+
+    Column chunks are memory mapped on access, so reading pulseId and
+    fixedRates of an archive never touches the files of other fields;
+    chunks of compressed archives are read and decoded instead. index holds the pulse ID range and first row of every chunk.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'archive.json')) as f:
+            self.header = json.load(f)
+
+        if self.header['version'] != ARCHIVE_VERSION:
+            raise ValueError(f'{path} has archive version {self.header["version"]}, expected {ARCHIVE_VERSION}')
+
+        self.dtype = np.dtype([tuple(d[:2]) + tuple(tuple(x) for x in d[2:]) for d in self.header['dtype']])
+        self.index = np.load(os.path.join(path, 'index.npy'))
+        self.codec = bool(self.header.get('codec', False))
+
+    def __len__(self):
+        return int(self.index['count'].sum())
+
+    @property
+    def columns(self):
+        return list(self.dtype.names)
+
+    def _dtype(self, columns):
+        return np.dtype([(name, self.dtype[name]) for name in columns])
+
+    def column(self, name, chunk):
+        """Memory mapped (decoded, when compressed) rows of column name in chunk"""
+        if name not in self.dtype.names:
+            raise KeyError(f'{self.path} has no column {name}')
+        if self.codec:
+            with open(_chunkPath(self.path, name, chunk, True), 'rb') as f:
+                return decodeColumn(f.read())
+        return np.load(_chunkPath(self.path, name, chunk), mmap_mode='r')
+
+    def chunk(self, chunk, columns=None):
+        """Records of chunk with the given columns (default all)"""
+        columns = self.columns if columns is None else list(columns)
+        ret     = np.zeros(int(self.index['count'][chunk]), dtype=self._dtype(columns))
+        for name in columns:
+            ret[name] = self.column(name, chunk)
+        return ret
+
+    def iterChunks(self, columns):
+        """Yield (first row, {column: rows}) per chunk"""
+        for c in range(len(self.index)):
+            yield int(self.index['row'][c]), {name: self.column(name, c) for name in columns}
+
+    def read(self, columns=None, start=0, stop=None):
+        """Records of rows [start, stop) with the given columns (default all)"""
+        columns = self.columns if columns is None else list(columns)
+        stop    = len(self) if stop is None else min(stop, len(self))
+        ret     = np.zeros(max(0, stop - start), dtype=self._dtype(columns))
+
+        first = self.index['row'].astype(np.int64)
+        for c in range(max(0, np.searchsorted(first, start, side='right') - 1), len(self.index)):
+            a = max(start, first[c])
+            b = min(stop, first[c] + int(self.index['count'][c]))
+            if a >= b:
+                break
+            for name in columns:
+                ret[name][a-start:b-start] = self.column(name, c)[a-first[c]:b-first[c]]
+        return ret
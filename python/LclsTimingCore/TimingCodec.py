@@ -0,0 +1,243 @@
+#-----------------------------------------------------------------------------
+# Title      : Lossless codec for timing message captures
+#-----------------------------------------------------------------------------
+# Description:
+# Compresses the columns of decoded timing messages. Every column (every
+# element of array fields) is first transformed (none, delta or delta of
+# delta) and the result split into runs of equal values. The smallest of
+# three encodings of the transformed stream is kept:
+#   pack : the stream itself, frame of reference bit packed
+#   dict : indices into the distinct values, bit packed
+#   rle  : the run values (packed or dict) and run lengths (packed)
+# Bit widths are rounded up to 0, 1, 2, 4, 8, 16, 32 or 64 so that
+# unpacking is a byte view or a few shifts. Decoding is np.repeat, take
+# and cumsum, all vectorized.
+#
+# Column blob (little endian):
+#   headerLen : uint32
+#   header    : JSON, headerLen bytes (dtype, shape, per stream encoding)
+#   data      : the byte ranges of the streams, in header order
+#
+# Message blob: CODEC_MAGIC, uint32 header length, JSON header (version,
+# dtype, rows, byte range of every column blob) and the column blobs.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import json
+
+import numpy as np
+
+CODEC_MAGIC   = b'LTCCODEC'
+CODEC_VERSION = 1
+
+# Rows per block when filling decoded records
+_block = 1 << 14
+
+_widths = np.array([0, 1, 2, 4, 8, 16, 32, 64])
+
+def _width(top):
+    """Packed bit width of values up to top"""
+    return int(_widths[np.searchsorted(_widths, int(top).bit_length())])
+
+def _pack(v, w):
+    if w == 0:
+        return b''
+    if w >= 8:
+        return v.astype(f'<u{w//8}').tobytes()
+    per = 8 // w
+    m   = np.zeros(-(-len(v) // per) * per, dtype=np.uint8)
+    m[:len(v)] = v
+    m   = m.reshape(-1, per)
+    out = np.zeros(len(m), dtype=np.uint8)
+    for j in range(per):
+        out |= m[:, j] << np.uint8(j * w)
+    return out.tobytes()
+
+def _unpack(buf, w, n):
+    # Packed values as uint8 (widths up to 8) or the unsigned type of w bits
+    if w == 0:
+        return np.zeros(n, dtype=np.uint8)
+    if w >= 8:
+        return np.frombuffer(buf, dtype=f'<u{w//8}', count=n)
+    per = 8 // w
+    b   = np.frombuffer(buf, dtype=np.uint8)
+    return ((b[:, None] >> (np.arange(per, dtype=np.uint8) * w)) & ((1 << w) - 1)).ravel()[:n]
+
+def _transform(x, kind):
+    """Stream of x (unsigned) under a transform, wrapping at its width"""
+    if kind == 'none' or len(x) < 2:
+        return x
+    d = np.diff(x, prepend=x[:1])
+    if kind == 'delta':
+        d[0] = x[0]
+        return d
+    s     = np.diff(d, prepend=d[:1])
+    s[:2] = x[0], d[1]
+    return s
+
+def _inverse(s, kind):
+    if kind == 'none' or len(s) < 2:
+        return s
+    if kind == 'delta':
+        return np.cumsum(s, dtype=s.dtype)
+    x     = np.empty_like(s)
+    x[0]  = s[0]
+    x[1:] = s[0] + np.cumsum(np.cumsum(s[1:], dtype=s.dtype), dtype=s.dtype)
+    return x
+
+class _Stream(object):
+    # Smallest of the pack and (with lookup) dict encodings of one unsigned
+    # stream, given its sorted distinct values uniq (or just its minimum
+    # and maximum without lookup) and the index of every element in uniq
+    def __init__(self, s, uniq, index=None, lookup=True):
+        base = int(uniq[0])
+        self.pack = (_width(int(uniq[-1]) - base), base)
+        self.dict = _width(len(uniq) - 1)
+        sizePack  = len(s) * self.pack[0]
+        sizeDict  = len(s) * self.dict + 64 * len(uniq) if lookup else sizePack
+        self.kind = 'pack' if sizePack <= sizeDict else 'dict'
+        self.size = (min(sizePack, sizeDict) + 7) // 8
+        self.s, self.uniq, self.index = s, uniq, index
+
+    def encode(self, parts, meta):
+        if self.kind == 'pack':
+            w, base = self.pack
+            parts.append(_pack(self.s - self.s.dtype.type(base), w))
+            meta.update(kind='pack', width=w, base=base, count=len(self.s))
+        else:
+            parts.append(self.uniq.astype('<u8').tobytes())
+            parts.append(_pack(self.index, self.dict))
+            meta.update(kind='dict', width=self.dict, uniq=len(self.uniq), count=len(self.s))
+
+def _decodeStream(meta, buf, pos, dtype):
+    """(stream as dtype, next byte position) of an encoded stream at buf[pos:]"""
+    n    = meta['count']
+    size = -(-n * meta['width'] // 8)
+    if meta['kind'] == 'pack':
+        v = _unpack(buf[pos:pos+size], meta['width'], n).astype(dtype)
+        return v + dtype.type(meta['base']), pos + size
+
+    k    = meta['uniq']
+    uniq = np.frombuffer(buf[pos:pos+8*k], dtype='<u8').astype(dtype)
+    pos += 8 * k
+    return uniq[_unpack(buf[pos:pos+size], meta['width'], n)], pos + size
+
+def _encode(x, parts):
+    """Header of the smallest encoding of x (unsigned), its bytes appended to parts"""
+    best = None
+    for kind in ('none', 'delta', 'dod'):
+        s      = _transform(x, kind)
+        starts = np.flatnonzero(np.diff(s, prepend=~s[:1]))
+        vals   = s[starts]
+        runs   = np.diff(np.append(starts, len(s)))
+
+        # Distinct values come from the run values, far fewer to sort
+        uniq, rindex = np.unique(vals, return_inverse=True)
+        rindex       = rindex.ravel()
+
+        flat = _Stream(s, uniq)
+        if best is None or flat.size < best[0]:
+            best = (flat.size, kind, 'flat', flat, None)
+            if flat.kind == 'dict':
+                flat.index = np.repeat(rindex, runs)
+
+        val = _Stream(vals, uniq, rindex)
+        run = _Stream(runs.astype(np.uint64), np.array([runs.min(), runs.max()], dtype=np.uint64), lookup=False)
+        if val.size + run.size < best[0]:
+            best = (val.size + run.size, kind, 'rle', val, run)
+        if best[0] == 0:
+            break
+
+    _, kind, layout, a, b = best
+    meta = {'transform': kind, 'layout': layout, 'streams': [{}]}
+    a.encode(parts, meta['streams'][0])
+    if layout == 'rle':
+        meta['streams'].append({})
+        b.encode(parts, meta['streams'][1])
+    return meta
+
+def _decode(meta, buf, pos, dtype):
+    s, pos = _decodeStream(meta['streams'][0], buf, pos, dtype)
+    if meta['layout'] == 'rle':
+        runs, pos = _decodeStream(meta['streams'][1], buf, pos, np.dtype(np.intp))
+        s = np.full(runs[0], s[0]) if len(runs) == 1 else np.repeat(s, runs)
+    return _inverse(s, meta['transform']), pos
+
+def encodeColumn(values):
+    """Encoded bytes of a column (one value, or one array of values, per row)"""
+    values = np.ascontiguousarray(values)
+    size   = values.dtype.itemsize
+    flat   = np.ascontiguousarray(values.reshape(len(values), -1 if len(values) else 0).view(f'<u{size}').T)
+
+    parts  = []
+    header = {
+        'dtype'   : values.dtype.str,
+        'shape'   : list(values.shape),
+        'streams' : [_encode(x, parts) if len(x) else None for x in flat],
+    }
+    head = json.dumps(header, separators=(',', ':')).encode()
+    return np.uint32(len(head)).tobytes() + head + b''.join(parts)
+
+def decodeColumn(data):
+    """Column of encodeColumn() bytes"""
+    data   = memoryview(data)
+    size   = int(np.frombuffer(data[:4], dtype='<u4')[0])
+    header = json.loads(bytes(data[4:4+size]))
+    dtype  = np.dtype(header['dtype'])
+    shape  = header['shape']
+    n      = shape[0]
+
+    # Elements are decoded contiguously and returned as a transposed view
+    udt  = np.dtype(f'<u{dtype.itemsize}')
+    flat = np.zeros((len(header['streams']), n), dtype=udt)
+    pos  = 4 + size
+    for j, meta in enumerate(header['streams']):
+        if meta is not None:
+            flat[j], pos = _decode(meta, data, pos, udt)
+    return flat.T.view(dtype).reshape(shape)
+
+def encodeMessages(msgs):
+    """Encoded bytes of a structured message array, column by column"""
+    cols   = [encodeColumn(msgs[name]) for name in msgs.dtype.names]
+    offset = np.cumsum([0] + [len(c) for c in cols])
+    header = {
+        'version' : CODEC_VERSION,
+        'dtype'   : np.lib.format.dtype_to_descr(msgs.dtype),
+        'rows'    : len(msgs),
+        'columns' : {name: [int(offset[i]), len(cols[i])] for i, name in enumerate(msgs.dtype.names)},
+    }
+    head = json.dumps(header, separators=(',', ':')).encode()
+    return CODEC_MAGIC + np.uint32(len(head)).tobytes() + head + b''.join(cols)
+
+def decodeMessages(data, columns=None):
+    """Messages of encodeMessages() bytes, only the given columns (default all)"""
+    data = memoryview(data)
+    if bytes(data[:len(CODEC_MAGIC)]) != CODEC_MAGIC:
+        raise ValueError('Not an encoded timing message block')
+    pos    = len(CODEC_MAGIC)
+    size   = int(np.frombuffer(data[pos:pos+4], dtype='<u4')[0])
+    header = json.loads(bytes(data[pos+4:pos+4+size]))
+    pos   += 4 + size
+
+    if header['version'] != CODEC_VERSION:
+        raise ValueError(f'Codec version {header["version"]}, expected {CODEC_VERSION}')
+
+    dtype   = np.dtype([tuple(d[:2]) + tuple(tuple(x) for x in d[2:]) for d in header['dtype']])
+    columns = list(dtype.names) if columns is None else list(columns)
+    ret     = np.empty(header['rows'], dtype=[(name, dtype[name]) for name in columns])
+    cols    = [decodeColumn(data[pos+header['columns'][name][0]:pos+sum(header['columns'][name])]) for name in columns]
+
+    # Records are filled a block of rows at a time, all fields of a block
+    # land in cache rather than every field streaming over the whole array
+    for a in range(0, len(ret), _block):
+        rows = ret[a:a+_block]
+        for name, col in zip(columns, cols):
+            rows[name] = col[a:a+_block]
+    return ret
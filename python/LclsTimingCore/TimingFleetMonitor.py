@@ -0,0 +1,190 @@
+#-----------------------------------------------------------------------------
+# Title      : Timing receiver fleet health monitor
+#-----------------------------------------------------------------------------
+# Description:
+# Monitors many timing receivers (TimingFrameRx + GthRxAlignCheck) by
+# sharding them across a pool of worker processes. Each worker block reads
+# the register windows of its receivers and sends compact NumPy status
+# records to the aggregating process.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import queue
+import threading
+import multiprocessing
+
+import numpy   as np
+import pyrogue as pr
+
+from LclsTimingCore.BlockTransfer import requestBlock, waitBlock
+
+# TimingFrameRx registers 0x00-0x2C and GthRxAlignCheck registers 0x104-0x10C
+FLEET_RX_WORDS   = 12
+FLEET_GTH_OFFSET = 0x104
+FLEET_GTH_WORDS  = 3
+
+FleetStatusType = np.dtype([
+    ('receiver',      '<u4'),
+    ('worker',        '<u2'),
+    ('valid',         'u1'),
+    ('RxLinkUp',      'u1'),
+    ('RxDown',        'u1'),
+    ('LastPhase',     'u1'),
+    ('timestamp',     '<f8'),
+    ('cycleTime',     '<f4'),
+    ('sofCount',      '<u4'),
+    ('eofCount',      '<u4'),
+    ('FidCount',      '<u4'),
+    ('CrcErrCount',   '<u4'),
+    ('RxClkCount',    '<u4'),
+    ('RxRstCount',    '<u4'),
+    ('RxDecErrCount', '<u4'),
+    ('RxDspErrCount', '<u4'),
+    ('MsgDelay',      '<u4'),
+    ('TxClkCount',    '<u4'),
+    ('TxClkFreqRaw',  '<u4'),
+    ('RxClkFreqRaw',  '<u4'),
+])
+
+_rxCounters = ['sofCount', 'eofCount', 'FidCount', 'CrcErrCount',
+               'RxClkCount', 'RxRstCount', 'RxDecErrCount', 'RxDspErrCount']
+
+def decodeFleetStatus(rx, gth, out):
+    """Decode raw register windows of n receivers into FleetStatusType records.
+
+    rx is a (n, FLEET_RX_WORDS) and gth a (n, FLEET_GTH_WORDS) uint32 array.
+    """
+    for i, name in enumerate(_rxCounters):
+        out[name] = rx[:, i]
+
+    out['RxLinkUp']     = (rx[:, 8] >> 1) & 0x1
+    out['RxDown']       = (rx[:, 8] >> 5) & 0x1
+    out['MsgDelay']     = rx[:, 9] & 0xFFFFF
+    out['TxClkCount']   = rx[:, 10]
+    out['LastPhase']    = gth[:, 0] & 0x7F
+    out['TxClkFreqRaw'] = gth[:, 1]
+    out['RxClkFreqRaw'] = gth[:, 2]
+    return out
+
+def _fleetWorker(worker, index, receivers, factory, period, records, stop):
+    # factory(receivers) returns (root, [(TimingFrameRx, GthRxAlignCheck), ...])
+    root, pairs = factory(receivers)
+
+    n   = len(pairs)
+    rx  = np.zeros((n, FLEET_RX_WORDS), dtype=np.uint32)
+    gth = np.zeros((n, FLEET_GTH_WORDS), dtype=np.uint32)
+    rec = np.zeros(n, dtype=FleetStatusType)
+    rec['receiver'] = index
+    rec['worker']   = worker
+
+    try:
+        while not stop.is_set():
+            t0 = time.monotonic()
+
+            # Issue every receiver's reads before waiting on any of them
+            pending = []
+            for i, (rxDev, gthDev) in enumerate(pairs):
+                rxDev._clearError()
+                gthDev._clearError()
+                pending.append((
+                    requestBlock(rxDev, 0, rx[i]),
+                    requestBlock(gthDev, FLEET_GTH_OFFSET, gth[i]),
+                ))
+
+            for i, (rxDev, gthDev) in enumerate(pairs):
+                try:
+                    waitBlock(rxDev, 0, pending[i][0])
+                    waitBlock(gthDev, FLEET_GTH_OFFSET, pending[i][1])
+                    rec['valid'][i] = 1
+                except pr.MemoryError:
+                    rec['valid'][i] = 0
+
+            decodeFleetStatus(rx, gth, rec)
+            rec['timestamp'] = time.time()
+            rec['cycleTime'] = time.monotonic() - t0
+
+            records.put(rec.tobytes())
+            stop.wait(max(0.0, period - (time.monotonic() - t0)))
+    finally:
+        root.stop()
+
+class TimingFleetMonitor(object):
+    """Shards receivers across worker processes and aggregates their status.
+
+    receivers is a list of picklable receiver descriptions. factory is a
+    picklable (module level) function called in each worker with its share
+    of receivers; it must return a started root and the list of
+    (TimingFrameRx, GthRxAlignCheck) device pairs in the same order. Each
+    worker should use its own root with polling disabled.
+
+    The latest record of every receiver is kept in status, indexed like
+    receivers. callback, if given, is called with each batch of records.
+    """
+    def __init__(self, receivers, factory, workers=4, period=1.0, callback=None):
+        self._receivers = list(receivers)
+        self._factory   = factory
+        self._workers   = max(1, min(workers, len(self._receivers)))
+        self._period    = period
+        self._callback  = callback
+
+        self.status      = np.zeros(len(self._receivers), dtype=FleetStatusType)
+        self.recordCount = 0
+
+        self._procs  = []
+        self._thread = None
+        self._run    = False
+
+    def start(self):
+        ctx = multiprocessing.get_context('spawn')
+        self._records = ctx.Queue()
+        self._stop    = ctx.Event()
+
+        shards = np.array_split(np.arange(len(self._receivers)), self._workers)
+        for worker, index in enumerate(shards):
+            p = ctx.Process(
+                target = _fleetWorker,
+                args   = (worker, index, [self._receivers[i] for i in index],
+                          self._factory, self._period, self._records, self._stop),
+                daemon = True,
+            )
+            p.start()
+            self._procs.append(p)
+
+        self._run    = True
+        self._thread = threading.Thread(target=self._aggregate, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        for p in self._procs:
+            p.join()
+        self._procs = []
+
+        self._run = False
+        self._thread.join()
+        self._thread = None
+
+    def _aggregate(self):
+        while self._run:
+            try:
+                data = self._records.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            recs = np.frombuffer(data, dtype=FleetStatusType)
+            self.status[recs['receiver']] = recs
+            self.recordCount += len(recs)
+
+            if self._callback is not None:
+                self._callback(recs)
@@ -0,0 +1,247 @@
+#-----------------------------------------------------------------------------
+# Title      : Timing frame validator for raw symbol streams
+#-----------------------------------------------------------------------------
+# Description:
+# Software TimingDeserializer: segments captured 16 bit symbol/dataK
+# streams into frames between K_SOF and K_EOF and checks their CRC, with
+# the counters of TimingFrameRx (sofCount, eofCount, FidCount,
+# CrcErrCount).
+#
+# Frames are found without a per word loop. Every SOF symbol is followed
+# to its EOF (EOF only ends a frame at a segment start, that is after the
+# SOF or an EOS), then the SOF symbols that the receiver actually sees,
+# those after the previous frame, are picked out. The CRC covers the words
+# after SOF up to and including EOF, one 16 bit table lookup per word, run
+# across all frames of a length at once.
+#
+# Crc32Parallel (2 byte width, init 0xFFFFFFFF) bit reverses every input
+# byte and outputs the inverted, bit reversed register: the IEEE 802.3
+# CRC-32 of zlib.crc32() over the bytes of each word, high byte first.
+# Associated firmware: lcls-timing-core/LCLS-II/core/rtl/TimingDeserializer.vhd
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+# 8b/10b characters of TimingPkg.vhd
+D_215 = 0xB5
+K_COM = 0xBC
+K_SOF = 0xF7
+K_EOF = 0xFD
+K_EOS = 0x1C
+K_281 = 0x3C
+
+CRC32_POLY = 0x04C11DB7
+CRC32_INIT = 0xFFFFFFFF
+
+# Check vector: CRC-32 of b'12345678' as four words
+CRC32_CHECK_WORDS = (0x3132, 0x3334, 0x3536, 0x3738)
+CRC32_CHECK       = 0x9AE0DAAF
+
+# Frame status
+FRAME_OK         = 0
+FRAME_CRC_ERR    = 1
+FRAME_ABORTED    = 2
+FRAME_INCOMPLETE = 3
+
+# Frames per CRC block
+_block = 1 << 12
+
+FrameStatusType = np.dtype([
+    ('start',  '<i8'),
+    ('eof',    '<i8'),
+    ('status', 'u1'),
+    ('crc',    '<u4'),
+    ('rxCrc',  '<u4'),
+])
+
+def _crcTable():
+    # Reflected register after shifting in 16 zero bits from each low half
+    poly = np.uint32(int(f'{CRC32_POLY:032b}'[::-1], 2))
+    t    = np.arange(1 << 16, dtype=np.uint32)
+    for _ in range(16):
+        t = np.where(t & np.uint32(1), (t >> np.uint32(1)) ^ poly, t >> np.uint32(1))
+    return t
+
+_crc16 = _crcTable()
+
+def crc32Words(words):
+    """Crc32Parallel CRC of every row of a (frames, words) uint16 array"""
+    words = np.asarray(words, dtype=np.uint16)
+    ret   = np.empty(len(words), dtype=np.uint32)
+    for a in range(0, len(words), _block):
+        # Word j of every frame of the block is contiguous, with the high
+        # byte, which goes first, in the low bits of the reflected register
+        w = np.ascontiguousarray(words[a:a+_block].T).byteswap().astype(np.uint32)
+        c = np.full(w.shape[1], CRC32_INIT, dtype=np.uint32)
+        t = np.empty_like(c)
+        for row in w:
+            np.bitwise_and(c, 0xFFFF, out=t)
+            np.bitwise_xor(t, row, out=t)
+            np.right_shift(c, 16, out=c)
+            np.bitwise_xor(c, _crc16.take(t), out=c)
+        ret[a:a+_block] = ~c
+    return ret
+
+def serializeFrames(payload, idle=0, header=0x0080):
+    """(data, dataK) symbol stream of frames as sent by TimingSerializer.
+
+    payload holds the 16 bit words of one frame per row, sent as a single
+    segment with the given segment header (stream 0, last, offset 0) and
+    followed by idle commas.
+    """
+    payload = np.asarray(payload, dtype=np.uint16)
+    n, size = payload.shape
+    body    = np.empty((n, size + 3), dtype=np.uint16)
+    body[:, 0]    = header
+    body[:, 1:-2] = payload
+    body[:, -2]   = (D_215 << 8) | K_EOS
+    body[:, -1]   = (D_215 << 8) | K_EOF
+    crc = crc32Words(body)
+
+    # K_281 alignment comma, SOF, body, CRC low and high words, idles
+    data  = np.full((n, size + 7 + idle), (D_215 << 8) | K_COM, dtype=np.uint16)
+    dataK = np.zeros(data.shape, dtype=np.uint8)
+    data[:, 0]         = (D_215 << 8) | K_281
+    data[:, 1]         = (D_215 << 8) | K_SOF
+    data[:, 2:size+5]  = body
+    data[:, size+5]    = crc & 0xFFFF
+    data[:, size+6]    = crc >> 16
+    dataK[:, [0, 1]]   = 1
+    dataK[:, size+3:size+5] = 1
+    dataK[:, size+7:]  = 1
+    return data.ravel(), dataK.ravel()
+
+class TimingFrameValidator(object):
+    """Frame segmentation and CRC check of captured symbol streams.
+
+    process() takes consecutive blocks of a capture: data (uint16), dataK
+    (2 bits per word, "01" for a K character in the low byte) and
+    optionally the decode and disparity error bits per word, any of which
+    resets the receiver as in the firmware. It returns one FrameStatusType
+    record per frame completed in the block, with word indices counted
+    from the start of the capture; a frame running past the block is
+    carried into the next call, and flush() reports it as incomplete.
+    """
+    def __init__(self):
+        self.sofCount    = 0
+        self.eofCount    = 0
+        self.FidCount    = 0
+        self.CrcErrCount = 0
+        self._offset     = 0
+        self._carry      = None
+
+    def counters(self):
+        """TimingFrameRx counters, wrapped to 32 bits"""
+        return {name: getattr(self, name) & 0xFFFFFFFF
+                for name in ('sofCount', 'eofCount', 'FidCount', 'CrcErrCount')}
+
+    def process(self, data, dataK, decErr=None, dspErr=None):
+        data  = np.asarray(data, dtype=np.uint16)
+        dataK = np.asarray(dataK, dtype=np.uint8)
+        err   = np.zeros(len(data), dtype=bool)
+        for e in (decErr, dspErr):
+            if e is not None:
+                err |= np.asarray(e) != 0
+
+        if self._carry is not None:
+            data, dataK, err = (np.concatenate([c, x]) for c, x in zip(self._carry, (data, dataK, err)))
+            self._carry = None
+        return self._frames(data, dataK, err, final=False)
+
+    def flush(self):
+        """Report a frame left open by the last block as incomplete"""
+        if self._carry is None:
+            return np.zeros(0, dtype=FrameStatusType)
+        carry, self._carry = self._carry, None
+        return self._frames(*carry, final=True)
+
+    def _frames(self, data, dataK, err, final):
+        # Control symbols other than the idle commas, classified in one pass
+        n    = len(data)
+        kpos = np.flatnonzero(((dataK & 3) == 1) & (data != ((D_215 << 8) | K_COM)))
+        kval = data[kpos]
+        errs = np.append(np.flatnonzero(err), n)
+        sof  = kpos[kval == ((D_215 << 8) | K_SOF)]
+        sof  = sof[errs[np.searchsorted(errs, sof)] != sof]
+        eof  = kpos[kval == ((D_215 << 8) | K_EOF)]
+        eos  = kpos[kval == ((D_215 << 8) | K_EOS)]
+
+        # EOF of every SOF, from segment start to segment start: a segment
+        # header, then anything up to an EOS
+        end  = np.full(len(sof), -1, dtype=np.int64)
+        pos  = sof + 1
+        todo = np.arange(len(sof))
+        while len(todo):
+            p    = pos[todo]
+            live = p < n
+            todo, p = todo[live], p[live]
+            j    = np.searchsorted(eof, p)
+            done = eof[np.minimum(j, len(eof) - 1)] == p if len(eof) else np.zeros(len(p), dtype=bool)
+            end[todo[done]] = p[done]
+            todo, p = todo[~done], p[~done]
+            i    = np.searchsorted(eos, p, side='right')
+            live = i < len(eos)
+            todo = todo[live]
+            pos[todo] = eos[i[live]] + 1
+
+        # A frame holds the receiver from its SOF to the CRC compare, three
+        # words after EOF, unless an error resets it first
+        first = errs[np.searchsorted(errs, sof)]
+        stop  = np.where(end >= 0, end + 3, n)
+        abort = (first <= stop) & (first < n)
+        whole = ~abort & (end >= 0) & (end + 3 < n)
+        resume = np.where(abort, first + 1, np.where(whole, end + 4, np.iinfo(np.int64).max))
+
+        # The SOFs seen by the receiver: the first, then the first at or
+        # after every resume point; stretches of back to back frames are
+        # taken at once
+        nxt  = np.searchsorted(sof, resume)
+        jump = np.flatnonzero(nxt != np.arange(1, len(sof) + 1))
+        real = np.zeros(len(sof), dtype=bool)
+        i    = 0
+        while i < len(sof):
+            j = jump[np.searchsorted(jump, i)] if len(jump) and jump[-1] >= i else len(sof) - 1
+            real[i:j+1] = True
+            i = nxt[j]
+
+        # A frame still open at the end of the block waits for the next one
+        carry = real & ~abort & ~whole
+        if carry.any() and not final:
+            s = int(sof[np.flatnonzero(carry)[0]])
+            self._carry   = (data[s:], dataK[s:], err[s:])
+            real &= ~carry
+            shift, self._offset = self._offset, self._offset + s
+        else:
+            shift, self._offset = self._offset, self._offset + n
+
+        idx = np.flatnonzero(real)
+        ret = np.zeros(len(idx), dtype=FrameStatusType)
+        s, e = sof[idx], end[idx]
+        ret['start']  = s + shift
+        ret['eof']    = np.where(e >= 0, e + shift, -1)
+        ret['status'] = np.where(abort[idx], FRAME_ABORTED, np.where(whole[idx], FRAME_OK, FRAME_INCOMPLETE))
+
+        # CRC of the complete frames, per frame length
+        ok = np.flatnonzero(whole[idx])
+        for size in np.unique(e[ok] - s[ok]):
+            sel = ok[(e[ok] - s[ok]) == size]
+            for a in range(0, len(sel), _block):
+                b = sel[a:a+_block]
+                ret['crc'][b] = crc32Words(data[s[b, None] + 1 + np.arange(size)])
+            ret['rxCrc'][sel] = data[e[sel] + 1].astype(np.uint32) | (data[e[sel] + 2].astype(np.uint32) << 16)
+        bad = ok[ret['crc'][ok] != ret['rxCrc'][ok]]
+        ret['status'][bad] = FRAME_CRC_ERR
+
+        self.sofCount    += len(idx)
+        self.FidCount    += len(idx)
+        self.eofCount    += int(((e >= 0) & (first[idx] > e)).sum())
+        self.CrcErrCount += len(bad)
+        return ret
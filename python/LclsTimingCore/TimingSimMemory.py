@@ -0,0 +1,406 @@
+#-----------------------------------------------------------------------------
+# Title      : Behavioural timing firmware memory emulator
+#-----------------------------------------------------------------------------
+# Description:
+# Memory slave with behavioural register models for the timing devices, so
+# counters advance with simulated time instead of staying static. Models are
+# evaluated lazily: a model only computes its registers when a transaction
+# touches it, from the time elapsed since its last access. Nothing runs per
+# tick, which keeps thousands of simulated devices cheap.
+#
+# Addresses not covered by a model behave like plain memory.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import bisect
+import threading
+
+import numpy as np
+import rogue.interfaces.memory as rim
+
+from LclsTimingCore.BsaModel import BSA_NTOAVG_ZERO
+
+# LCLS-II timing: 1300 MHz / 7 clock, base rate = clock / 200
+TIMING_CLK_RATE  = 1300.0e6 / 7
+TIMING_BASE_RATE = TIMING_CLK_RATE / 200
+
+# Pulse ID readback offset of TPGMiniCore and TPGControl, by variable name
+PULSE_ID_REGS = {
+    'PulseIdRd' : 0x08,
+    'PulseIdL'  : 0x10,
+}
+
+# AC rate markers (Hz) selected by BsaACRate
+AC_RATES = [60.0, 30.0, 10.0, 5.0, 1.0, 0.5]
+
+_PAGE = 0x1000
+
+def _wrap32(acc):
+    return np.floor(np.fmod(acc, 4294967296.0)).astype(np.uint32)
+
+class RegisterModel(object):
+    """Base class of the behavioural register models.
+
+    regs holds the register bytes (words is the uint32 view). update(t) must
+    bring the registers up to simulated time t and written(t, lo, hi) reacts
+    to a write of bytes [lo, hi), after the new data is stored in regs.
+    """
+    size = 0
+
+    def __init__(self, base):
+        self.base  = base
+        self.regs  = np.zeros(self.size, dtype=np.uint8)
+        self.words = self.regs.view(np.uint32)
+        self._mem  = None
+
+    def update(self, t):
+        pass
+
+    def written(self, t, lo, hi):
+        pass
+
+    def _wrote(self, lo, hi, offset):
+        return lo <= offset < hi
+
+class TimingSimMemory(rim.Slave):
+    """Memory emulator with behavioural models, see addModel().
+
+    Simulated time is clock() minus the time of construction; pass a custom
+    clock (e.g. a function returning a manually advanced value) for
+    deterministic tests.
+    """
+    def __init__(self, minWidth=4, maxSize=0x1000, clock=None):
+        rim.Slave.__init__(self, minWidth, maxSize)
+        self._minWidth = minWidth
+        self._maxSize  = maxSize
+        self._clock    = time.monotonic if clock is None else clock
+        self._start    = self._clock()
+        self._lock     = threading.RLock()
+        self._pages    = {}
+        self._bases    = []
+        self._models   = []
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def now(self):
+        return self._clock() - self._start
+
+    def addModel(self, model):
+        i = bisect.bisect_right(self._bases, model.base)
+        if (i > 0 and self._models[i-1].base + self._models[i-1].size > model.base) or \
+           (i < len(self._models) and model.base + model.size > self._bases[i]):
+            raise ValueError(f'Model at 0x{model.base:x} overlaps another model')
+
+        model._mem = self
+        self._bases.insert(i, model.base)
+        self._models.insert(i, model)
+        return model
+
+    def _doMinAccess(self):
+        return self._minWidth
+
+    def _doMaxAccess(self):
+        return self._maxSize
+
+    def _segments(self, address, size):
+        # Yield (model or None, start, end) covering [address, address+size)
+        end = address + size
+        i   = bisect.bisect_right(self._bases, address) - 1
+        while address < end:
+            if i >= 0 and address < self._bases[i] + self._models[i].size:
+                m   = self._models[i]
+                top = min(end, m.base + m.size)
+                yield m, address, top
+            else:
+                top = min(end, (address // _PAGE + 1) * _PAGE)
+                if i+1 < len(self._bases):
+                    top = min(top, self._bases[i+1])
+                yield None, address, top
+            address = top
+            if i+1 < len(self._bases) and address >= self._bases[i+1]:
+                i += 1
+
+    def _page(self, address):
+        p = self._pages.get(address // _PAGE)
+        if p is None:
+            p = self._pages[address // _PAGE] = np.zeros(_PAGE, dtype=np.uint8)
+        return p
+
+    def _doTransaction(self, transaction):
+        address = transaction.address()
+        size    = transaction.size()
+        type    = transaction.type()
+        write   = type == rim.Write or type == rim.Post
+        buf     = np.zeros(size, dtype=np.uint8)
+
+        with self._lock:
+            t = self.now()
+            if write:
+                transaction.getData(buf, 0)
+
+            for m, lo, hi in self._segments(address, size):
+                data = buf[lo-address:hi-address]
+                if m is None:
+                    page = self._page(lo)
+                    if write:
+                        page[lo % _PAGE:lo % _PAGE + len(data)] = data
+                    else:
+                        data[:] = page[lo % _PAGE:lo % _PAGE + len(data)]
+                else:
+                    m.update(t)
+                    if write:
+                        m.regs[lo-m.base:hi-m.base] = data
+                        m.written(t, lo-m.base, hi-m.base)
+                    else:
+                        data[:] = m.regs[lo-m.base:hi-m.base]
+
+            if not write:
+                transaction.setData(buf, 0)
+
+        transaction.done()
+
+class TimingFrameRxModel(RegisterModel):
+    """TimingFrameRx: frame, clock and error counters advance with time.
+
+    ClearRxCounters clears the counters, C_RxReset and linkUp() count a
+    link reset, linkDown() stops the frame counters and latches RxDown
+    until a 0 is written to it. latency (fiber and pipeline, 186 MHz
+    clocks) and jitter (rms clocks) set the arrival of the frames returned
+    by capture().
+    """
+    size = 0x30
+
+    def __init__(self, base, frameRate=TIMING_BASE_RATE, crcErrRate=0.0, decErrRate=0.0, dspErrRate=0.0,
+                 latency=0.0, jitter=0.0, seed=None):
+        super().__init__(base)
+        self.latency = latency
+        self.jitter  = jitter
+        self._frame  = frameRate
+        self._rng    = np.random.default_rng(seed)
+        self._ts0    = int(time.time())
+        # sofCount, eofCount, FidCount, CrcErrCount, RxClkCount, RxRstCount, RxDecErrCount, RxDspErrCount
+        self._rates = np.array([frameRate, frameRate, frameRate, crcErrRate,
+                                TIMING_CLK_RATE / 16, 0.0, decErrRate, dspErrRate])
+        self._acc   = np.zeros(8)
+        self._last  = None
+        self._up    = True
+        self._down  = False
+
+    def _advance(self, t):
+        if self._last is not None and self._up:
+            self._acc += self._rates * (t - self._last)
+        self._last = t
+
+    def update(self, t):
+        self._advance(t)
+        self.words[0:8]  = _wrap32(self._acc)
+        self.words[8]    = (int(self.words[8]) & ~0x22) | (self._up << 1) | (self._down << 5)
+        self.words[10]   = _wrap32(t * TIMING_CLK_RATE / 16)
+
+    def written(self, t, lo, hi):
+        if self._wrote(lo, hi, 0x20):
+            csr = int(self.words[8])
+            if csr & 0x1:
+                self._acc[:] = 0
+            if csr & 0x8:
+                self._acc[5] += 1
+            self._down = self._down and bool(csr & 0x20)
+
+    def capture(self, count):
+        """(arrival, timeStamp) of the last count frames at their release.
+
+        arrival counts 186 MHz clocks from simulated time 0, after the
+        latency and the MsgDelay register; timeStamp is the TPG time stamp
+        (seconds << 32 | ns) of the frame.
+        """
+        with self._mem.lock:
+            last  = int(self._mem.now() * self._frame)
+            delay = int(self.words[9]) & 0xFFFFF
+
+        emit    = np.arange(max(0, last - count), last) * (TIMING_CLK_RATE / self._frame)
+        ns      = (emit * (1e9 / TIMING_CLK_RATE)).astype(np.int64)
+        stamp   = ((self._ts0 + ns // 1000000000).astype(np.uint64) << np.uint64(32)) | (ns % 1000000000).astype(np.uint64)
+        arrival = np.floor(emit + self.latency + delay + self._rng.normal(0.0, self.jitter, len(emit))).astype(np.uint64)
+        return arrival, stamp
+
+    def linkDown(self):
+        with self._mem.lock:
+            self._advance(self._mem.now())
+            self._up   = False
+            self._down = True
+
+    def linkUp(self):
+        with self._mem.lock:
+            self._advance(self._mem.now())
+            self._up      = True
+            self._acc[5] += 1
+
+class TPGMiniCoreModel(RegisterModel):
+    """TPGMiniCore: pulse ID, time stamp, BSA completion and interval counters.
+
+    PulseIdRd advances at the base rate and TStampRd with time; PulseIdSet
+    and TStampSet load PulseIdWr/TStampWr. A rising edge of bit 0 of byte
+    i of the BSA control word (0x1FC + i, BsaActive[i]) starts BSA
+    definition i, for the first 4 definitions; it completes after BsaNtoAvg (0 meaning BSA_NTOAVG_ZERO) * BsaAvgToWr
+    events of its rate, setting bit i of BsaCompleteRd (cleared by writing
+    1s to BsaCompleteWr). PllCnt, ClkCnt and SyncErrCnt
+    run freely with time; BaseRateCount is latched every CountInterval
+    clocks, counted from CountIntervalReset.
+    """
+    size = 0x520
+
+    def __init__(self, base, baseRate=TIMING_BASE_RATE, edefs=2, pulseId=0, syncErrRate=0.0):
+        super().__init__(base)
+        self._rate     = baseRate
+        self._edefs    = min(edefs, (0x500 - 0x200) // 16)
+        self._pid0     = pulseId
+        self._ts0      = time.time()
+        self._syncRate = syncErrRate
+        self._done     = np.full(self._edefs, np.inf)
+        self._complete = 0
+        self._bsaCtrl  = 0
+        self._intv0    = 0.0
+
+        self.words[0x18//4:0x40//4] = 1
+        self.words[0x50C//4]        = int(TIMING_CLK_RATE)
+
+    def update(self, t):
+        pid = self._pid0 + int(self._rate * t)
+        self.words[0x08//4] = pid & 0xFFFFFFFF
+        self.words[0x0C//4] = (pid >> 32) & 0xFFFFFFFF
+
+        ts = self._ts0 + t
+        self.words[0x10//4] = int((ts % 1.0) * 1e9)
+        self.words[0x14//4] = int(ts) & 0xFFFFFFFF
+
+        done = np.flatnonzero(t >= self._done)
+        for i in done:
+            self._complete |= 1 << int(i)
+        self._done[done] = np.inf
+        self.words[0x50//4] = self._complete & 0xFFFFFFFF
+        self.words[0x54//4] = self._complete >> 32
+
+        # Free running counters, never reset (TPGMini.vhd)
+        self.words[0x500//4] = 0
+        self.words[0x504//4] = _wrap32(t * TIMING_CLK_RATE)
+        self.words[0x508//4] = _wrap32(int(self._syncRate * t))
+
+        # Base rate count of the last complete interval since CountIntervalReset
+        clocks = int(self.words[0x50C//4])
+        self.words[0x510//4] = 0
+        if clocks:
+            period = clocks / TIMING_CLK_RATE
+            k = int((t - self._intv0) // period)
+            if k > 0:
+                a = self._intv0 + (k-1) * period
+                b = self._intv0 + k * period
+                self.words[0x510//4] = int(self._rate * b) - int(self._rate * a)
+
+    def _edefRate(self, i):
+        word = int(self.words[(0x200 + 16*i)//4])
+        mode = word & 0x3
+        if mode == 0:
+            return self._rate / max(1, int(self.words[(0x18 + 4*((word >> 2) & 0xF))//4]))
+        if mode == 1:
+            return AC_RATES[min((word >> 6) & 0x7, len(AC_RATES)-1)]
+        return self._rate
+
+    def written(self, t, lo, hi):
+        if self._wrote(lo, hi, 0x50) or self._wrote(lo, hi, 0x54):
+            self._complete &= ~((int(self.words[0x54//4]) << 32) | int(self.words[0x50//4]))
+
+        if self._wrote(lo, hi, 0x70) and self.words[0x70//4] & 0x1:
+            wr = (int(self.words[0x5C//4]) << 32) | int(self.words[0x58//4])
+            self._pid0 = wr - int(self._rate * t)
+
+        if self._wrote(lo, hi, 0x74) and self.words[0x74//4] & 0x1:
+            wr = (int(self.words[0x64//4]) << 32) | int(self.words[0x60//4])
+            self._ts0 = (wr >> 32) + (wr & 0xFFFFFFFF) * 1e-9 - t
+
+        if self._wrote(lo, hi, 0x6C) and self.words[0x6C//4] & 0x1:
+            self._intv0 = t
+
+        # Definitions start on a rising edge of their init bit (TPGMiniReg.vhd)
+        if self._wrote(lo, hi, 0x1FC):
+            ctrl = int(self.words[0x1FC//4])
+            rise, self._bsaCtrl = ctrl & ~self._bsaCtrl, ctrl
+            for i in range(min(self._edefs, 4)):
+                if rise & (1 << 8*i):
+                    word = int(self.words[(0x208 + 16*i)//4])
+                    n    = ((word & 0x1FFF) or BSA_NTOAVG_ZERO) * max(1, word >> 16)
+                    self._done[i]   = t + n / self._edefRate(i)
+                    self._complete &= ~(1 << i)
+
+class GthRxAlignCheckModel(RegisterModel):
+    """GthRxAlignCheck: PhaseCount histogram fills with alignment attempts.
+
+    Attempts arrive at alignRate with phases drawn from a normal
+    distribution around phase. Writing the PhaseTarget/Mask/ResetLen word
+    clears the histogram.
+    """
+    size = 0x110
+
+    def __init__(self, base, phase=32, sigma=1.5, alignRate=10.0, seed=None):
+        super().__init__(base)
+        bins = np.arange(64)
+        pdf  = np.exp(-0.5 * ((bins - phase) / sigma) ** 2)
+        self._pdf   = pdf / pdf.sum()
+        self._rate  = alignRate
+        self._rng   = np.random.default_rng(base if seed is None else seed)
+        self._count = 0
+
+        self.words[0x100//4] = phase
+        self.words[0x108//4] = int(TIMING_CLK_RATE)
+        self.words[0x10C//4] = int(TIMING_CLK_RATE)
+
+    def update(self, t):
+        n = int(self._rate * t) - self._count
+        if n > 0:
+            # One multinomial draw keeps the cost flat however many attempts
+            self.words[0:64]     += self._rng.multinomial(n, self._pdf).astype(np.uint32)
+            self.words[0x104//4]  = self._rng.choice(64, p=self._pdf)
+            self._count          += n
+
+    def written(self, t, lo, hi):
+        if self._wrote(lo, hi, 0x100):
+            self.words[0:64] = 0
+
+class EvrV2CoreModel(RegisterModel):
+    """EvrV2Core: global and per channel event counters.
+
+    GlobalEventCnt counts at eventRate, ChannelEventCnt[i] counts at
+    eventRate while ChannelEnable[i] is set. Writing CountReset = 1 clears
+    all counters.
+    """
+    size = 0x2C0
+
+    def __init__(self, base, eventRate=TIMING_BASE_RATE, channels=12):
+        super().__init__(base)
+        self._rate     = eventRate
+        self._channels = channels
+        self._acc      = np.zeros(channels + 1)
+        self._last     = None
+
+    def update(self, t):
+        if self._last is not None:
+            enable = self.words[0x20//4::8][:self._channels] & 0x1
+            self._acc[:-1] += enable * self._rate * (t - self._last)
+            self._acc[-1]  += self._rate * (t - self._last)
+        self._last = t
+
+        self.words[0x28//4::8][:self._channels] = _wrap32(self._acc[:-1])
+        self.words[0x1A8//4] = _wrap32(self._acc[-1])
+
+    def written(self, t, lo, hi):
+        if self._wrote(lo, hi, 0x10) and self.words[0x10//4] & 0x1:
+            self._acc[:] = 0
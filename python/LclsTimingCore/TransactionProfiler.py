@@ -0,0 +1,256 @@
+#-----------------------------------------------------------------------------
+# Title      : PyRogue transaction profiler
+#-----------------------------------------------------------------------------
+# Description:
+# Opt-in tracing of the memory transactions of LclsTimingCore devices.
+# While started, pyrogue.startTransaction and pyrogue.checkTransaction are
+# wrapped for the variable blocks, and the _reqTransaction/_waitTransaction
+# methods of every attached device for the raw block transfers of
+# BlockTransfer (snapshots, FIFO drains, DRAM reads and the like). Every
+# transaction records its block (device, variables, address, size),
+# direction, address, size, issue time, latency (issue to completion check)
+# and thread; block transfers are recorded against one pseudo block per
+# device. Transactions pipelined on one block are matched to their checks
+# in issue order. Recording is a few dictionary and deque operations, cheap
+# enough to leave on.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import sys
+import json
+import time
+import threading
+import collections
+
+import numpy   as np
+import pyrogue as pr
+import rogue.interfaces.memory as rim
+
+TraceType = np.dtype([
+    ('block',   '<u4'),
+    ('type',    'u1'),
+    ('error',   'u1'),
+    ('start',   '<i8'),
+    ('latency', '<i8'),
+    ('thread',  '<u8'),
+    ('address', '<u8'),
+    ('size',    '<u4'),
+])
+
+# Variable name of the pseudo block of the block transfers of a device
+PROFILE_RAW_BLOCK = '<block transfers>'
+
+def _walk(dev):
+    yield dev
+    for d in dev.devices.values():
+        yield from _walk(d)
+
+_typeNames = {rim.Read: 'read', rim.Write: 'write', rim.Post: 'post', rim.Verify: 'verify'}
+
+class TransactionProfiler(object):
+    """Records the memory transactions of attached devices.
+
+    attach() the devices of interest, then start() and stop() around the
+    period to profile. Times are in ns from time.perf_counter_ns(). At most
+    capacity transactions are kept, oldest first dropped.
+    """
+    def __init__(self, capacity=1000000):
+        self._records = collections.deque(maxlen=capacity)
+        self._pending = {}
+        self._index   = {}
+        self._devices = {}
+        self._patched = []
+        self._wrapped = []
+
+        # (device path, variable names, address, size) per block
+        self.blocks = []
+
+    def attach(self, dev):
+        for v in dev.variableList:
+            if not isinstance(v, pr.RemoteVariable):
+                continue
+            b = v._block
+            i = self._index.get(id(b))
+            if i is None:
+                i = self._index[id(b)] = len(self.blocks)
+                self.blocks.append((v.parent.path, [], b.address, b.size))
+            self.blocks[i][1].append(v.name)
+
+        for d in _walk(dev):
+            if id(d) not in self._devices:
+                self._devices[id(d)] = (d, len(self.blocks))
+                self.blocks.append((d.path, [PROFILE_RAW_BLOCK], d.address, 0))
+
+    def start(self):
+        if self._patched or self._wrapped:
+            return
+
+        origStart = pr.startTransaction
+        origCheck = pr.checkTransaction
+        index     = self._index
+        blocks    = self.blocks
+        pending   = self._pending
+        records   = self._records
+        now       = time.perf_counter_ns
+        ident     = threading.get_ident
+
+        def startTransaction(block, *args, **kwargs):
+            i = index.get(id(block))
+            if i is not None:
+                # Pipelined transactions of a block complete in issue order
+                q = pending.get(id(block))
+                if q is None:
+                    q = pending.setdefault(id(block), collections.deque())
+                b = blocks[i]
+                q.append((i, kwargs.get('type', args[0] if args else rim.Read), now(), b[2], b[3]))
+            return origStart(block, *args, **kwargs)
+
+        def checkTransaction(block, *args, **kwargs):
+            err = 1
+            try:
+                ret = origCheck(block, *args, **kwargs)
+                err = 0
+                return ret
+            finally:
+                q = pending.get(id(block))
+                p = q.popleft() if q else None
+                if p is not None:
+                    records.append((p[0], p[1], err, p[2], now() - p[2], ident(), p[3], p[4]))
+
+        # PyRogue modules may hold their own references to these functions
+        for mod in list(sys.modules.values()):
+            if getattr(mod, '__name__', '').startswith('pyrogue'):
+                for name, orig, wrap in (('startTransaction', origStart, startTransaction),
+                                         ('checkTransaction', origCheck, checkTransaction)):
+                    if getattr(mod, name, None) is orig:
+                        setattr(mod, name, wrap)
+                        self._patched.append((mod, name, orig))
+
+        for dev, i in self._devices.values():
+            self._wrapDevice(dev, i)
+
+    def _wrapDevice(self, dev, i):
+        # Block transfers call the device memory master directly; the
+        # wrappers shadow its methods on the instance until stop()
+        origReq  = dev._reqTransaction
+        origWait = dev._waitTransaction
+        pending  = {}
+        records  = self._records
+        now      = time.perf_counter_ns
+        ident    = threading.get_ident
+
+        def reqTransaction(address, buf, size, offset, txnType):
+            t0  = now()
+            tid = origReq(address, buf, size, offset, txnType)
+            pending.setdefault(tid, []).append((txnType, t0, address, size))
+            return tid
+
+        def waitTransaction(tid):
+            err = 1
+            try:
+                ret = origWait(tid)
+                err = 0
+                return ret
+            finally:
+                # Id 0 waits for every transaction of the device
+                done = list(pending) if tid == 0 else [tid]
+                t1   = now()
+                for k in done:
+                    for p in pending.pop(k, ()):
+                        records.append((i, p[0], err, p[1], t1 - p[1], ident(), p[2], p[3]))
+
+        dev._reqTransaction  = reqTransaction
+        dev._waitTransaction = waitTransaction
+        self._wrapped.append(dev)
+
+    def stop(self):
+        for mod, name, orig in self._patched:
+            setattr(mod, name, orig)
+        self._patched = []
+        self._pending.clear()
+
+        for dev in self._wrapped:
+            del dev._reqTransaction
+            del dev._waitTransaction
+        self._wrapped = []
+
+    def clear(self):
+        self._records.clear()
+
+    def trace(self):
+        """Recorded transactions as a TraceType array"""
+        return np.array(list(self._records), dtype=TraceType)
+
+    def _name(self, i):
+        path, names, _, _ = self.blocks[i]
+        return f'{path}.{names[0]}' if len(names) == 1 else f'{path}.[{",".join(names)}]'
+
+    def report(self, top=10, by='latency'):
+        """Top blocks by total 'latency', 'count' or 'bytes' as report lines"""
+        tr     = self.trace()
+        n      = len(self.blocks)
+        count  = np.bincount(tr['block'], minlength=n)
+        total  = np.bincount(tr['block'], weights=tr['latency'], minlength=n)
+        nbytes = np.bincount(tr['block'], weights=tr['size'], minlength=n).astype(np.int64)
+        key    = {'latency': total, 'count': count, 'bytes': nbytes}[by]
+
+        ret = [f"{'total ms':>10} {'count':>9} {'mean us':>9} {'bytes':>11}  block"]
+        for i in np.argsort(key)[::-1][:top]:
+            if count[i] == 0:
+                break
+            ret.append(f'{total[i]*1e-6:10.3f} {count[i]:9d} {total[i]/count[i]*1e-3:9.2f} {nbytes[i]:11d}  '
+                       f'0x{self.blocks[i][2]:08x} {self._name(i)}')
+        return ret
+
+    def deviceReport(self, top=10):
+        """Top devices by total latency as report lines"""
+        tr    = self.trace()
+        paths = sorted({b[0] for b in self.blocks})
+        devOf = np.array([paths.index(b[0]) for b in self.blocks], dtype=np.int64)
+        dev   = devOf[tr['block']]
+        count = np.bincount(dev, minlength=len(paths))
+        total = np.bincount(dev, weights=tr['latency'], minlength=len(paths))
+
+        ret = [f"{'total ms':>10} {'count':>9} {'share':>6}  device"]
+        for i in np.argsort(total)[::-1][:top]:
+            if count[i] == 0:
+                break
+            ret.append(f'{total[i]*1e-6:10.3f} {count[i]:9d} {total[i]/total.sum():6.1%}  {paths[i]}')
+        return ret
+
+    def histograms(self, bins=None):
+        """Per device latency histograms: {device path: (counts, edges in ns)}"""
+        tr    = self.trace()
+        bins  = np.logspace(2, 9, 36) if bins is None else bins
+        devOf = np.array([b[0] for b in self.blocks])
+        paths = devOf[tr['block']] if len(tr) else np.array([])
+        return {str(p): np.histogram(tr['latency'][paths == p], bins=bins) for p in np.unique(paths)}
+
+    def save(self, path):
+        """Save the trace and block table as a .npz file"""
+        np.savez_compressed(path, trace=self.trace(), blocks=json.dumps(self.blocks))
+
+    def exportChromeTrace(self, path):
+        """Export a Chrome/Perfetto trace event JSON file"""
+        tr = self.trace()
+        t0 = tr['start'].min() if len(tr) else 0
+        events = [{
+            'name' : self._name(int(r['block'])),
+            'cat'  : _typeNames.get(int(r['type']), str(r['type'])),
+            'ph'   : 'X',
+            'ts'   : (int(r['start']) - t0) * 1e-3,
+            'dur'  : int(r['latency']) * 1e-3,
+            'pid'  : 0,
+            'tid'  : int(r['thread']),
+            'args' : {'address': f'0x{int(r["address"]):x}', 'size': int(r['size']), 'error': int(r['error'])},
+        } for r in tr]
+
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events}, f)
@@ -0,0 +1,322 @@
+#-----------------------------------------------------------------------------
+# Title      : PyRogue devices generated from the YAML register maps
+#-----------------------------------------------------------------------------
+# Description:
+# Compiles the CPSW YAML register maps in lcls-timing-core/yaml into cached
+# variable tables and builds PyRogue devices from them. Also compares the
+# generated tables against the hand written device classes.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import re
+import pickle
+import hashlib
+
+import yaml
+import numpy   as np
+import pyrogue as pr
+
+# Bump when the table layout changes to invalidate on disk caches
+YAML_TABLE_VERSION = 1
+
+# Arrays with more elements than this (e.g. AmcCarrierDRAM) are not mapped
+YAML_MAX_ELEMENTS = 4096
+
+_includeRe = re.compile(r'^#include\s+(\S+)', re.MULTILINE)
+_tableCache = {}
+
+def _preprocess(path, seen, missing):
+    """Expand '#include' directives, each file is included once"""
+    path = os.path.abspath(path)
+    if path in seen:
+        return ''
+    seen.add(path)
+
+    with open(path) as f:
+        text = f.read()
+
+    out = []
+    for inc in _includeRe.findall(text):
+        incPath = os.path.join(os.path.dirname(path), inc)
+        if os.path.exists(incPath):
+            out.append(_preprocess(incPath, seen, missing))
+        else:
+            # Resolve the anchor of a missing include to an empty device
+            anchor = os.path.splitext(inc)[0]
+            missing.append(inc)
+            out.append(f'{anchor}: &{anchor}\n  class: MMIODev\n  children: {{}}\n')
+
+    out.append(text)
+    return '\n'.join(out)
+
+def _enum(enums):
+    if not enums:
+        return None
+    return {int(e['value']): str(e['name']) for e in enums}
+
+def _children(node):
+    """Return the (name, node) children of a device in either YAML layout"""
+    if isinstance(node.get('children'), dict):
+        return list(node['children'].items())
+
+    # Legacy layout: list of IntField entries with inline addressing
+    ret = []
+    for field in node.get('IntField', []) or []:
+        field = dict(field)
+        field['at'] = {k: field.pop(k) for k in ('offset', 'nelms', 'stride') if k in field}
+        ret.append((field['name'], field))
+    return ret
+
+def _isDevice(node):
+    return isinstance(node, dict) and (node.get('class') == 'MMIODev' or 'IntField' in node)
+
+def _compileDevice(name, node, errors):
+    table = {
+        'name'        : name,
+        'description' : str(node.get('description', '')),
+        'variables'   : [],
+        'devices'     : [],
+    }
+
+    names = set()
+    for key, child in _children(node):
+        if not isinstance(child, dict):
+            continue
+
+        at     = child.get('at', {}) or {}
+        offset = int(at.get('offset', 0))
+        number = int(at.get('nelms', 1))
+
+        if key in names:
+            errors.append(f'{name}.{key}: duplicate name, ignored')
+            continue
+        names.add(key)
+
+        if number > YAML_MAX_ELEMENTS:
+            errors.append(f'{name}.{key}: {number} elements exceeds {YAML_MAX_ELEMENTS}, not mapped')
+            continue
+
+        if _isDevice(child):
+            sub = _compileDevice(key, child, errors)
+            sub['offset'] = offset
+            sub['number'] = number
+            sub['stride'] = int(at.get('stride', 0))
+            table['devices'].append(sub)
+            continue
+
+        bitSize   = int(child.get('sizeBits', 32))
+        bitOffset = int(child.get('lsBit', child.get('lsbit', 0)))
+        mode      = str(child.get('mode', 'RW'))
+
+        var = {
+            'name'        : key,
+            'description' : str(child.get('description', '')),
+            'offset'      : offset,
+            'bitSize'     : bitSize,
+            'bitOffset'   : bitOffset,
+            'mode'        : mode,
+            'hidden'      : bool(child.get('hidden', False)),
+        }
+
+        if mode == 'RO':
+            var['pollInterval'] = 1
+
+        enum = _enum(child.get('enums'))
+        if enum is not None:
+            var['enum'] = enum
+
+        if number > 1:
+            var['number'] = number
+            var['stride'] = int(at.get('stride', (bitOffset+bitSize+7) // 8))
+
+        table['variables'].append(var)
+
+    _markOverlaps(table['variables'])
+    return table
+
+def _markOverlaps(variables):
+    """Set overlapEn on variables whose bits are shared with another variable"""
+    if not variables:
+        return
+
+    owner = []
+    start = []
+    stop  = []
+    for i, v in enumerate(variables):
+        n    = v.get('number', 1)
+        base = (v['offset'] + v.get('stride', 0) * np.arange(n)) * 8 + v['bitOffset']
+        owner.append(np.full(n, i))
+        start.append(base)
+        stop.append(base + v['bitSize'])
+
+    owner = np.concatenate(owner)
+    start = np.concatenate(start)
+    stop  = np.concatenate(stop)
+
+    order = np.argsort(start, kind='stable')
+    owner = owner[order]
+    start = start[order]
+    reach = np.maximum.accumulate(stop[order])
+
+    # An element overlaps when it starts before any earlier element ended
+    hit = np.flatnonzero(start[1:] < reach[:-1]) + 1
+    prev = np.searchsorted(reach, start[hit], side='right')
+
+    for i in np.unique(np.concatenate([owner[hit], owner[prev]])):
+        variables[i]['overlapEn'] = True
+
+def compileYamlMap(path, cacheDir=None):
+    """Compile a YAML register map into a dict of device tables keyed by name.
+
+    Tables are cached in memory per file content and, when cacheDir is
+    given, pickled to disk so later processes skip the YAML parsing.
+    Each table carries 'errors' and 'missing' lists describing entries that
+    could not be mapped.
+    """
+    missing = []
+    text    = _preprocess(path, set(), missing)
+    key     = hashlib.sha1(f'{YAML_TABLE_VERSION}\n{text}'.encode()).hexdigest()
+
+    if key in _tableCache:
+        return _tableCache[key]
+
+    cacheFile = None if cacheDir is None else os.path.join(cacheDir, f'{key}.pickle')
+    if cacheFile is not None and os.path.exists(cacheFile):
+        with open(cacheFile, 'rb') as f:
+            tables = pickle.load(f)
+    else:
+        doc    = yaml.safe_load(text) or {}
+        tables = {}
+        for entry, node in doc.items():
+            if _isDevice(node):
+                name   = str(node.get('name', entry))
+                errors = []
+                tables[name] = _compileDevice(name, node, errors)
+                tables[name]['errors']  = errors
+                tables[name]['missing'] = list(missing)
+
+        if cacheFile is not None:
+            os.makedirs(cacheDir, exist_ok=True)
+            with open(cacheFile, 'wb') as f:
+                pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    _tableCache[key] = tables
+    return tables
+
+def yamlTable(path, top=None, cacheDir=None):
+    """Return the table of one device, by default the one named after the file"""
+    if top is None:
+        top = os.path.splitext(os.path.basename(path))[0]
+
+    tables = compileYamlMap(path, cacheDir)
+    if top not in tables:
+        raise KeyError(f'{top} is not defined in {path}, choose from {sorted(tables)}')
+    return tables[top]
+
+def _location(offset, bitOffset, bitSize, mode):
+    # Normalize byte/bit offset pairs to a 32-bit word address and bit
+    bit = offset*8 + bitOffset
+    return (bit // 32 * 4, bit % 32, bitSize, mode)
+
+def flattenTable(table, prefix='', offset=0):
+    """Flatten a table into {path: (wordAddress, bitOffset, bitSize, mode)}"""
+    ret = {}
+    for v in table['variables']:
+        n = v.get('number', 1)
+        for i in range(n):
+            name = f"{v['name']}[{i}]" if 'number' in v else v['name']
+            ret[prefix+name] = _location(offset + v['offset'] + i*v.get('stride', 0), v['bitOffset'], v['bitSize'], v['mode'])
+
+    for d in table['devices']:
+        for i in range(d['number']):
+            name = f"{d['name']}[{i}]" if d['number'] > 1 else d['name']
+            ret.update(flattenTable(d, f'{prefix}{name}.', offset + d['offset'] + i*d['stride']))
+    return ret
+
+def flattenDevice(dev, prefix='', offset=0):
+    """Flatten the remote variables of a PyRogue device like flattenTable()"""
+    def scalar(x):
+        return x[0] if isinstance(x, (list, tuple)) and len(x) == 1 else x
+
+    ret = {}
+    for v in dev.variables.values():
+        if isinstance(v, pr.RemoteVariable):
+            ret[prefix+v.name] = _location(offset + v.offset, scalar(v.bitOffset), scalar(v.bitSize), v.mode)
+
+    for d in dev.devices.values():
+        ret.update(flattenDevice(d, f'{prefix}{d.name}.', offset + d.offset))
+    return ret
+
+def parityReport(table, dev):
+    """Compare a compiled YAML table against a hand written device.
+
+    Returns a list of report lines, empty when both describe the same
+    registers.
+    """
+    gen  = flattenTable(table)
+    hand = flattenDevice(dev)
+    ret  = []
+
+    for name in sorted(set(gen) - set(hand)):
+        ret.append(f'{name}: only in YAML {gen[name]}')
+    for name in sorted(set(hand) - set(gen)):
+        ret.append(f'{name}: only in {type(dev).__name__} {hand[name]}')
+    for name in sorted(set(gen) & set(hand)):
+        if gen[name] != hand[name]:
+            ret.append(f'{name}: YAML {gen[name]} != {type(dev).__name__} {hand[name]}')
+
+    for err in table.get('errors', []):
+        ret.append(f'YAML: {err}')
+    for inc in table.get('missing', []):
+        ret.append(f'YAML: missing include {inc}')
+
+    return ret
+
+class YamlDevice(pr.Device):
+    def __init__(   self,
+            table       = None,
+            yamlFile    = None,
+            top         = None,
+            cacheDir    = None,
+            name        = None,
+            description = None,
+            **kwargs):
+
+        if table is None:
+            table = yamlTable(yamlFile, top, cacheDir)
+
+        super().__init__(
+            name        = table['name'] if name is None else name,
+            description = table['description'] if description is None else description,
+            **kwargs)
+
+        ##############################
+        # Variables
+        ##############################
+
+        for v in table['variables']:
+            if 'number' in v:
+                self.addRemoteVariables(**v)
+            else:
+                self.add(pr.RemoteVariable(**v))
+
+        ##############################
+        # Devices
+        ##############################
+
+        for d in table['devices']:
+            for i in range(d['number']):
+                self.add(YamlDevice(
+                    table  = d,
+                    name   = f"{d['name']}[{i}]" if d['number'] > 1 else d['name'],
+                    offset = d['offset'] + i*d['stride'],
+                    expand = False,
+                ))
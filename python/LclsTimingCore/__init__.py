@@ -7,23 +7,104 @@
 # copied, modified, propagated, or distributed except according to the terms
 # contained in the LICENSE.txt file.
 #-----------------------------------------------------------------------------
+#
+# Submodules are imported on first attribute access (PEP 562) so scripts that
+# only need e.g. LclsTimingCore.TimingFrameRx do not pay for the whole package.
+# Add new public names to _submodules below.
+#-----------------------------------------------------------------------------
+
+import sys
+import types
+import importlib
+
+# Submodule name : public names it provides
+_submodules = {
+    'BlockTransfer'     : ['requestBlock', 'waitBlock', 'readBlock', 'writeBlock'],
+    'FileMemEmulate'    : ['FileMemEmulate'],
+    'TimingSimMemory'   : ['TimingSimMemory', 'RegisterModel', 'TimingFrameRxModel', 'TPGMiniCoreModel',
+                           'GthRxAlignCheckModel', 'EvrV2CoreModel', 'TIMING_CLK_RATE', 'TIMING_BASE_RATE',
+                           'PULSE_ID_REGS'],
+    'AmcCarrierDRAM'    : ['AmcCarrierDRAM'],
+    'BldAxiStream'      : ['BldAxiStream'],
+    'BldStreamRx'       : ['BldStreamRx', 'BLD_NUM_CHANNELS', 'BldHeaderType', 'bldChannels', 'decodeBldPacket'],
+    'RegisterSnapshot'  : ['RegisterSnapshot', 'SNAPSHOT_MAGIC', 'SNAPSHOT_VERSION', 'SNAPSHOT_EXCLUDE',
+                           'SNAPSHOT_NO_RESTORE', 'snapshotLayout', 'bitFields', 'wordMasks'],
+    'SnapshotDiff'      : ['SnapshotDiff', 'DIFF_ENABLE_FIELDS', 'DIFF_RATE_FIELDS', 'DIFF_RELOAD_FIELD',
+                           'PHASE_DISABLE', 'PHASE_CONFIG', 'PHASE_ENABLE', 'PHASE_RELOAD'],
+    'IntervalSampler'   : ['IntervalSampler', 'IntervalSampleType'],
+    'RatePlanner'       : ['RatePlanner', 'FIXED_RATE_WIDTH', 'AC_RATE_WIDTH', 'AC_LINE_RATE', 'decodeClockPeriod'],
+    'BeamDiagCapture'   : ['BeamDiagCapture', 'BeamDiagRecordType', 'BEAM_DIAG_BUFFERS', 'BEAM_DIAG_MANFAULT',
+                           'BEAM_DIAG_CLEAR', 'alignBuffers'],
+    'SeqFifoDrain'      : ['SeqFifoDrain', 'CheckpointType', 'SEQ_FIFO_VALID', 'SEQ_FIFO_SEQ_SHIFT',
+                           'SEQ_FIFO_SEQ_MASK', 'SEQ_FIFO_ADDR_MASK'],
+    'EvrV2CoreView'     : ['EvrV2CoreView', 'EvrChannelType', 'EvrTriggerType', 'EVR_CHANNEL_FIELDS',
+                           'EVR_TRIGGER_FIELDS', 'EVR_NUM_CHANNELS', 'EVR_NUM_TRIGGERS'],
+    'DelayScan'         : ['DelayScan', 'ScanStepType', 'SCAN_DELAY_BITS', 'SCAN_FINE_BITS'],
+    'PulseIdScheduler'  : ['PulseIdScheduler', 'ScheduledWriteType'],
+    'TPGSimulation'     : ['TPGSimulation', 'TPGMessageType', 'EdefType', 'TPG_AC_DIVISORS', 'simConfig',
+                           'generateSegment'],
+    'BsaModel'          : ['BsaModel', 'BsaDefType', 'BsaBitsType', 'BSA_NUM_EDEFS', 'BSA_DEST_INCLUSIVE',
+                           'BSA_DEST_EXCLUSIVE', 'BSA_DEST_DONT_CARE', 'BSA_NTOAVG_ZERO', 'bsaDefs'],
+    'TimingArchive'     : ['TimingArchive', 'TimingArchiveWriter', 'TimingMessageType', 'ArchiveIndexType',
+                           'ARCHIVE_VERSION', 'TIMING_MESSAGE_BYTES', 'decodeTimingMessages'],
+    'PulseIdIndex'      : ['PulseIdIndex', 'PulseIdRunType'],
+    'TimingCodec'       : ['encodeColumn', 'decodeColumn', 'encodeMessages', 'decodeMessages', 'CODEC_MAGIC',
+                           'CODEC_VERSION'],
+    'MsgDelayCalibration' : ['MsgDelayCalibration', 'MsgDelayCalType', 'MSG_DELAY_BITS', 'fitLatency'],
+    'TimingFrameValidator' : ['TimingFrameValidator', 'FrameStatusType', 'crc32Words', 'serializeFrames',
+                              'FRAME_OK', 'FRAME_CRC_ERR', 'FRAME_ABORTED', 'FRAME_INCOMPLETE',
+                              'CRC32_CHECK_WORDS', 'CRC32_CHECK'],
+
+    'EvrV1Isr'          : ['EvrV1Isr'],
+    'EvrV1Reg'          : ['EvrV1Reg'],
+
+    'EvrV2ChannelReg'   : ['EvrV2ChannelReg'],
+    'EvrV2Core'         : ['EvrV2Core'],
+    'EvrV2CoreChannels' : ['EvrV2CoreChannels'],
+    'EvrV2CoreTriggers' : ['EvrV2CoreTriggers'],
+    'EvrV2TriggerReg'   : ['EvrV2TriggerReg'],
+
+    'GthRxAlignCheck'   : ['GthRxAlignCheck'],
+    'LclsTriggerPulse'  : ['LclsTriggerPulse'],
+    'TimingFrameRx'     : ['TimingFrameRx'],
+
+    'TimingFleetMonitor'    : ['TimingFleetMonitor', 'FleetStatusType', 'decodeFleetStatus'],
+    'TimingAnomalyDetector' : ['TimingAnomalyDetector', 'TIMING_ANOMALY_COUNTERS', 'TPG_ANOMALY_COUNTERS',
+                               'ANOMALY_BURST', 'ANOMALY_DRIFT', 'ANOMALY_PEER'],
+    'TransactionProfiler'   : ['TransactionProfiler', 'TraceType', 'PROFILE_RAW_BLOCK'],
+
+    'TPG'               : ['TPG'],
+    'TPGControl'        : ['TPGControl'],
+    'TPGMiniCore'       : ['TPGMiniCore'],
+    'TPGSeqJump'        : ['TPGSeqJump'],
+    'TPGSeqState'       : ['TPGSeqState'],
+    'TPGStatus'         : ['TPGStatus'],
+
+    'YamlDevice'        : ['YamlDevice', 'YAML_TABLE_VERSION', 'YAML_MAX_ELEMENTS', 'compileYamlMap',
+                           'yamlTable', 'flattenTable', 'flattenDevice', 'parityReport'],
+}
+
+_exports = {name: mod for mod, names in _submodules.items() for name in names}
+
+__all__ = list(_exports)
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    value = getattr(importlib.import_module(f'{__name__}.{_exports[name]}'), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
+
+class _LazyModule(types.ModuleType):
+    # Importing LclsTimingCore.X binds the submodule X on the package, which
+    # would hide the class X of the same name. Keep the class instead.
+    def __setattr__(self, name, value):
+        if isinstance(value, types.ModuleType) and _exports.get(name) == name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
 
-from LclsTimingCore.EvrV1Isr import *
-from LclsTimingCore.EvrV1Reg import *
-
-from LclsTimingCore.EvrV2ChannelReg import *
-from LclsTimingCore.EvrV2Core import *
-from LclsTimingCore.EvrV2CoreChannels import *
-from LclsTimingCore.EvrV2CoreTriggers import *
-from LclsTimingCore.EvrV2TriggerReg import *
-
-from LclsTimingCore.GthRxAlignCheck import *
-from LclsTimingCore.LclsTriggerPulse import *
-from LclsTimingCore.TimingFrameRx import *
-
-from LclsTimingCore.TPG import *
-from LclsTimingCore.TPGControl import *
-from LclsTimingCore.TPGMiniCore import *
-from LclsTimingCore.TPGSeqJump import *
-from LclsTimingCore.TPGSeqState import *
-from LclsTimingCore.TPGStatus import *
+sys.modules[__name__].__class__ = _LazyModule
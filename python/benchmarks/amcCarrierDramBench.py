@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : AMC Carrier DRAM reader benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Measures AmcCarrierDRAM block read throughput against a file backed
+# memory emulator and compares it to a plain host memory copy of the
+# same file, which is the upper bound for the reader.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import time
+import tempfile
+import argparse
+
+import numpy   as np
+import pyrogue as pr
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('AmcCarrierDRAM reader benchmark')
+
+parser.add_argument(
+    "--size",
+    type     = lambda s: int(s, 0),
+    required = False,
+    default  = 0x10000000,
+    help     = "Emulated DRAM size in bytes",
+)
+
+parser.add_argument(
+    "--chunks",
+    type     = lambda s: [int(x, 0) for x in s.split(',')],
+    required = False,
+    default  = [0x100000, 0x400000, 0x1000000],
+    help     = "Comma separated list of chunk sizes",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+class DramRoot(pr.Root):
+    def __init__(self, emu, size, **kwargs):
+        super().__init__(name='DramRoot', pollEn=False, initRead=False, **kwargs)
+        self.addInterface(emu)
+        self.add(lclsTiming.AmcCarrierDRAM(memBase=emu, dramSize=size))
+
+def rate(nbytes, dt):
+    return nbytes / dt / 1.0e6
+
+with tempfile.TemporaryDirectory() as tmp:
+
+    emu = lclsTiming.FileMemEmulate(os.path.join(tmp, 'dram.bin'), args.size, maxSize=0x100000)
+    emu.data[:] = np.arange(args.size, dtype=np.uint8)
+
+    # Host ceiling: copy the emulated memory in the largest chunk size
+    buf = np.empty(max(args.chunks), dtype=np.uint8)
+    t0 = time.perf_counter()
+    for i in range(0, args.size, buf.size):
+        buf[:min(buf.size, args.size-i)] = emu.data[i:i+buf.size]
+    print(f'host memcpy               : {rate(args.size, time.perf_counter()-t0):9.1f} MB/s')
+
+    with DramRoot(emu, args.size) as root:
+        dram = root.AmcCarrierDRAM
+
+        for chunk in args.chunks:
+            t0 = time.perf_counter()
+            total = 0
+            for _, words in dram.iterRegion(0, args.size, chunkSize=chunk):
+                total += words.nbytes
+            print(f'iterRegion chunk 0x{chunk:08x} : {rate(total, time.perf_counter()-t0):9.1f} MB/s')
+
+        out = np.empty(args.size // 8, dtype=np.uint64)
+        t0 = time.perf_counter()
+        dram.readRegion(0, args.size, out=out)
+        print(f'readRegion preallocated   : {rate(args.size, time.perf_counter()-t0):9.1f} MB/s')
+
+        if not np.array_equal(out.view(np.uint8), emu.data):
+            raise RuntimeError('DRAM readback does not match emulated memory')
+
+        t0 = time.perf_counter()
+        dram.dumpRegion(0, args.size, os.path.join(tmp, 'dump.npy'))
+        print(f'dumpRegion memory mapped  : {rate(args.size, time.perf_counter()-t0):9.1f} MB/s')
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Timing error counter anomaly detector benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Feeds TimingAnomalyDetector with synthetic fleet wide counter snapshots and
+# reports the cost per receiver sample for increasing fleet sizes. A burst,
+# a drift and an outlier receiver are injected to check they are flagged.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import argparse
+
+import numpy as np
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Timing error counter anomaly detector benchmark')
+
+parser.add_argument(
+    "--sizes",
+    type     = str,
+    required = False,
+    default  = '100,1000,10000',
+    help     = "Comma separated fleet sizes",
+)
+
+parser.add_argument(
+    "--samples",
+    type     = int,
+    required = False,
+    default  = 200,
+    help     = "Fleet snapshots per fleet size",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+def run(size):
+    rng  = np.random.default_rng(1)
+    det  = lclsTiming.TimingAnomalyDetector(receivers=size)
+    ncnt = len(lclsTiming.TIMING_ANOMALY_COUNTERS)
+
+    counts = np.zeros((size, ncnt), dtype=np.uint32)
+    cost   = 0.0
+
+    for s in range(args.samples):
+        inc = rng.poisson(0.5, size=(size, ncnt)).astype(np.uint32)
+        inc[1] += 20                              # Outlier receiver
+        inc[2] += s // 4                          # Slowly drifting receiver
+        if s == args.samples - 1:
+            inc[0, 0] += 1000                     # Burst on the last sample
+        counts += inc
+
+        t0 = time.perf_counter()
+        det.update(counts, timestamp=float(s))
+        cost += time.perf_counter() - t0
+
+    found = {
+        'burst': bool(det.counterFlags[0, 0] & lclsTiming.ANOMALY_BURST),
+        'peer' : bool(det.flags[1] & lclsTiming.ANOMALY_PEER),
+        'drift': bool(det.flags[2] & lclsTiming.ANOMALY_DRIFT),
+    }
+    return cost / (args.samples * size), found
+
+print(f"{'receivers':>10} {'ns/sample':>10}  flagged")
+for size in [int(s) for s in args.sizes.split(',')]:
+    per, found = run(size)
+    print(f'{size:10d} {per*1e9:10.1f}  {found}')
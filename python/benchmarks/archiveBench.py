@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Columnar timing message archive benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Writes random serialized timing messages to a columnar archive and
+# compares reading the pulseId and fixedRates columns back against
+# re-decoding the raw frames.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Columnar timing message archive benchmark')
+
+parser.add_argument(
+    "--count",
+    type     = int,
+    required = False,
+    default  = 2000000,
+    help     = "Messages to archive",
+)
+
+parser.add_argument(
+    "--chunk",
+    type     = int,
+    required = False,
+    default  = 1 << 18,
+    help     = "Rows per archive chunk",
+)
+
+parser.add_argument(
+    "--path",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "Archive directory (default a temporary one, removed afterwards)",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+rng    = np.random.default_rng(0)
+frames = rng.integers(0, 256, (args.count, lclsTiming.TIMING_MESSAGE_BYTES), dtype=np.uint8)
+frames[:, 2:10] = np.arange(args.count, dtype='<u8').view(np.uint8).reshape(-1, 8)
+
+path = args.path or os.path.join(tempfile.mkdtemp(), 'archive')
+try:
+    t0 = time.perf_counter()
+    with lclsTiming.TimingArchiveWriter(path, chunk=args.chunk) as w:
+        w.appendFrames(frames)
+    write = time.perf_counter() - t0
+
+    t0  = time.perf_counter()
+    ref = lclsTiming.decodeTimingMessages(frames)[['pulseId', 'fixedRates']]
+    dec = time.perf_counter() - t0
+
+    t0  = time.perf_counter()
+    got = lclsTiming.TimingArchive(path).read(['pulseId', 'fixedRates'])
+    col = time.perf_counter() - t0
+
+    size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+    print(f'Decode and write:    {args.count/write/1e6:8.2f} M messages/s, {size/2**20:.0f} MB')
+    print(f'Re-decode frames:    {dec*1e3:8.1f} ms')
+    print(f'Read two columns:    {col*1e3:8.1f} ms ({dec/col:.1f}x)')
+    print(f'Identical:           {np.array_equal(got["pulseId"], ref["pulseId"]) and np.array_equal(got["fixedRates"], ref["fixedRates"])}')
+finally:
+    if args.path is None:
+        shutil.rmtree(os.path.dirname(path))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : BLD packet decoder benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Measures the single core BldStreamRx decode rate on synthetic packets and
+# compares it to the 929 kHz LCLS-II base rate.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import argparse
+
+import numpy as np
+import LclsTimingCore as lclsTiming
+
+BASE_RATE = 1300e6/1400
+
+#################################################################
+
+parser = argparse.ArgumentParser('BLD packet decoder benchmark')
+
+parser.add_argument(
+    "--packets",
+    type     = int,
+    required = False,
+    default  = 20000,
+    help     = "Number of packets to decode per configuration",
+)
+
+parser.add_argument(
+    "--packetSize",
+    type     = int,
+    required = False,
+    default  = 8192,
+    help     = "Maximum packet size in bytes",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+def makePacket(channelMask, packetSize, rng):
+    nch     = lclsTiming.bldChannels(channelMask).size
+    evType  = np.dtype([('delta', '<u4'), ('severity', '<u8'), ('data', '<u4', (nch,))])
+    first   = lclsTiming.BldHeaderType.itemsize + 4*nch
+    nEvents = 1 + (packetSize - first) // evType.itemsize
+
+    hdr = np.zeros(1, dtype=lclsTiming.BldHeaderType)
+    hdr['pulseId']     = 1 << 40
+    hdr['channelMask'] = channelMask
+
+    events = np.zeros(nEvents-1, dtype=evType)
+    events['delta'] = (1 << 20) | 1077
+    events['data']  = rng.integers(0, 1 << 32, (nEvents-1, nch), dtype=np.uint32)
+
+    head = rng.integers(0, 1 << 32, nch, dtype=np.uint32)
+    return hdr.tobytes() + head.tobytes() + events.tobytes(), nEvents
+
+rng = np.random.default_rng(0)
+
+for channelMask in [0x7FFFFFFF, 0xFFFF, 0xFF, 0xF]:
+    pkt, nEvents = makePacket(channelMask, args.packetSize, rng)
+    rx = lclsTiming.BldStreamRx()
+
+    t0 = time.perf_counter()
+    for _ in range(args.packets):
+        rx.process(pkt)
+    dt = time.perf_counter() - t0
+
+    evRate = args.packets * nEvents / dt
+    print(f'channelMask 0x{channelMask:08x} : {nEvents:4d} events/packet, '
+          f'{evRate/1e3:9.1f} kEvents/s ({evRate/BASE_RATE:5.2f} x base rate), '
+          f'{args.packets*len(pkt)/dt/1e6:7.1f} MB/s')
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : BSA accumulation model benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Models 64 BSA definitions on random fixed and AC rates over a simulated
+# TPG message stream and prints the modelled message rate against the
+# real time pulse rate, and the completion pulse IDs.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import argparse
+
+import numpy as np
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('BSA accumulation model benchmark')
+
+parser.add_argument(
+    "--count",
+    type     = int,
+    required = False,
+    default  = 4000000,
+    help     = "Messages to model",
+)
+
+parser.add_argument(
+    "--chunk",
+    type     = int,
+    required = False,
+    default  = 1 << 20,
+    help     = "Messages per process() call",
+)
+
+parser.add_argument(
+    "--seed",
+    type     = int,
+    required = False,
+    default  = 0,
+    help     = "Random seed of the BSA definitions",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+rng  = np.random.default_rng(args.seed)
+defs = np.zeros(lclsTiming.BSA_NUM_EDEFS, dtype=lclsTiming.BsaDefType)
+defs['rateMode']  = rng.integers(0, 2, len(defs))
+defs['fixedRate'] = rng.integers(0, 7, len(defs))
+defs['acRate']    = rng.integers(0, 6, len(defs))
+defs['acTSMask']  = 0x3F
+defs['destMode']  = lclsTiming.BSA_DEST_DONT_CARE
+defs['nToAvg']    = rng.integers(1, 4, len(defs))
+defs['avgToWr']   = rng.integers(0, 2800, len(defs))
+
+config = {
+    'baseDivisor' : 200,
+    'fixedDiv'    : np.array([1, 13, 91, 910, 9100, 91000, 910000, 0, 0, 0], dtype=np.int64),
+    'acDiv'       : np.array(lclsTiming.TPG_AC_DIVISORS, dtype=np.int64),
+    'timeStamp0'  : 0,
+    'edefs'       : np.zeros(0, dtype=lclsTiming.EdefType),
+}
+msgs = lclsTiming.generateSegment(config, 0, args.count)
+
+model = lclsTiming.BsaModel(defs)
+for e in range(len(defs)):
+    model.init(e, 0)
+
+t0 = time.perf_counter()
+for a in range(0, args.count, args.chunk):
+    model.process(msgs[a:a+args.chunk])
+dt = time.perf_counter() - t0
+
+print(f'Modelled:  {args.count/dt/1e6:8.3f} M messages/s')
+print(f'Real time: {lclsTiming.TIMING_BASE_RATE/1e6:8.3f} M messages/s ({args.count/dt/lclsTiming.TIMING_BASE_RATE:.1f}x)')
+print(f'Completed: {np.count_nonzero(model.doneAt >= 0)} of {len(defs)} EDEFs')
+for e in np.flatnonzero(model.doneAt >= 0):
+    print(f'  EDEF {e:2}: init {model.initAt[e]}, done {model.doneAt[e]}')
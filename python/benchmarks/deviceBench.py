@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : LclsTimingCore device benchmark suite
+#-----------------------------------------------------------------------------
+# Description:
+# Builds each LclsTimingCore device on a rogue memory emulator and measures
+# construction time, Python memory, variable count, one full poll cycle
+# (transactions and latency) and a bulk configuration apply. Results are
+# written as JSON and can be compared against a previous run.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+import pyrogue as pr
+import pyrogue.interfaces.simulation
+import rogue.interfaces.memory as rim
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('LclsTimingCore device benchmark suite')
+
+parser.add_argument(
+    "--output",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "JSON results file (default: stdout)",
+)
+
+parser.add_argument(
+    "--baseline",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "Previous JSON results to compare against",
+)
+
+parser.add_argument(
+    "--tolerance",
+    type     = float,
+    required = False,
+    default  = 0.25,
+    help     = "Allowed relative increase of time and memory metrics",
+)
+
+parser.add_argument(
+    "--count",
+    type     = int,
+    required = False,
+    default  = 5,
+    help     = "Repetitions per timed measurement (best is kept)",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+DEVICES = [
+    ('TPG',               lclsTiming.TPG,               {}),
+    ('TPGMiniCore',       lclsTiming.TPGMiniCore,       {}),
+    ('EvrV2CoreTriggers', lclsTiming.EvrV2CoreTriggers, {'numTrig': 16, 'dmaEnable': True, 'useTap': True}),
+    ('EvrV1Reg',          lclsTiming.EvrV1Reg,          {}),
+    ('GthRxAlignCheck',   lclsTiming.GthRxAlignCheck,   {}),
+    ('TimingFrameRx',     lclsTiming.TimingFrameRx,     {}),
+]
+
+# Metrics that are counts must not grow at all, the others within tolerance
+EXACT_METRICS = ['variables', 'pollTransactions', 'configTransactions']
+TIMED_METRICS = ['constructSec', 'startSec', 'pyMemBytes', 'pollSec', 'configSec']
+
+class CountingMemEmulate(pyrogue.interfaces.simulation.MemEmulate):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.count = 0
+
+    def _doTransaction(self, transaction):
+        self.count += 1
+        super()._doTransaction(transaction)
+
+class BenchRoot(pr.Root):
+    def __init__(self, cls, devArgs, **kwargs):
+        super().__init__(name='BenchRoot', pollEn=False, initRead=False, **kwargs)
+        self.mem = CountingMemEmulate()
+        self.addInterface(self.mem)
+        self.add(cls(memBase=self.mem, **devArgs))
+
+def best(fn):
+    ret = None
+    for _ in range(args.count):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        ret = dt if ret is None else min(ret, dt)
+    return ret
+
+def pollCycle(polled):
+    # Same block level sequence as the PyRogue poll queue
+    blocks = list(dict.fromkeys(v._block for v in polled))
+    for b in blocks:
+        pr.startTransaction(b, type=rim.Read)
+    for b in blocks:
+        pr.checkTransaction(b)
+
+def benchDevice(cls, kwargs):
+    ret = {}
+
+    ret['constructSec'] = best(lambda: cls(**kwargs))
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    dev  = cls(**kwargs)
+    ret['pyMemBytes'] = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del dev
+
+    root = BenchRoot(cls, kwargs)
+    dev  = next(iter(root.devices.values()))
+    t0 = time.perf_counter()
+    root.start()
+    ret['startSec'] = time.perf_counter() - t0
+
+    try:
+        variables = dev.variableList
+        ret['variables'] = len(variables)
+
+        polled = [v for v in variables if isinstance(v, pr.RemoteVariable) and v.pollInterval > 0]
+        root.mem.count = 0
+        ret['pollSec'] = best(lambda: pollCycle(polled))
+        ret['pollTransactions'] = root.mem.count // args.count
+
+        cfg = root.getYaml(readFirst=True, modes=['RW'], excGroups=None)
+        root.mem.count = 0
+        ret['configSec'] = best(lambda: root.setYaml(cfg, writeEach=False, modes=['RW']))
+        ret['configTransactions'] = root.mem.count // args.count
+    finally:
+        root.stop()
+
+    return ret
+
+results = {name: benchDevice(cls, kwargs) for name, cls, kwargs in DEVICES}
+
+out = json.dumps(results, indent=2, sort_keys=True)
+if args.output is None:
+    print(out)
+else:
+    with open(args.output, 'w') as f:
+        f.write(out + '\n')
+
+#################################################################
+
+if args.baseline is not None:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, res in results.items():
+        if name not in baseline:
+            continue
+        for key in EXACT_METRICS:
+            if res[key] > baseline[name][key]:
+                regressions.append(f'{name}.{key}: {baseline[name][key]} -> {res[key]}')
+        for key in TIMED_METRICS:
+            if res[key] > baseline[name][key] * (1.0 + args.tolerance):
+                regressions.append(f'{name}.{key}: {baseline[name][key]:.6g} -> {res[key]:.6g}')
+
+    for line in regressions:
+        print(f'REGRESSION {line}', file=sys.stderr)
+
+    sys.exit(1 if regressions else 0)
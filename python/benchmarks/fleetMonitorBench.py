@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Timing receiver fleet monitor scaling benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Runs TimingFleetMonitor over an emulated fleet of TimingFrameRx and
+# GthRxAlignCheck receivers and reports the aggregate status record rate
+# and per worker cycle time for an increasing number of worker processes.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import argparse
+
+import pyrogue as pr
+import pyrogue.interfaces.simulation
+import LclsTimingCore as lclsTiming
+
+# Address space given to each emulated receiver
+RX_STRIDE  = 0x1000
+GTH_OFFSET = 0x800
+
+class LatencyMemEmulate(pyrogue.interfaces.simulation.MemEmulate):
+    def __init__(self, latency, **kwargs):
+        super().__init__(**kwargs)
+        self._latency = latency
+
+    def _doTransaction(self, transaction):
+        if self._latency > 0:
+            time.sleep(self._latency)
+        super()._doTransaction(transaction)
+
+class FleetRoot(pr.Root):
+    def __init__(self, receivers, latency, **kwargs):
+        super().__init__(name='FleetRoot', pollEn=False, initRead=False, **kwargs)
+        self.mem = LatencyMemEmulate(latency)
+        self.addInterface(self.mem)
+
+        for i in receivers:
+            self.add(lclsTiming.TimingFrameRx(
+                name    = f'Rx[{i}]',
+                memBase = self.mem,
+                offset  = i*RX_STRIDE,
+            ))
+            self.add(lclsTiming.GthRxAlignCheck(
+                name    = f'Gth[{i}]',
+                memBase = self.mem,
+                offset  = i*RX_STRIDE + GTH_OFFSET,
+            ))
+
+# Receivers are (index, latency) tuples so the factory stays a plain function
+def fleetFactory(receivers):
+    root = FleetRoot([i for i, _ in receivers], receivers[0][1])
+    root.start()
+    pairs = [(root.node(f'Rx[{i}]'), root.node(f'Gth[{i}]')) for i, _ in receivers]
+    return root, pairs
+
+def run(args, workers):
+    receivers = [(i, args.latency) for i in range(args.receivers)]
+    mon = lclsTiming.TimingFleetMonitor(receivers, fleetFactory, workers=workers, period=0.0)
+    mon.start()
+
+    # Let every worker build its root before measuring
+    while (mon.status['timestamp'] == 0).any():
+        time.sleep(0.05)
+
+    start = mon.recordCount
+    t0 = time.monotonic()
+    time.sleep(args.duration)
+    count = mon.recordCount - start
+    dt = time.monotonic() - t0
+    cycle = mon.status['cycleTime'].mean()
+    valid = mon.status['valid'].all()
+
+    mon.stop()
+    return count / dt, cycle, valid
+
+#################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Timing receiver fleet monitor benchmark')
+
+    parser.add_argument(
+        "--receivers",
+        type     = int,
+        required = False,
+        default  = 256,
+        help     = "Number of emulated receivers",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type     = str,
+        required = False,
+        default  = '1,2,4,8',
+        help     = "Comma separated worker counts to measure",
+    )
+
+    parser.add_argument(
+        "--latency",
+        type     = float,
+        required = False,
+        default  = 50e-6,
+        help     = "Emulated latency per memory transaction in seconds",
+    )
+
+    parser.add_argument(
+        "--duration",
+        type     = float,
+        required = False,
+        default  = 5.0,
+        help     = "Measurement time per worker count in seconds",
+    )
+
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'records/s':>12} {'cycle ms':>10} {'speedup':>8} {'valid':>6}")
+
+    base = None
+    for workers in [int(w) for w in args.workers.split(',')]:
+        rate, cycle, valid = run(args, workers)
+        base = rate if base is None else base
+        print(f'{workers:8d} {rate:12.1f} {cycle*1e3:10.2f} {rate/base:8.2f} {str(valid):>6}')
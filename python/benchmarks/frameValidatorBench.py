@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Timing frame validator benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Serializes random frames into a symbol stream, corrupts a few payload
+# words and reports the rate at which TimingFrameValidator segments and
+# checks the stream, in blocks as a capture would be read, together with
+# the TimingFrameRx counters. The CRC is checked first against the CRC-32
+# check vector and zlib.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import zlib
+import argparse
+
+import numpy as np
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Timing frame validator benchmark')
+
+parser.add_argument(
+    "--frames",
+    type     = int,
+    required = False,
+    default  = 200000,
+    help     = "Frames in the stream",
+)
+
+parser.add_argument(
+    "--words",
+    type     = int,
+    required = False,
+    default  = 59,
+    help     = "Payload words per frame (59 for a timing message)",
+)
+
+parser.add_argument(
+    "--idle",
+    type     = int,
+    required = False,
+    default  = 134,
+    help     = "Idle commas after every frame (134 for 929 kHz)",
+)
+
+parser.add_argument(
+    "--errors",
+    type     = int,
+    required = False,
+    default  = 100,
+    help     = "Frames with a corrupted payload word",
+)
+
+parser.add_argument(
+    "--block",
+    type     = int,
+    required = False,
+    default  = 1 << 22,
+    help     = "Words per processed block",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+rng     = np.random.default_rng(0)
+payload = rng.integers(0, 1 << 16, (args.frames, args.words), dtype=np.uint16)
+
+# Known vectors: CRC-32 check value and zlib over the big endian words
+assert lclsTiming.crc32Words([lclsTiming.CRC32_CHECK_WORDS])[0] == lclsTiming.CRC32_CHECK
+assert all(zlib.crc32(p.astype('>u2').tobytes()) == c for p, c in zip(payload[:100], lclsTiming.crc32Words(payload[:100])))
+
+data, dataK = lclsTiming.serializeFrames(payload, idle=args.idle)
+
+# Flip one bit of a payload word in some frames
+period = len(data) // args.frames
+bad    = rng.choice(args.frames, args.errors, replace=False)
+data[bad * period + 3 + rng.integers(0, args.words, args.errors)] ^= 1
+
+val = lclsTiming.TimingFrameValidator()
+t0  = time.perf_counter()
+ret = [val.process(data[i:i+args.block], dataK[i:i+args.block]) for i in range(0, len(data), args.block)]
+ret = np.concatenate(ret + [val.flush()])
+dt  = time.perf_counter() - t0
+
+status = np.bincount(ret['status'], minlength=4)
+print(f'Stream:              {data.nbytes/2**20:8.1f} MB, {args.frames} frames')
+print(f'Validate:            {data.nbytes/dt/1e6:8.1f} MB/s, {len(ret)/dt/1e6:.3f} M frames/s')
+print(f'Frames:              {status[lclsTiming.FRAME_OK]:8d} ok, {status[lclsTiming.FRAME_CRC_ERR]} CRC errors')
+print(f'Counters:            {val.counters()}')
+print(f'Errors detected:     {val.CrcErrCount == args.errors}')
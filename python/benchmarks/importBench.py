@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : LclsTimingCore import time benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Measures the start-up cost of a short lived script that only needs
+# TimingFrameRx, compared to loading the device modules the package used to
+# star-import and to loading every LclsTimingCore module. Each case runs in
+# a fresh interpreter; pyrogue is imported first so its own import time is
+# reported separately.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import sys
+import argparse
+import subprocess
+
+#################################################################
+
+parser = argparse.ArgumentParser('LclsTimingCore import time benchmark')
+
+parser.add_argument(
+    "--count",
+    type     = int,
+    required = False,
+    default  = 10,
+    help     = "Number of interpreter launches per case",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+TIMER = '''
+import time
+import pyrogue
+t0 = time.perf_counter()
+{}
+print(time.perf_counter() - t0)
+'''
+
+# Modules star-imported by the package before the lazy loader
+BASELINE_MODULES = [
+    'EvrV1Isr', 'EvrV1Reg', 'EvrV2ChannelReg', 'EvrV2Core', 'EvrV2CoreChannels', 'EvrV2CoreTriggers',
+    'EvrV2TriggerReg', 'GthRxAlignCheck', 'LclsTriggerPulse', 'TimingFrameRx', 'TPG', 'TPGControl',
+    'TPGMiniCore', 'TPGSeqJump', 'TPGSeqState', 'TPGStatus',
+]
+
+CASES = [
+    ('pyrogue only',        'pass'),
+    ('package only',        'import LclsTimingCore'),
+    ('TimingFrameRx',       'import LclsTimingCore as t; t.TimingFrameRx'),
+    ('TPG',                 'import LclsTimingCore as t; t.TPG'),
+    ('baseline modules',    f'import importlib; [importlib.import_module("LclsTimingCore." + m) for m in {BASELINE_MODULES}]'),
+    ('all modules (eager)', 'import LclsTimingCore as t; [getattr(t, n) for n in t.__all__]'),
+]
+
+def measure(stmt):
+    times = []
+    for _ in range(args.count):
+        out = subprocess.run([sys.executable, '-c', TIMER.format(stmt)], check=True, capture_output=True, text=True)
+        times.append(float(out.stdout.split()[-1]))
+    return min(times)
+
+results = {name: measure(stmt) for name, stmt in CASES}
+
+for name, t in results.items():
+    print(f'{name:<20} : {t*1e3:8.2f} ms')
+
+base = results['baseline modules'] - results['TimingFrameRx']
+full = results['all modules (eager)'] - results['TimingFrameRx']
+print(f'Lazy TimingFrameRx import saves {base*1e3:.2f} ms per process over the original star-imports')
+print(f'Lazy TimingFrameRx import saves {full*1e3:.2f} ms per process over loading every module')
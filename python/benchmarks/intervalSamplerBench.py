@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Interval synchronous sampler benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Runs a TPGMiniCore on TimingSimMemory with a short CountInterval and
+# compares IntervalSampler against polling the five interval counters one
+# variable at a time at an unrelated period: samples and reads per
+# interval and the worst base rate error.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import argparse
+
+import numpy   as np
+import pyrogue as pr
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Interval synchronous sampler benchmark')
+
+parser.add_argument(
+    "--interval",
+    type     = float,
+    required = False,
+    default  = 0.1,
+    help     = "CountInterval in seconds",
+)
+
+parser.add_argument(
+    "--intervals",
+    type     = int,
+    required = False,
+    default  = 30,
+    help     = "Number of intervals per measurement",
+)
+
+parser.add_argument(
+    "--poll",
+    type     = float,
+    required = False,
+    default  = 0.083,
+    help     = "Unrelated polling period in seconds",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+COUNTERS = ['PllCnt', 'ClkCnt', 'SyncErrCnt', 'CountInterval', 'BaseRateCount']
+
+class SimRoot(pr.Root):
+    def __init__(self, **kwargs):
+        super().__init__(name='SimRoot', pollEn=False, initRead=False, **kwargs)
+        self.mem = lclsTiming.TimingSimMemory()
+        self.addInterface(self.mem)
+
+        self.mem.addModel(lclsTiming.TPGMiniCoreModel(0, syncErrRate=10.0))
+        self.add(lclsTiming.TPGMiniCore(memBase=self.mem, offset=0))
+
+with SimRoot() as root:
+    tpg = root.TPGMiniCore
+    tpg.CountInterval.set(int(args.interval * lclsTiming.TIMING_CLK_RATE))
+
+    # Per variable polling at an unrelated period
+    polls = []
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < args.intervals * args.interval:
+        polls.append(tuple(tpg.node(n).get() for n in COUNTERS))
+        time.sleep(args.poll)
+    polls = np.array(polls, dtype=np.float64)
+    prate = polls[:, 4] * lclsTiming.TIMING_CLK_RATE / np.maximum(polls[:, 3], 1)
+
+    # Interval synchronous sampling
+    sampler = lclsTiming.IntervalSampler(tpg)
+    sampler.startSampling()
+    time.sleep(args.intervals * args.interval)
+    sampler.stopSampling()
+    hist = sampler.history()
+
+    n = args.intervals
+    print(f"{'method':>10} {'samples':>8} {'reads':>6} {'reads/intv':>11} {'rate err Hz':>12}")
+    print(f"{'poll':>10} {len(polls):8d} {len(polls)*len(COUNTERS):6d} {len(polls)*len(COUNTERS)/n:11.2f} "
+          f"{np.abs(prate - lclsTiming.TIMING_BASE_RATE).max():12.3f}")
+    print(f"{'interval':>10} {len(hist):8d} {len(hist):6d} {len(hist)/n:11.2f} "
+          f"{np.abs(hist['BaseRate'] - lclsTiming.TIMING_BASE_RATE).max():12.3f}")
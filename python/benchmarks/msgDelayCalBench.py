@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : MsgDelay calibration benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Calibrates the MsgDelay of a crate of emulated timing receivers with
+# random fiber latencies and reports the time taken and the residual
+# latency spread after the delays are applied.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import argparse
+
+import numpy   as np
+import pyrogue as pr
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('MsgDelay calibration benchmark')
+
+parser.add_argument(
+    "--receivers",
+    type     = int,
+    required = False,
+    default  = 64,
+    help     = "Number of emulated receivers",
+)
+
+parser.add_argument(
+    "--messages",
+    type     = int,
+    required = False,
+    default  = 10000,
+    help     = "Messages captured per receiver",
+)
+
+parser.add_argument(
+    "--jitter",
+    type     = float,
+    required = False,
+    default  = 1.0,
+    help     = "Arrival jitter in rms 186 MHz clocks",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+class SimRoot(pr.Root):
+    def __init__(self, latencies, jitter, **kwargs):
+        super().__init__(name='SimRoot', pollEn=False, initRead=False, **kwargs)
+        self.mem = lclsTiming.TimingSimMemory()
+        self.addInterface(self.mem)
+
+        self.models = []
+        for i, latency in enumerate(latencies):
+            self.models.append(self.mem.addModel(lclsTiming.TimingFrameRxModel(
+                i*0x1000, latency=latency, jitter=jitter, seed=i)))
+            self.add(lclsTiming.TimingFrameRx(
+                name    = f'Rx[{i}]',
+                memBase = self.mem,
+                offset  = i*0x1000,
+            ))
+
+rng       = np.random.default_rng(0)
+latencies = rng.uniform(500, 20000, args.receivers)
+
+with SimRoot(latencies, args.jitter) as root:
+    receivers = [root.node(f'Rx[{i}]') for i in range(args.receivers)]
+
+    # Captures take as long as the messages take to arrive
+    def capture(receivers):
+        time.sleep(args.messages / lclsTiming.TIMING_BASE_RATE)
+        ret = [m.capture(args.messages) for m in root.models]
+        return [a for a, _ in ret], [s for _, s in ret]
+
+    cal = lclsTiming.MsgDelayCalibration(receivers, margin=16)
+    t0  = time.perf_counter()
+    ret = cal.run(capture)
+    dt  = time.perf_counter() - t0
+
+    res = ret['residual'][ret['valid'].astype(bool)]
+    print(f'Receivers:           {args.receivers:8d} ({ret["valid"].sum()} valid)')
+    print(f'Calibration time:    {dt*1e3:8.1f} ms')
+    print(f'Target latency:      {cal.target:8.1f} clocks')
+    print(f'Residual:            {np.abs(res).max():8.3f} clocks max, {np.sqrt(np.mean(res**2)):.3f} rms')
+    print(f'Jitter:              {ret["jitter"].mean():8.3f} clocks rms')
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Transaction profiler overhead and poll budget report
+#-----------------------------------------------------------------------------
+# Description:
+# Runs poll cycles of TPG, GthRxAlignCheck and TimingFrameRx on a rogue
+# memory emulator with and without TransactionProfiler, reports the
+# profiling overhead per transaction and which blocks use the poll budget.
+# Also checks that a BlockTransfer read is recorded.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import argparse
+
+import pyrogue as pr
+import pyrogue.interfaces.simulation
+import rogue.interfaces.memory as rim
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Transaction profiler benchmark')
+
+parser.add_argument(
+    "--cycles",
+    type     = int,
+    required = False,
+    default  = 200,
+    help     = "Poll cycles per measurement",
+)
+
+parser.add_argument(
+    "--top",
+    type     = int,
+    required = False,
+    default  = 10,
+    help     = "Number of blocks in the report",
+)
+
+parser.add_argument(
+    "--trace",
+    type     = str,
+    required = False,
+    default  = None,
+    help     = "Chrome trace JSON output file",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+class ProfileRoot(pr.Root):
+    def __init__(self, **kwargs):
+        super().__init__(name='ProfileRoot', pollEn=False, initRead=False, **kwargs)
+        self.mem = pyrogue.interfaces.simulation.MemEmulate()
+        self.addInterface(self.mem)
+
+        self.add(lclsTiming.TPG(memBase=self.mem, offset=0x00000000))
+        self.add(lclsTiming.GthRxAlignCheck(memBase=self.mem, offset=0x00010000))
+        self.add(lclsTiming.TimingFrameRx(memBase=self.mem, offset=0x00020000))
+
+def pollCycles(blocks):
+    t0 = time.perf_counter()
+    for _ in range(args.cycles):
+        for b in blocks:
+            pr.startTransaction(b, type=rim.Read)
+        for b in blocks:
+            pr.checkTransaction(b)
+    return time.perf_counter() - t0
+
+with ProfileRoot() as root:
+    polled = [v for v in root.variableList if isinstance(v, pr.RemoteVariable) and v.pollInterval > 0]
+    blocks = list(dict.fromkeys(v._block for v in polled))
+
+    base = pollCycles(blocks)
+
+    prof = lclsTiming.TransactionProfiler()
+    prof.attach(root)
+    prof.start()
+    traced = pollCycles(blocks)
+    nPoll  = len(prof.trace())
+
+    # Block transfers bypass the variable blocks and must be traced too
+    lclsTiming.readBlock(root.TimingFrameRx, 0, size=0x40)
+    prof.stop()
+
+    raw = prof.trace()[nPoll:]
+    assert len(raw) and all(prof.blocks[b][1] == [lclsTiming.PROFILE_RAW_BLOCK] for b in raw['block'])
+    assert raw['size'].sum() == 0x40
+
+    count = args.cycles * len(blocks)
+    print(f'{len(blocks)} polled blocks, {count} transactions')
+    print(f'Overhead: {(traced - base) / count * 1e9:.0f} ns per transaction ({traced / base - 1:.1%})')
+    print()
+    print('\n'.join(prof.report(top=args.top)))
+    print()
+    print('\n'.join(prof.deviceReport(top=args.top)))
+
+    if args.trace is not None:
+        prof.exportChromeTrace(args.trace)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Pulse ID indexed random access benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Archives a capture of consecutive pulse IDs with random gaps, then
+# times random pulse ID lookups of rows and of the fixedRates and
+# beamRequest columns against a plain searchsorted of the pulseId column.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Pulse ID indexed random access benchmark')
+
+parser.add_argument(
+    "--count",
+    type     = int,
+    required = False,
+    default  = 5000000,
+    help     = "Captured messages",
+)
+
+parser.add_argument(
+    "--gaps",
+    type     = int,
+    required = False,
+    default  = 2000,
+    help     = "Pulses missing from the capture",
+)
+
+parser.add_argument(
+    "--queries",
+    type     = int,
+    required = False,
+    default  = 20000000,
+    help     = "Random pulse ID lookups",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+rng  = np.random.default_rng(0)
+pid  = np.arange(args.count + args.gaps, dtype=np.uint64) + (1 << 40)
+pid  = np.delete(pid, rng.choice(len(pid), args.gaps, replace=False))
+msgs = np.zeros(len(pid), dtype=lclsTiming.TimingMessageType)
+msgs['pulseId']     = pid
+msgs['fixedRates']  = rng.integers(0, 1 << 10, len(pid))
+msgs['beamRequest'] = rng.integers(0, 1 << 32, len(pid))
+
+path = os.path.join(tempfile.mkdtemp(), 'archive')
+try:
+    with lclsTiming.TimingArchiveWriter(path, chunk=1 << 18) as w:
+        w.append(msgs)
+
+    t0    = time.perf_counter()
+    index = lclsTiming.PulseIdIndex(path)
+    build = time.perf_counter() - t0
+
+    q = rng.integers(int(pid[0]) - 1000, int(pid[-1]) + 1000, args.queries).astype(np.uint64)
+
+    t0   = time.perf_counter()
+    rows = index.rows(q)
+    tRow = time.perf_counter() - t0
+
+    t0         = time.perf_counter()
+    rec, found = index.lookup(q, ['fixedRates', 'beamRequest'])
+    tLook      = time.perf_counter() - t0
+
+    # Plain binary search of the whole pulseId column
+    t0   = time.perf_counter()
+    col  = np.concatenate([c['pulseId'] for _, c in index.archive.iterChunks(['pulseId'])])
+    pos  = np.minimum(np.searchsorted(col, q), len(col) - 1)
+    ref  = np.where(col[pos] == q, pos, -1)
+    tRef = time.perf_counter() - t0
+
+    print(f'Index build:          {build*1e3:8.1f} ms, {len(index.runs)} runs')
+    print(f'Rows:                 {args.queries/tRow/1e6:8.1f} M lookups/s')
+    print(f'Rows and two columns: {args.queries/tLook/1e6:8.1f} M lookups/s')
+    print(f'Column searchsorted:  {args.queries/tRef/1e6:8.1f} M lookups/s')
+    print(f'Found:                {np.count_nonzero(found)} of {args.queries}')
+    print(f'Identical:            {np.array_equal(rows, ref) and np.array_equal(rec["fixedRates"][found], msgs["fixedRates"][rows[found]])}')
+finally:
+    shutil.rmtree(os.path.dirname(path))
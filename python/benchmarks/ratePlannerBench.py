@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Rate divisor planner benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Times RatePlanner.search() over all 16 bit base divisors against a plain
+# Python loop planning one candidate at a time and prints the report of
+# the best plan.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import argparse
+
+import numpy as np
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Rate divisor planner benchmark')
+
+parser.add_argument(
+    "--rates",
+    type     = str,
+    required = False,
+    default  = '1e6,1e5,1e4,1e3,100,10,1',
+    help     = "Comma separated fixed marker rates in Hz",
+)
+
+parser.add_argument(
+    "--minBase",
+    type     = float,
+    required = False,
+    default  = 0.0,
+    help     = "Minimum base rate in Hz",
+)
+
+parser.add_argument(
+    "--loop",
+    type     = int,
+    required = False,
+    default  = 4096,
+    help     = "Base divisors planned by the Python loop (extrapolated)",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+rates = [float(r) for r in args.rates.split(',')]
+
+t0   = time.perf_counter()
+best = lclsTiming.RatePlanner.search(rates, minBaseRate=args.minBase, top=1)[0]
+vec  = time.perf_counter() - t0
+
+# One candidate at a time
+t0    = time.perf_counter()
+worst = []
+for d in range(1, args.loop + 1):
+    p = lclsTiming.RatePlanner(rates, baseDivisor=d)
+    worst.append(np.nanmax(np.abs(p.fixedError)) if p.baseRate >= args.minBase else np.inf)
+loop = (time.perf_counter() - t0) * ((1 << 16) - 1) / args.loop
+
+print(f'Vectorized search: {vec*1e3:9.1f} ms')
+print(f'Python loop:       {loop*1e3:9.1f} ms (extrapolated, {loop/vec:.0f}x)')
+if best.baseDivisor <= args.loop:
+    print(f'Loop best divisor: {int(np.argmin(worst)) + 1}')
+print()
+print('\n'.join(best.report()))
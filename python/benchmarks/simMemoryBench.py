@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Behavioural memory emulator benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Builds fleets of TimingFrameRx devices on TimingSimMemory with a
+# TimingFrameRxModel each and reports the cost of one register window read
+# for increasing fleet sizes, plus the frame rate seen through the counters.
+# BsaActive[i] of a TPGMiniCore is checked to start EDEF i of its model.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import random
+import argparse
+
+import pyrogue as pr
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Behavioural memory emulator benchmark')
+
+parser.add_argument(
+    "--sizes",
+    type     = str,
+    required = False,
+    default  = '10,100,1000,5000',
+    help     = "Comma separated numbers of simulated devices",
+)
+
+parser.add_argument(
+    "--reads",
+    type     = int,
+    required = False,
+    default  = 2000,
+    help     = "Register window reads per fleet size",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+class SimRoot(pr.Root):
+    def __init__(self, size, **kwargs):
+        super().__init__(name='SimRoot', pollEn=False, initRead=False, **kwargs)
+        self.mem = lclsTiming.TimingSimMemory()
+        self.addInterface(self.mem)
+
+        for i in range(size):
+            self.mem.addModel(lclsTiming.TimingFrameRxModel(i*0x1000))
+            self.add(lclsTiming.TimingFrameRx(
+                name    = f'Rx[{i}]',
+                memBase = self.mem,
+                offset  = i*0x1000,
+            ))
+
+class MiniRoot(pr.Root):
+    def __init__(self, **kwargs):
+        super().__init__(name='MiniRoot', pollEn=False, initRead=False, **kwargs)
+        self.mem = lclsTiming.TimingSimMemory()
+        self.mem.addModel(lclsTiming.TPGMiniCoreModel(0, edefs=4))
+        self.addInterface(self.mem)
+        self.add(lclsTiming.TPGMiniCore(memBase=self.mem, NARRAYSBSA=4))
+
+with MiniRoot() as root:
+    tpg = root.TPGMiniCore
+    tpg.BsaNtoAvg[3].set(1)
+    tpg.BsaAvgToWr[3].set(1)
+    tpg.BsaActive[3].set(1)
+    time.sleep(0.01)
+    assert tpg.BsaCompleteRd.get() == 1 << 3
+    print('BsaActive[3] starts and completes EDEF 3')
+
+print(f"{'devices':>8} {'us/read':>9} {'frames/s':>12}")
+
+for size in [int(s) for s in args.sizes.split(',')]:
+    with SimRoot(size) as root:
+        devs = list(root.devices.values())
+        pick = [random.choice(devs) for _ in range(args.reads)]
+
+        t0 = time.perf_counter()
+        for dev in pick:
+            lclsTiming.readBlock(dev, 0, size=0x30)
+        per = (time.perf_counter() - t0) / args.reads
+
+        dev = devs[0]
+        a   = lclsTiming.readBlock(dev, 0, size=4)[0]
+        t0  = time.perf_counter()
+        time.sleep(0.5)
+        b   = lclsTiming.readBlock(dev, 0, size=4)[0]
+        rate = ((int(b) - int(a)) & 0xFFFFFFFF) / (time.perf_counter() - t0)
+
+        print(f'{size:8d} {per*1e6:9.1f} {rate:12.0f}')
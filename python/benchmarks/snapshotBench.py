@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Register snapshot save/restore benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Compares saving and restoring a TPG + EVR crate through per variable YAML
+# and through binary RegisterSnapshot files on a rogue memory emulator.
+# Restoring onto a TPGMiniCore register model is checked to leave the
+# pulse ID, time stamp and BSA state alone.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import time
+import argparse
+import tempfile
+
+import pyrogue as pr
+import pyrogue.interfaces.simulation
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Register snapshot save/restore benchmark')
+
+parser.add_argument(
+    "--count",
+    type     = int,
+    required = False,
+    default  = 3,
+    help     = "Repetitions per measurement (best is kept)",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+class CrateRoot(pr.Root):
+    def __init__(self, **kwargs):
+        super().__init__(name='CrateRoot', pollEn=False, initRead=False, **kwargs)
+        self.mem = pyrogue.interfaces.simulation.MemEmulate()
+        self.addInterface(self.mem)
+
+        self.add(pr.Device(name='Crate', memBase=self.mem))
+        self.Crate.add(lclsTiming.TPG(offset=0x00000000))
+        self.Crate.add(lclsTiming.EvrV2CoreTriggers(offset=0x00040000, numTrig=16, dmaEnable=True, useTap=True))
+        self.Crate.add(lclsTiming.EvrV1Reg(offset=0x00080000))
+
+class MiniRoot(pr.Root):
+    def __init__(self, **kwargs):
+        super().__init__(name='MiniRoot', pollEn=False, initRead=False, **kwargs)
+        self.mem   = lclsTiming.TimingSimMemory()
+        self.model = self.mem.addModel(lclsTiming.TPGMiniCoreModel(0, edefs=4))
+        self.addInterface(self.mem)
+        self.add(lclsTiming.TPGMiniCore(memBase=self.mem))
+
+def best(fn):
+    ret = None
+    for _ in range(args.count):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        ret = dt if ret is None else min(ret, dt)
+    return ret
+
+with CrateRoot() as root, tempfile.TemporaryDirectory() as tmp:
+    yamlFile = os.path.join(tmp, 'crate.yml')
+    snapFile = os.path.join(tmp, 'crate.snap')
+
+    yamlSave = best(lambda: root.saveYaml(name=yamlFile, readFirst=True, modes=['RW', 'RO'], autoPrefix='', autoCompress=False))
+    yamlLoad = best(lambda: root.loadYaml(name=yamlFile, writeEach=False, modes=['RW']))
+
+    snapSave = best(lambda: lclsTiming.RegisterSnapshot.read(root.Crate).save(snapFile))
+    snapLoad = best(lambda: lclsTiming.RegisterSnapshot.load(snapFile).restore(root.Crate))
+    snapRaw  = best(lambda: lclsTiming.RegisterSnapshot.load(snapFile).restore(root.Crate, refresh=False))
+
+    print(f"{'format':<8} {'save ms':>9} {'restore ms':>11} {'bytes':>9}")
+    print(f"{'yaml':<8} {yamlSave*1e3:9.1f} {yamlLoad*1e3:11.1f} {os.path.getsize(yamlFile):9d}")
+    print(f"{'snapshot':<8} {snapSave*1e3:9.1f} {snapLoad*1e3:11.1f} {os.path.getsize(snapFile):9d}")
+    print(f'Snapshot restore without shadow refresh: {snapRaw*1e3:.1f} ms')
+
+# Snapshot with the strobes and BSA init bit set, then clear them: a
+# restore writing them back would reload the pulse ID and time stamp and
+# restart EDEF 0
+with MiniRoot() as root:
+    tpg   = root.TPGMiniCore
+    model = root.model
+    tpg.PulseIdWr.set(1000)
+    tpg.PulseIdSet.set(1)
+    tpg.TStampWr.set(1 << 32)
+    tpg.TStampSet.set(1)
+    tpg.BsaNtoAvg[0].set(100)
+    tpg.BsaActive[0].set(1)
+    snap = lclsTiming.RegisterSnapshot.read(tpg)
+    for v in (tpg.PulseIdSet, tpg.TStampSet, tpg.BsaActive[0]):
+        v.set(0)
+
+    state = (model._pid0, model._ts0, model._done.copy(), model._complete)
+    snap.restore(tpg)
+    assert (model._pid0, model._ts0, model._complete) == (state[0], state[1], state[3])
+    assert (model._done == state[2]).all()
+    assert tpg.PulseIdSet.get() == 0 and tpg.BsaActive[0].get() == 0
+    print('TPGMiniCore restore leaves pulse ID, time stamp and BSA state unchanged')
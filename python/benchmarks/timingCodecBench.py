@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Timing message codec benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Encodes a simulated TPG message stream with TimingCodec and reports the
+# size reduction against serialized frames, the encode and decode rates
+# (in serialized frame bytes per second) and the rate of reading the
+# serialized frames back from a file.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Timing message codec benchmark')
+
+parser.add_argument(
+    "--count",
+    type     = int,
+    required = False,
+    default  = 1 << 20,
+    help     = "Messages to encode",
+)
+
+parser.add_argument(
+    "--edefs",
+    type     = int,
+    required = False,
+    default  = 16,
+    help     = "Started BSA definitions",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+# Default TPGMiniCore rates and staggered BSA definitions, as tpgSimBench
+edefs = np.zeros(args.edefs, dtype=lclsTiming.EdefType)
+for e in range(args.edefs):
+    edefs[e] = (e, e % 2, (e // 2) % 6, 1 + e, 100, 1000 * e)
+
+config = {
+    'baseDivisor' : 200,
+    'fixedDiv'    : np.array([1, 13, 91, 910, 9100, 91000, 910000, 0, 0, 0], dtype=np.int64),
+    'acDiv'       : np.array(lclsTiming.TPG_AC_DIVISORS, dtype=np.int64),
+    'timeStamp0'  : int(time.time()),
+    'edefs'       : edefs,
+}
+sim  = lclsTiming.generateSegment(config, 0, args.count)
+msgs = np.zeros(args.count, dtype=lclsTiming.TimingMessageType)
+for name in sim.dtype.names:
+    msgs[name] = sim[name]
+msgs['version']    = 1
+msgs['syncStatus'] = 1
+msgs['mpsValid']   = 1
+
+raw = args.count * lclsTiming.TIMING_MESSAGE_BYTES
+
+t0   = time.perf_counter()
+data = lclsTiming.encodeMessages(msgs)
+enc  = time.perf_counter() - t0
+
+t0  = time.perf_counter()
+got = lclsTiming.decodeMessages(data)
+dec = time.perf_counter() - t0
+
+t0   = time.perf_counter()
+cols = lclsTiming.decodeMessages(data, ['pulseId', 'fixedRates'])
+two  = time.perf_counter() - t0
+
+# Serialized frames read back from a (page cached) file
+fd, path = tempfile.mkstemp()
+try:
+    with os.fdopen(fd, 'wb') as f:
+        f.write(np.zeros(raw, dtype=np.uint8).tobytes())
+    t0   = time.perf_counter()
+    np.fromfile(path, dtype=np.uint8)
+    read = time.perf_counter() - t0
+finally:
+    os.remove(path)
+
+print(f'Encoded size:        {len(data)/2**20:8.2f} MB of {raw/2**20:.0f} MB ({raw/len(data):.0f}x)')
+print(f'Encode:              {raw/enc/1e6:8.1f} MB/s')
+print(f'Decode:              {raw/dec/1e6:8.1f} MB/s')
+print(f'Decode two columns:  {raw/two/1e6:8.1f} MB/s')
+print(f'Read frame file:     {raw/read/1e6:8.1f} MB/s')
+print(f'Lossless:            {got.tobytes() == msgs.tobytes() and np.array_equal(cols["fixedRates"], msgs["fixedRates"])}')
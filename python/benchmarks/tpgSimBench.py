@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Sharded TPG simulation benchmark
+#-----------------------------------------------------------------------------
+# Description:
+# Generates a pulse ID range of TPG messages in one process and sharded
+# across worker processes, prints the message rates and checks that the
+# stitched result is bit identical to the single process run.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import time
+import argparse
+
+import numpy as np
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('Sharded TPG simulation benchmark')
+
+parser.add_argument(
+    "--count",
+    type     = int,
+    required = False,
+    default  = 10000000,
+    help     = "Pulse IDs to generate",
+)
+
+parser.add_argument(
+    "--workers",
+    type     = int,
+    required = False,
+    default  = 4,
+    help     = "Worker processes",
+)
+
+parser.add_argument(
+    "--chunk",
+    type     = int,
+    required = False,
+    default  = 1 << 20,
+    help     = "Pulse IDs per shard",
+)
+
+parser.add_argument(
+    "--edefs",
+    type     = int,
+    required = False,
+    default  = 16,
+    help     = "Started BSA definitions",
+)
+
+#################################################################
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    # Default TPGMiniCore rates, half the BSA definitions on fixed markers
+    # and half on AC markers, started at staggered pulse IDs
+    edefs = np.zeros(args.edefs, dtype=lclsTiming.EdefType)
+    for e in range(args.edefs):
+        edefs[e] = (e, e % 2, (e // 2) % 6, 1 + e, 100, 1000 * e)
+
+    config = {
+        'baseDivisor' : 200,
+        'fixedDiv'    : np.array([1, 13, 91, 910, 9100, 91000, 910000, 0, 0, 0], dtype=np.int64),
+        'acDiv'       : np.array(lclsTiming.TPG_AC_DIVISORS, dtype=np.int64),
+        'timeStamp0'  : int(time.time()),
+        'edefs'       : edefs,
+    }
+    sim = lclsTiming.TPGSimulation(config, workers=args.workers, chunk=args.chunk)
+
+    t0     = time.perf_counter()
+    ref    = sim.generate(0, args.count)
+    single = time.perf_counter() - t0
+
+    t0      = time.perf_counter()
+    got     = sim.run(0, args.count)
+    sharded = time.perf_counter() - t0
+
+    print(f'Single process:      {args.count/single/1e6:8.2f} M messages/s')
+    print(f'{args.workers:2} workers:          {args.count/sharded/1e6:8.2f} M messages/s ({single/sharded:.1f}x)')
+    print(f'Bit identical:       {got.tobytes() == ref.tobytes()}')
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : YAML generated device benchmark and parity report
+#-----------------------------------------------------------------------------
+# Description:
+# Compares the devices generated from lcls-timing-core/yaml against the hand
+# written LclsTimingCore classes: register parity and device build time.
+#-----------------------------------------------------------------------------
+# This file is part of the 'LCLS Timing Core'. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the 'LCLS Timing Core', including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import time
+import argparse
+
+import LclsTimingCore as lclsTiming
+
+#################################################################
+
+parser = argparse.ArgumentParser('YAML generated device benchmark')
+
+# Convert str to bool
+def argBool(s):
+    return s.lower() in ['true', 't', 'yes', '1']
+
+parser.add_argument(
+    "--yamlDir",
+    type     = str,
+    required = False,
+    default  = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'yaml'),
+    help     = "Directory holding the YAML register maps",
+)
+
+parser.add_argument(
+    "--count",
+    type     = int,
+    required = False,
+    default  = 20,
+    help     = "Number of devices built per measurement",
+)
+
+parser.add_argument(
+    "--verbose",
+    type     = argBool,
+    required = False,
+    default  = False,
+    help     = "Print every parity report line",
+)
+
+args = parser.parse_args()
+
+#################################################################
+
+# YAML device name, hand written class and its arguments
+DEVICES = [
+    ('TPG',               lclsTiming.TPG,               {}),
+    ('TPGControl',        lclsTiming.TPGControl,        {}),
+    ('TPGStatus',         lclsTiming.TPGStatus,         {}),
+    ('TPGSeqState',       lclsTiming.TPGSeqState,       {}),
+    ('TPGSeqJump',        lclsTiming.TPGSeqJump,        {}),
+    ('TPGMiniCore',       lclsTiming.TPGMiniCore,       {}),
+    ('TimingFrameRx',     lclsTiming.TimingFrameRx,     {}),
+    ('GthRxAlignCheck',   lclsTiming.GthRxAlignCheck,   {}),
+    ('EvrV1Isr',          lclsTiming.EvrV1Isr,          {}),
+    ('EvrV1Reg',          lclsTiming.EvrV1Reg,          {}),
+    ('EvrV2Core',         lclsTiming.EvrV2Core,         {}),
+    ('EvrV2ChannelReg',   lclsTiming.EvrV2ChannelReg,   {'dmaEnable': True}),
+    ('EvrV2TriggerReg',   lclsTiming.EvrV2TriggerReg,   {'useTap': True}),
+    ('EvrV2CoreTriggers', lclsTiming.EvrV2CoreTriggers, {'numTrig': 16}),
+    ('LclsTriggerPulse',  lclsTiming.LclsTriggerPulse,  {}),
+    ('BldAxiStream',      lclsTiming.BldAxiStream,      {}),
+]
+
+def buildTime(fn):
+    t0 = time.perf_counter()
+    for _ in range(args.count):
+        fn()
+    return (time.perf_counter() - t0) / args.count
+
+print(f"{'Device':<18} {'parse ms':>9} {'cached ms':>9} {'hand ms':>9} {'yaml ms':>9} {'ratio':>6} {'diffs':>6}")
+
+slower = []
+for name, cls, kwargs in DEVICES:
+    path = os.path.join(args.yamlDir, f'{name}.yaml')
+
+    t0 = time.perf_counter()
+    lclsTiming.compileYamlMap(path)
+    parse = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    table = lclsTiming.yamlTable(path)
+    cached = time.perf_counter() - t0
+
+    hand = buildTime(lambda: cls(**kwargs))
+    gen  = buildTime(lambda: lclsTiming.YamlDevice(table=table))
+
+    report = lclsTiming.parityReport(table, cls(**kwargs))
+
+    print(f'{name:<18} {parse*1e3:9.2f} {cached*1e3:9.2f} {hand*1e3:9.2f} {gen*1e3:9.2f} {gen/hand:6.2f} {len(report):6d}')
+
+    if args.verbose:
+        for line in report:
+            print(f'    {line}')
+
+    # Allow 5% for timer noise
+    if gen > 1.05*hand:
+        slower.append(name)
+
+if slower:
+    print(f'Generated devices slower than hand written: {slower}')
+    print('Note: EvrV1Reg and TPG map more registers in YAML than their classes, see the diffs column')